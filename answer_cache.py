@@ -0,0 +1,199 @@
+# answer_cache.py
+import hashlib, json, os, re, threading, time, unicodedata
+
+# 对话答案缓存：同一期报告下反复出现的提问（"有哪些值得关注的论文？"、"summarize paper 1"）
+# 直接返回已有答案，不再调用 Ollama。
+#   - 键为 (期别, 模型, 上文摘要, 规范化后的问题)；规范化 = NFKC + 小写 + 去标点/空白
+#     上文摘要：问题不指代前文时为空，可在所有人之间共用；指代前文时（"它"、"详细说说"、"this"）
+#     取提问者本人此前的问题，而不是频道中每轮都在变化的对话记录
+#   - 精确命中失败时，用字符二元组 Jaccard 相似度匹配改写过的问题；
+#     问题中的数字必须完全一致，避免 "paper 1" 命中 "paper 2"
+#   - 条目在 ttl 秒后过期（与报告有效期 time_window_hours 一致），报告上下文变化时整体失效
+#   - 内存中按期别保存，同时写入 storage/<period>/answer_cache.json，重启后仍可命中
+
+_PUNCT = re.compile(r"[\W_]+", re.U)
+_DIGITS = re.compile(r"\d+")
+_REFERS = re.compile(r"\b(?:it|its|this|that|these|those|they|them|above|previous|earlier|continue|elaborate)\b|"
+                     r"它|这篇|那篇|这个|那个|这些|那些|上面|上述|刚才|之前|前面|继续|展开|详细", re.I)
+
+
+def normalize_question(text):
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return _PUNCT.sub("", text)
+
+
+def _bigrams(norm):
+    return {norm[i:i + 2] for i in range(len(norm) - 1)} or {norm}
+
+
+def history_key(question, history, user=None):
+    """
+    问题的上文摘要：不指代前文或没有历史时为空串，否则为提问者本人此前问题的摘要
+
+    Returns:
+        str | None: None 表示指代的是别人的对话，不使用缓存
+    """
+    if not history or not _REFERS.search(unicodedata.normalize("NFKC", question or "")):
+        return ""
+    own = [h.get("text", "") for h in history if h.get("role") == "user" and (user is None or h.get("user") == user)]
+    if not own:
+        return None
+    return hashlib.sha1("\n".join(own).encode("utf-8")).hexdigest()[:16]
+
+
+def similarity(a, b):
+    """两个规范化问题的字符二元组 Jaccard 相似度"""
+    if _DIGITS.findall(a) != _DIGITS.findall(b):
+        return 0.0
+    x, y = _bigrams(a), _bigrams(b)
+    return len(x & y) / len(x | y)
+
+
+class AnswerCache:
+    def __init__(self, ttl=12 * 3600, threshold=0.8, max_entries=200):
+        self.ttl = ttl
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self._periods = {}  # period -> {"path", "stamp", "entries": {(model, history, norm): entry}}
+        self._lock = threading.Lock()
+
+    def _load(self, period, directory):
+        slot = self._periods.get(period)
+        if slot is None:
+            path = directory / "answer_cache.json"
+            slot = {"path": path, "stamp": None, "entries": {}}
+            if path.exists():
+                try:
+                    data = json.loads(path.read_text(encoding="utf-8"))
+                    slot["stamp"] = data.get("stamp")
+                    for e in data.get("entries", []):
+                        slot["entries"][(e["model"], e.get("history", ""), e["norm"])] = e
+                except (ValueError, KeyError):
+                    pass
+            self._periods[period] = slot
+        return slot
+
+    def _save(self, slot):
+        path = slot["path"]
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"stamp": slot["stamp"], "entries": list(slot["entries"].values())},
+                                  ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def _fresh(self, slot, stamp, now):
+        if slot["stamp"] != stamp:
+            # 报告上下文已重新生成，旧答案全部作废
+            slot["stamp"] = stamp
+            slot["entries"].clear()
+        for key in [k for k, e in slot["entries"].items() if now - e["ts"] > self.ttl]:
+            del slot["entries"][key]
+        return slot["entries"]
+
+    def get(self, period, directory, model, question, stamp=None, history=None, user=None):
+        """
+        查找缓存答案（history 为提问时附带的最近对话，user 为提问者，见 history_key）
+
+        Returns:
+            str | None: 命中时返回答案
+        """
+        norm = normalize_question(question)
+        hkey = history_key(question, history, user)
+        if hkey is None:
+            return None
+        now = time.time()
+        with self._lock:
+            entries = self._fresh(self._load(period, directory), stamp, now)
+            hit = entries.get((model, hkey, norm))
+            if hit is None and self.threshold < 1:
+                best = 0.0
+                for (m, h, n), e in entries.items():
+                    if m != model or h != hkey:
+                        continue
+                    score = similarity(norm, n)
+                    if score >= self.threshold and score > best:
+                        best, hit = score, e
+                if hit is not None:
+                    self.similar_hits += 1
+            if hit is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            hit["uses"] = hit.get("uses", 0) + 1
+            return hit["answer"]
+
+    def put(self, period, directory, model, question, answer, stamp=None, history=None, user=None):
+        norm = normalize_question(question)
+        if not norm or not answer:
+            return
+        hkey = history_key(question, history, user)
+        if hkey is None:
+            return
+        now = time.time()
+        with self._lock:
+            slot = self._load(period, directory)
+            entries = self._fresh(slot, stamp, now)
+            entries[(model, hkey, norm)] = {"model": model, "history": hkey, "norm": norm, "question": question,
+                                            "answer": answer, "ts": now, "uses": 0}
+            while len(entries) > self.max_entries:
+                del entries[min(entries, key=lambda k: entries[k]["ts"])]
+            self._save(slot)
+
+    def invalidate(self, period=None):
+        with self._lock:
+            for p in [p for p in self._periods if period is None or p == period]:
+                slot = self._periods.pop(p)
+                if slot["path"].exists():
+                    slot["path"].unlink()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": sum(len(s["entries"]) for s in self._periods.values()),
+        }
+
+
+def from_cfg(cfg, hours=12):
+    ac = cfg.get("answer_cache", {}) or {}
+    if not ac.get("enabled", True):
+        return None
+    return AnswerCache(ttl=float(ac.get("ttl_hours", hours)) * 3600,
+                       threshold=float(ac.get("similarity", 0.8)),
+                       max_entries=int(ac.get("max_entries", 200)))
+
+
+def check(directory=None):
+    """
+    模拟频道对话检验缓存命中：python -m answer_cache
+
+    每轮对话都会加入历史；重复/改写的问题应当命中，指代前文的追问只在提问者上文相同时命中。
+
+    Returns:
+        dict: stats()
+    """
+    import tempfile
+    from pathlib import Path
+
+    directory = Path(directory or tempfile.mkdtemp())
+    cache = AnswerCache()
+    history = []
+    turns = [("alice", "有哪些值得关注的论文？"), ("bob", "有哪些值得关注的论文?"), ("carol", "有哪些值得关注的论文呢"),
+             ("alice", "summarize paper 1"), ("bob", "Summarize paper 1."), ("dave", "有哪些值得关注的论文？")]
+    for user, q in turns:
+        recent = history[-6:]
+        if cache.get("P", directory, "m", q, stamp=1, history=recent, user=user) is None:
+            cache.put("P", directory, "m", q, f"answer to {q}", stamp=1, history=recent, user=user)
+        history += [{"role": "user", "user": user, "text": q}, {"role": "assistant", "user": "bot", "text": "..."}]
+    return cache.stats()
+
+
+if __name__ == "__main__":
+    stats = check()
+    print(f"答案缓存模拟: {stats}")
+    raise SystemExit(0 if stats["hits"] == 4 else 1)
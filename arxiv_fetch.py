@@ -1,8 +1,173 @@
 # arxiv_fetch.py
-import arxiv, re
+import arxiv, heapq, json, queue, re, sys, threading, time, requests
 from dateutil.tz import gettz
 from datetime import timedelta
 
+from http_cache import cached_response, get_cache, normalize_url
+from textnorm import estimate_tokens, normalize_abstract
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶限速器
+    arXiv API 要求同一来源不超过每 3 秒 1 次请求，因此默认 rate=1/3, capacity=1
+    """
+
+    def __init__(self, rate=1 / 3, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# 进程内所有 arXiv 请求共用一个限速器（包括并发的回填任务）
+ARXIV_LIMITER = TokenBucket()
+
+_SPACE = re.compile(r"\s+")
+
+
+class PaperRecord:
+    """
+    抓取阶段使用的精简论文记录
+
+    结果流经客户端时立即从 arxiv.Result 转换，只保留后续流程用到的字段，原始结果（链接、
+    原始 feed 等）随即释放；作者名和分类经 sys.intern 驻留，大批量抓取与回填时同一字符串只存一份。
+    """
+    __slots__ = ("id", "title", "abstract", "authors", "primary_category", "published")
+
+    def __init__(self, id, title, abstract, authors, primary_category, published):
+        self.id = id
+        self.title = title
+        self.abstract = abstract
+        self.authors = authors
+        self.primary_category = primary_category
+        self.published = published
+
+    @classmethod
+    def from_result(cls, r):
+        return cls(
+            r.get_short_id(),
+            _SPACE.sub(" ", r.title).strip(),
+            _SPACE.sub(" ", r.summary or "").strip(),
+            tuple(sys.intern(a.name) for a in r.authors),
+            sys.intern(r.primary_category or ""),
+            r.published,
+        )
+
+    @property
+    def base_id(self):
+        return self.id.split('v')[0]
+
+    def excluded(self, excludes):
+        """标题或摘要中含有排除词"""
+        if not excludes:
+            return False
+        title, abstract = self.title.lower(), self.abstract.lower()
+        return any(e and (e in title or e in abstract) for e in excludes)
+
+    def to_dict(self, abstract=None):
+        """存储与提示词使用的条目格式（raw_papers.json / 报告 JSON）；abstract 为规范化后的摘要"""
+        abstract = self.abstract if abstract is None else abstract
+        return {
+            "id": self.id,
+            "title": self.title,
+            "authors": list(self.authors),
+            "primary_category": self.primary_category,
+            "published": self.published.isoformat(),
+            "link": f"https://arxiv.org/abs/{self.base_id}",  # 统一使用不带版本号的 arxiv 链接
+            "abstract": abstract,
+        }
+
+
+class RateLimitedSession(requests.Session):
+    """每次真正发出请求前先从限速器取令牌"""
+
+    def __init__(self, limiter):
+        super().__init__()
+        self.limiter = limiter
+
+    def request(self, method, url, *args, **kwargs):
+        self.limiter.acquire()
+        return super().request(method, url, *args, **kwargs)
+
+
+class CachedSession(RateLimitedSession):
+    """
+    带磁盘缓存的会话：新鲜的缓存直接返回，不占用限速令牌；
+    过期缓存发条件请求 (If-None-Match / If-Modified-Since) 重新验证
+    """
+
+    def __init__(self, limiter, cache):
+        super().__init__(limiter)
+        self.cache = cache
+
+    def request(self, method, url, *args, **kwargs):
+        if method.upper() != "GET":
+            return super().request(method, url, *args, **kwargs)
+
+        key = normalize_url(url)
+        meta, body = self.cache.get(key)
+        if meta is not None and time.time() - meta["stored_at"] < self.cache.ttl_for(key):
+            self.cache.hits += 1
+            return cached_response(url, meta, body)
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        resp = super().request(method, url, *args, headers=headers, **kwargs)
+        if resp.status_code == 304 and meta is not None:
+            self.cache.revalidated += 1
+            self.cache.touch(key, meta)
+            return cached_response(url, meta, body)
+
+        self.cache.misses += 1
+        if resp.status_code == 200 and resp.content:
+            self.cache.put(key, resp)
+        return resp
+
+
+def make_client(cfg=None, limiter=None, cache=True):
+    """
+    创建 arxiv.Client，限速交给共享的令牌桶而不是客户端自带的 delay_seconds，
+    这样多个客户端（多线程）合起来仍然遵守 arXiv 的请求频率
+
+    Args:
+        cfg: 配置字典，用于读取 http_cache 设置
+        limiter: 限速器，默认 ARXIV_LIMITER
+        cache: 为 False 时绕过响应缓存（如推送前的增量抓取）
+    """
+    client = arxiv.Client(delay_seconds=0)
+    response_cache = get_cache(cfg) if cache else None
+    if response_cache is not None:
+        client._session = CachedSession(limiter or ARXIV_LIMITER, response_cache)
+    else:
+        client._session = RateLimitedSession(limiter or ARXIV_LIMITER)
+    return client
+
+
+def date_range_query(cats, start_date, end_date):
+    """分类 + 提交日期范围查询 (arXiv submittedDate 以 UTC 计)"""
+    cat_query = " OR ".join([f'cat:{cat}' for cat in cats])
+    return (f'({cat_query}) AND submittedDate:'
+            f'[{start_date.strftime("%Y%m%d")}0000 TO {end_date.strftime("%Y%m%d")}2359]')
+
 def build_query(cfg):
     # 构建更宽松的搜索查询
 
@@ -40,7 +205,7 @@ def build_query(cfg):
         return ""
 
 
-def iterative_time_aware_search(cfg, target=20, max_days=7):
+def iterative_time_aware_search(cfg, target=20, max_days=7, anchor_date=None):
     """
     时间感知的迭代搜索架构
     优先抓取最新论文，动态扩展时间窗口直到满足条件
@@ -49,6 +214,7 @@ def iterative_time_aware_search(cfg, target=20, max_days=7):
         cfg: 配置字典
         target: 目标论文数量
         max_days: 最大搜索天数
+        anchor_date: 从该日期往前搜索（默认今天，用于历史回填）
 
     Returns:
         list: 按发布时间降序排列的论文列表
@@ -57,7 +223,7 @@ def iterative_time_aware_search(cfg, target=20, max_days=7):
     from dateutil.tz import gettz
 
     tz_local = gettz(cfg.get("timezone", "America/New_York"))
-    current_date = datetime.now(tz_local).date()
+    current_date = anchor_date or datetime.now(tz_local).date()
 
     collected = []
     seen_ids = set()
@@ -83,6 +249,9 @@ def iterative_time_aware_search(cfg, target=20, max_days=7):
         try:
             # 构建时间窗口查询
             cat_query = " OR ".join([f'cat:{cat}' for cat in cats])
+            if anchor_date is not None:
+                # 历史日期：最新的 100 篇不会落在窗口内，需要显式限定提交日期
+                cat_query = date_range_query(cats, start_date - timedelta(days=1), end_date + timedelta(days=1))
 
             # 使用arxiv API的时间过滤
             search = arxiv.Search(
@@ -94,13 +263,9 @@ def iterative_time_aware_search(cfg, target=20, max_days=7):
 
             # 获取结果并过滤
             batch_new_papers = []
-            for r in arxiv.Client().results(search):
-                # 转换为本地时区
-                pub_local = r.published.astimezone(tz_local)
-                pub_date = pub_local.date()
-
-                # 检查是否在当前搜索窗口内
-                if not (start_date <= pub_date <= end_date):
+            for r in make_client(cfg).results(search):
+                # 转换为本地时区，检查是否在当前搜索窗口内
+                if not (start_date <= r.published.astimezone(tz_local).date() <= end_date):
                     continue
 
                 # 去重（避免不同版本的同一论文）
@@ -109,14 +274,13 @@ def iterative_time_aware_search(cfg, target=20, max_days=7):
                     continue
                 seen_ids.add(base_id)
 
-                # 过滤排除词
-                title = r.title.lower()
-                abstract = (r.summary or '').lower()
-                if any(e and (e in title or e in abstract) for e in excludes):
+                # 只保留精简记录，并过滤排除词
+                rec = PaperRecord.from_result(r)
+                if rec.excluded(excludes):
                     continue
 
-                batch_new_papers.append(r)
-                print(f" 找到论文: {r.get_short_id()} - {r.title[:50]}...")
+                batch_new_papers.append(rec)
+                print(f" 找到论文: {rec.id} - {rec.title[:50]}...")
 
             # 添加到收集列表
             collected.extend(batch_new_papers)
@@ -132,13 +296,9 @@ def iterative_time_aware_search(cfg, target=20, max_days=7):
             print(f" 窗口 {time_window} 搜索失败: {e}")
             # 继续下一个窗口，不中断整个搜索过程
 
-        # 动态扩展时间窗口
+        # 动态扩展时间窗口（请求频率由共享限速器控制）
         time_window += 1
 
-        # 防止过于频繁的API调用
-        import time
-        time.sleep(0.5)
-
     # 最终排序和截取
     collected.sort(key=lambda x: x.published, reverse=True)
     final_results = collected[:target]
@@ -163,20 +323,133 @@ def iterative_time_aware_search(cfg, target=20, max_days=7):
     return final_results
 
 
-def fetch_window(cfg, since_dt_local, now_local):
+_END = object()
+
+
+def _category_producer(cfg, cat, max_items, start_date, tz_local, out_q, stop):
+    """单个分类的抓取线程：按提交时间降序把结果放入队列，越过窗口起点即停止"""
+    search = arxiv.Search(
+        query=f'cat:{cat}',
+        max_results=max_items,
+        sort_by=arxiv.SortCriterion.SubmittedDate,
+        sort_order=arxiv.SortOrder.Descending,
+    )
+    try:
+        for r in make_client(cfg).results(search):
+            if r.published.astimezone(tz_local).date() < start_date or stop.is_set():
+                break
+            rec = PaperRecord.from_result(r)
+            while not stop.is_set():
+                try:
+                    out_q.put(rec, timeout=1)
+                    break
+                except queue.Full:
+                    continue
+    except Exception as e:
+        print(f" 分类 {cat} 抓取失败: {e}")
+    finally:
+        while True:
+            try:
+                out_q.put(_END, timeout=1)
+                break
+            except queue.Full:
+                if stop.is_set():
+                    break
+
+
+def _drain(q):
+    while True:
+        item = q.get()
+        if item is _END:
+            return
+        yield item
+
+
+def per_category_search(cfg, target=20, max_days=7, anchor_date=None):
+    """
+    按分类并发抓取，再按发布时间做 k 路归并
+
+    每个分类单独查询（共用 ARXIV_LIMITER），结果流经 heapq.merge 合并，
+    交叉投稿的论文在归并时按 base id 去重。每个分类先保证
+    ceil(target / 分类数) 篇的配额，剩余名额再按时间顺序补齐，
+    避免 cs.LG 这类高产分类挤掉 eess.IV 等低产分类。
+
+    Returns:
+        list: 按发布时间降序排列的论文列表
+    """
+    from datetime import datetime
+
+    tz_local = gettz(cfg.get("timezone", "America/New_York"))
+    current_date = anchor_date or datetime.now(tz_local).date()
+    start_date = current_date - timedelta(days=max_days)
+    cats = cfg.get("categories", ["cs.AI", "cs.LG", "cs.CL", "cs.CV"])
+    excludes = [e.lower() for e in cfg.get("exclude", [])]
+    per_cat = int(cfg.get("per_category_max", 100))
+    quota = -(-target // max(len(cats), 1))
+
+    print(f" 分类并发抓取: {', '.join(cats)} (每类配额 {quota} 篇)")
+
+    stop = threading.Event()
+    queues, threads = [], []
+    for cat in cats:
+        q = queue.Queue(maxsize=per_cat)
+        t = threading.Thread(target=_category_producer, daemon=True,
+                             args=(cfg, cat, per_cat, start_date, tz_local, q, stop))
+        t.start()
+        queues.append(q)
+        threads.append(t)
+
+    # 为每个结果带上来源分类，便于按分类计配额
+    def tagged(q, cat):
+        for r in _drain(q):
+            yield r, cat
+
+    selected, overflow = [], []
+    seen_ids = set()
+    counts = {cat: 0 for cat in cats}
+    try:
+        merged = heapq.merge(*[tagged(q, c) for q, c in zip(queues, cats)],
+                             key=lambda rc: rc[0].published, reverse=True)
+        for r, cat in merged:
+            if r.base_id in seen_ids:
+                continue
+            seen_ids.add(r.base_id)
+            if r.excluded(excludes):
+                continue
+            if counts[cat] < quota:
+                counts[cat] += 1
+                selected.append(r)
+            else:
+                overflow.append(r)
+    finally:
+        stop.set()
+
+    # 配额用不完的名额按时间顺序补齐
+    selected.extend(overflow[:max(0, target - len(selected))])
+    selected.sort(key=lambda x: x.published, reverse=True)
+    final_results = selected[:target]
+    print(f" 分类并发抓取完成: {', '.join(f'{c} {n}' for c, n in counts.items())}, 最终 {len(final_results)} 篇")
+    return final_results
+
+
+def fetch_window(cfg, since_dt_local, now_local, max_items=None):
     """
     兼容性包装器：使用新的时间感知迭代搜索
+
+    max_items: 抓取篇数（默认 digest_max_items；个性化排序时传入更大的候选数）
     """
-    max_items = cfg.get("digest_max_items", 20)
+    max_items = max_items or cfg.get("digest_max_items", 20)
 
     # 使用新的时间感知迭代搜索
     print(f" 使用时间感知迭代搜索 (替代传统搜索)")
 
     try:
+        if cfg.get("fetch_mode") == "per_category":
+            return per_category_search(cfg, target=max_items, max_days=int(cfg.get("search_max_days", 7)))
         results = iterative_time_aware_search(
             cfg=cfg,
             target=max_items,
-            max_days=7
+            max_days=int(cfg.get("search_max_days", 7))
         )
         return results
     except Exception as e:
@@ -186,6 +459,71 @@ def fetch_window(cfg, since_dt_local, now_local):
         return fallback_search(cfg, max_items)
 
 
+def fetch_delta(cfg, after_dt, known_ids=(), max_items=50):
+    """
+    增量抓取：只取 after_dt 之后新发布、且不在 known_ids 中的论文
+    用于预取之后、正式推送之前的最后一次快速补齐（通常只需一页）
+    """
+    cats = cfg.get("categories", ["cs.AI", "cs.LG", "cs.CL", "cs.CV"])
+    excludes = [e.lower() for e in cfg.get("exclude", [])]
+    known = {k.split('v')[0] for k in known_ids}
+
+    search = arxiv.Search(
+        query=" OR ".join([f'cat:{cat}' for cat in cats]),
+        max_results=max_items,
+        sort_by=arxiv.SortCriterion.SubmittedDate,
+        sort_order=arxiv.SortOrder.Descending,
+    )
+
+    fresh = []
+    try:
+        for r in make_client(cfg, cache=False).results(search):
+            # 结果按提交时间降序，遇到旧论文即可停止
+            if r.published <= after_dt:
+                break
+            base_id = r.get_short_id().split('v')[0]
+            if base_id in known:
+                continue
+            known.add(base_id)
+            rec = PaperRecord.from_result(r)
+            if rec.excluded(excludes):
+                continue
+            fresh.append(rec)
+    except Exception as e:
+        print(f" 增量抓取失败: {e}")
+
+    print(f" 增量抓取: 新增 {len(fresh)} 篇")
+    return fresh
+
+
+def fetch_day(cfg, day, category, max_items=500, client=None):
+    """
+    抓取某一天 (UTC) 某一分类的全部论文，用于历史回填
+
+    Returns:
+        list: 去重并过滤排除词后的论文，按发布时间降序
+    """
+    excludes = [e.lower() for e in cfg.get("exclude", [])]
+    search = arxiv.Search(
+        query=date_range_query([category], day, day),
+        max_results=max_items,
+        sort_by=arxiv.SortCriterion.SubmittedDate,
+        sort_order=arxiv.SortOrder.Descending,
+    )
+
+    results, seen = [], set()
+    for r in (client or make_client(cfg)).results(search):
+        base_id = r.get_short_id().split('v')[0]
+        if base_id in seen:
+            continue
+        seen.add(base_id)
+        rec = PaperRecord.from_result(r)
+        if rec.excluded(excludes):
+            continue
+        results.append(rec)
+    return results
+
+
 def fallback_search(cfg, max_items):
     """
     简化的回退搜索方案
@@ -208,7 +546,7 @@ def fallback_search(cfg, max_items):
         filtered_papers = []
         unique_ids = set()
 
-        for r in arxiv.Client().results(search):
+        for r in make_client(cfg).results(search):
             paper_id = r.get_short_id()
             base_id = paper_id.split('v')[0]
 
@@ -218,12 +556,11 @@ def fallback_search(cfg, max_items):
 
             # 过滤排除词
             excludes = [e.lower() for e in cfg.get("exclude", [])]
-            title = r.title.lower()
-            abstract = (r.summary or '').lower()
-            if any(e and (e in title or e in abstract) for e in excludes):
+            rec = PaperRecord.from_result(r)
+            if rec.excluded(excludes):
                 continue
 
-            filtered_papers.append(r)
+            filtered_papers.append(rec)
             if len(filtered_papers) >= max_items:
                 break
 
@@ -267,7 +604,7 @@ def save_pushed_papers(paper_ids):
 
 def mark_papers_as_pushed(papers):
     """标记论文为已推送"""
-    paper_ids = [p.get_short_id() for p in papers]
+    paper_ids = [p.id for p in papers]
     save_pushed_papers(paper_ids)
 
 
@@ -275,26 +612,24 @@ def pack_papers(cfg, papers):
     # 结构化成 JSON 友好格式， papers已经在fetch_window中过去重
     data = []
     max_abs = int(cfg.get("abstract_max_chars", 500))
+    normalize = cfg.get("abstract_normalize", True)
+    tokens_before = tokens_after = 0
 
     for p in papers:
-        paper_id = p.get_short_id()
-        abs_text = re.sub(r"\s+", " ", (p.summary or "")).strip()
-        if len(abs_text) > max_abs:
-            abs_text = abs_text[:max_abs] + "…"
-
-        # 确保有正确的arXiv链接
-        arxiv_id = paper_id.split('v')[0]  # 去掉版本号
-        arxiv_link = f"https://arxiv.org/abs/{arxiv_id}"
-
-        data.append({
-            "id": paper_id,
-            "title": p.title.strip().replace("\n", " "),
-            "authors": [a.name for a in p.authors],
-            "primary_category": p.primary_category,
-            "published": p.published.isoformat(),
-            "link": arxiv_link,  # 统一使用arxiv链接
-            "abstract": abs_text,
-        })
+        raw_text = p.abstract  # PaperRecord 中已合并空白
+        truncated = raw_text[:max_abs] + "…" if len(raw_text) > max_abs else raw_text
+        if normalize:
+            # 去 LaTeX、去套话、按句截断；结果随条目保存，后续阶段直接复用
+            item = p.to_dict(normalize_abstract(raw_text, max_abs))
+            # 按实际发送给模型的条目 JSON 估算，与不规范化（直接截断）时比较
+            tokens_before += estimate_tokens(json.dumps(p.to_dict(truncated), ensure_ascii=False))
+            tokens_after += estimate_tokens(json.dumps(item, ensure_ascii=False))
+        else:
+            item = p.to_dict(truncated)
+        data.append(item)
 
     print(f" 论文数量: {len(data)}")
+    if normalize and tokens_before:
+        saved = tokens_before - tokens_after
+        print(f" 摘要规范化: 估计 {tokens_before} → {tokens_after} tokens (节省 {saved}, {saved * 100 // tokens_before}%)")
     return data
\ No newline at end of file
@@ -0,0 +1,274 @@
+# arxivpush.py
+"""
+无需启动 Discord 的命令行入口，适合 cron / CI 批量生成报告
+
+    python -m arxivpush fetch  [-o papers.json]
+    python -m arxivpush digest [am|pm] [--input papers.json] [-o report.md] [--no-save]
+    python -m arxivpush chat   "问题" [--period 2025-10-09_AM]
+    python -m arxivpush bench  [--skip-llm]
+    python -m arxivpush backfill 2025-09-01 2025-09-30 [--workers 4] [--summarize]
+    python -m arxivpush loadtest [--rate 2 --count 100 --latency 1.5 | --replay 2025-10-09_AM]
+    python -m arxivpush worker   [--processes 2] [--kinds chat generate] [--once]
+    python -m arxivpush catalog  [--rebuild] [--archive [--days 30]]
+    python -m arxivpush ingest   [--period 2025-10-09_AM | --input papers.json]
+
+各子命令只在执行时才导入所需模块，启动开销保持在最低。
+"""
+import argparse, sys, time
+
+
+def _write(text, out):
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f" 已写入 {out}", file=sys.stderr)
+    else:
+        sys.stdout.write(text + "\n")
+
+
+def _window(cfg):
+    from utils import now_in_tz, last_window_start
+    tzname = cfg.get("timezone", "America/New_York")
+    hours = int(cfg.get("time_window_hours", 12))
+    return last_window_start(tzname, hours), now_in_tz(tzname)
+
+
+def _label(which, now_local):
+    if not which:
+        which = "am" if now_local.hour < 12 else "pm"
+    return "早报" if which.lower() == "am" else "晚报"
+
+
+def cmd_fetch(cfg, args):
+    import json
+    import pipeline
+
+    since_local, now_local = _window(cfg)
+    data = pipeline.collect(cfg, since_local, now_local)
+    _write(json.dumps(data, ensure_ascii=False, indent=2), args.output)
+    return 0
+
+
+def cmd_digest(cfg, args):
+    import json
+    import pipeline
+    from utils import fmt_period
+
+    since_local, now_local = _window(cfg)
+    label = _label(args.which, now_local)
+
+    if args.input:
+        with open(args.input, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    else:
+        data = pipeline.collect(cfg, since_local, now_local)
+    if not data:
+        print(f" {label} | 本次时间窗口内没有新论文", file=sys.stderr)
+        return 1
+
+    md = pipeline.generate(cfg, label, since_local, now_local, data)
+    if not args.no_save:
+        from state import PeriodState
+        period = fmt_period(now_local)
+        pipeline.save(PeriodState(period), data, md, cfg)
+        print(f" 已保存到 storage/{period}", file=sys.stderr)
+    _write(md, args.output)
+    return 0
+
+
+def cmd_chat(cfg, args):
+    import chat
+    from state import PeriodState, latest_active_period
+    from utils import now_in_tz
+
+    tzname = cfg.get("timezone", "America/New_York")
+    name = args.period or latest_active_period(now_in_tz(tzname), hours=int(cfg.get("time_window_hours", 12)))
+    if not name:
+        print(" 当前没有可对话的报告，请先生成报告", file=sys.stderr)
+        return 1
+
+    st = PeriodState(name)
+    if not st.prompt_context.exists():
+        print(" 没有找到报告上下文，请先生成报告", file=sys.stderr)
+        return 1
+    ctx_text = st.prompt_context.read_text(encoding="utf-8")
+
+    t0 = time.perf_counter()
+    history = st.recent_chat(int(cfg.get("chat_history_turns", 6)))
+    st.append_chat("user", args.question, user="cli", fsync=cfg.get("chat_fsync", "never"))
+    answer = chat.answer(cfg, name, ctx_text, args.question, history=history,
+                         stamp=st.prompt_context.stat().st_mtime_ns)
+    st.append_chat("assistant", answer, user="cli", latency_ms=round((time.perf_counter() - t0) * 1000),
+                   fsync=cfg.get("chat_fsync", "never"))
+    _write(answer, args.output)
+    return 0
+
+
+def cmd_bench(cfg, args):
+    timings = []
+
+    def stage(name, fn):
+        t0 = time.perf_counter()
+        result = fn()
+        timings.append((name, time.perf_counter() - t0))
+        return result
+
+    stage("import", lambda: __import__("pipeline"))
+    import pipeline
+    from arxiv_fetch import fetch_window, pack_papers
+
+    since_local, now_local = _window(cfg)
+    papers = stage("fetch", lambda: fetch_window(cfg, since_local, now_local))
+    data = stage("pack", lambda: pack_papers(cfg, papers))
+    if data and not args.skip_llm:
+        label = _label(None, now_local)
+        stage("summarize", lambda: pipeline.generate(cfg, label, since_local, now_local, data))
+
+    lines = [f"{'stage':<12}{'seconds':>10}"]
+    lines += [f"{name:<12}{sec:>10.3f}" for name, sec in timings]
+    lines.append(f"{'total':<12}{sum(s for _, s in timings):>10.3f}  ({len(data)} papers)")
+    _write("\n".join(lines), args.output)
+    return 0
+
+
+def cmd_backfill(cfg, args):
+    from datetime import date
+    from backfill import run_backfill
+
+    start, end = date.fromisoformat(args.start), date.fromisoformat(args.end)
+    if end < start:
+        print(" 结束日期早于开始日期", file=sys.stderr)
+        return 1
+    periods = run_backfill(cfg, start, end, workers=args.workers,
+                           summarize=args.summarize, restart=args.restart)
+    _write("\n".join(periods), args.output)
+    return 0
+
+
+def cmd_loadtest(cfg, args):
+    import loadtest
+    return loadtest.main(args)
+
+
+def cmd_worker(cfg, args):
+    from worker import run_workers
+    run_workers(cfg, processes=args.processes, kinds=args.kinds, once=args.once)
+    return 0
+
+
+def cmd_catalog(cfg, args):
+    from catalog import get_catalog
+
+    cat = get_catalog(cfg)
+    if args.rebuild:
+        cat.rebuild()
+    if args.archive:
+        days = args.days or int((cfg.get("retention", {}) or {}).get("archive_after_days", 0)) or 30
+        done = cat.archive(days)
+        print(f" 已归档 {len(done)} 期（早于 {days} 天）", file=sys.stderr)
+    lines = [f"{p:<16}{e['state']:<10}{e['files']:>6}{e['bytes'] // 1024:>10} KB  {e.get('archive', '')}"
+             for p, e in cat.list()]
+    lines += [f"{state}: {s['periods']} 期, {s['files']} 个文件, {s['bytes'] // 1024} KB"
+              for state, s in sorted(cat.stats().items())]
+    _write("\n".join(lines), args.output)
+    return 0
+
+
+def cmd_ingest(cfg, args):
+    import json
+    import fulltext
+    from state import PeriodState, latest_active_period
+    from utils import now_in_tz
+
+    if args.input:
+        with open(args.input, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    else:
+        tzname = cfg.get("timezone", "America/New_York")
+        name = args.period or latest_active_period(now_in_tz(tzname), hours=int(cfg.get("time_window_hours", 12)))
+        st = PeriodState(name) if name else None
+        if st is None or not st.raw_json.exists():
+            print(" 没有找到论文列表，请指定 --period 或 --input", file=sys.stderr)
+            return 1
+        data = json.loads(st.raw_json.read_text(encoding="utf-8"))
+    # 命令行调用视为显式开启
+    stats = fulltext.ingest_sync(dict(cfg, fulltext=dict(cfg.get("fulltext", {}) or {}, enabled=True)), data)
+    _write(" | ".join(f"{k} {v}" for k, v in stats.items()), args.output)
+    return 0 if stats["ok"] else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="arxivpush", description="arXiv Push 命令行工具")
+    parser.add_argument("--config", default="config.yaml", help="配置文件路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("fetch", help="抓取并打包论文，输出 JSON")
+    p.add_argument("-o", "--output", help="输出文件（默认标准输出）")
+    p.set_defaults(func=cmd_fetch)
+
+    p = sub.add_parser("digest", help="生成一期报告")
+    p.add_argument("which", nargs="?", choices=["am", "pm"], help="早报/晚报（默认按当前时间）")
+    p.add_argument("--input", help="使用已抓取的论文 JSON，跳过抓取")
+    p.add_argument("--no-save", action="store_true", help="不写入 storage/")
+    p.add_argument("-o", "--output", help="输出文件（默认标准输出）")
+    p.set_defaults(func=cmd_digest)
+
+    p = sub.add_parser("chat", help="与最近一期报告对话")
+    p.add_argument("question")
+    p.add_argument("--period", help="指定期别，如 2025-10-09_AM")
+    p.add_argument("-o", "--output", help="输出文件（默认标准输出）")
+    p.set_defaults(func=cmd_chat)
+
+    p = sub.add_parser("bench", help="各阶段耗时")
+    p.add_argument("--skip-llm", action="store_true", help="不调用模型")
+    p.add_argument("-o", "--output", help="输出文件（默认标准输出）")
+    p.set_defaults(func=cmd_bench)
+
+    p = sub.add_parser("backfill", help="历史回填（可断点续跑）")
+    p.add_argument("start", help="开始日期 YYYY-MM-DD")
+    p.add_argument("end", help="结束日期 YYYY-MM-DD（含）")
+    p.add_argument("--workers", type=int, default=4, help="并发线程数")
+    p.add_argument("--summarize", action="store_true", help="为各期别生成报告")
+    p.add_argument("--restart", action="store_true", help="忽略检查点从头开始")
+    p.add_argument("-o", "--output", help="输出期别列表的文件（默认标准输出）")
+    p.set_defaults(func=cmd_backfill)
+
+    p = sub.add_parser("worker", help="任务队列 worker（配合 job_queue.enabled）")
+    p.add_argument("--processes", type=int, default=1, help="worker 进程数")
+    p.add_argument("--kinds", nargs="+", choices=["collect", "prepare", "finalize", "generate", "ingest", "chat"],
+                   help="只处理指定类型的任务（默认全部）")
+    p.add_argument("--once", action="store_true", help="队列为空时退出")
+    p.set_defaults(func=cmd_worker)
+
+    p = sub.add_parser("catalog", help="期别索引与归档")
+    p.add_argument("--rebuild", action="store_true", help="扫描 storage/ 重建索引")
+    p.add_argument("--archive", action="store_true", help="归档旧期别")
+    p.add_argument("--days", type=int, help="归档早于该天数的期别（默认 retention.archive_after_days）")
+    p.add_argument("-o", "--output", help="输出文件（默认标准输出）")
+    p.set_defaults(func=cmd_catalog)
+
+    p = sub.add_parser("ingest", help="下载并解析全文 PDF（配合 fulltext.enabled）")
+    p.add_argument("--period", help="指定期别，如 2025-10-09_AM（默认最近一期）")
+    p.add_argument("--input", help="使用已抓取的论文 JSON")
+    p.add_argument("-o", "--output", help="输出文件（默认标准输出）")
+    p.set_defaults(func=cmd_ingest)
+
+    import loadtest
+    p = sub.add_parser("loadtest", help="对话负载测试（假 Ollama）")
+    loadtest.build_parser(p)
+    p.set_defaults(func=cmd_loadtest)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    from utils import load_config
+    cfg = load_config(args.config)
+    from catalog import configure
+    configure(cfg)
+    return args.func(cfg, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
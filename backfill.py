@@ -0,0 +1,148 @@
+# backfill.py
+import json, os, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from dateutil.tz import gettz
+
+from arxiv_fetch import fetch_day, make_client, pack_papers
+from state import BASE, PeriodState
+from utils import fmt_period
+
+# 历史回填：按 (日期, 分类) 拆分成工作单元，在线程池中并发抓取，
+# 所有请求共用 arxiv_fetch.ARXIV_LIMITER，整体仍遵守 arXiv 的频率限制。
+# 每个单元完成后立即写入检查点，中断后重新运行会跳过已完成的单元。
+
+BACKFILL_DIR = BASE / "backfill"
+
+
+class Checkpoint:
+    """回填进度：已完成的单元与涉及的期别，原子写入"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.done = set()
+        self.periods = set()
+        if path.exists():
+            data = json.loads(path.read_text(encoding="utf-8"))
+            self.done = set(data.get("done", []))
+            self.periods = set(data.get("periods", []))
+
+    def mark(self, unit_key, periods):
+        with self._lock:
+            self.done.add(unit_key)
+            self.periods.update(periods)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"done": sorted(self.done), "periods": sorted(self.periods)},
+                                      ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.path)
+
+
+def work_units(start: date, end: date, cats):
+    """[start, end] 内每天每个分类一个单元"""
+    day = start
+    while day <= end:
+        for cat in cats:
+            yield day, cat
+        day += timedelta(days=1)
+
+
+def _merge_into_period(period, papers, lock):
+    # 同一期别可能由相邻两天的单元共同写入（UTC 与本地时区跨日），按 id 合并
+    with lock:
+        st = PeriodState(period)
+        existing = json.loads(st.raw_json.read_text(encoding="utf-8")) if st.raw_json.exists() else []
+        merged = {p["id"].split('v')[0]: p for p in existing}
+        for p in papers:
+            merged.setdefault(p["id"].split('v')[0], p)
+        data = sorted(merged.values(), key=lambda p: p["published"], reverse=True)
+        st.save_raw(data)
+
+
+def run_backfill(cfg, start: date, end: date, workers=4, summarize=False, restart=False):
+    """
+    回填 [start, end] 的论文，每个期别写入各自的 PeriodState
+
+    Args:
+        cfg: 配置字典
+        start, end: 起止日期（含）
+        workers: 并发线程数（请求频率仍由共享限速器决定）
+        summarize: 抓取完成后为缺少报告的期别生成报告
+        restart: 忽略已有检查点，从头开始
+
+    Returns:
+        list: 本次回填涉及的期别名
+    """
+    BACKFILL_DIR.mkdir(parents=True, exist_ok=True)
+    ckpt_path = BACKFILL_DIR / f"checkpoint_{start.isoformat()}_{end.isoformat()}.json"
+    if restart and ckpt_path.exists():
+        ckpt_path.unlink()
+    ckpt = Checkpoint(ckpt_path)
+
+    cats = cfg.get("categories", ["cs.AI", "cs.LG", "cs.CL", "cs.CV"])
+    tz_local = gettz(cfg.get("timezone", "America/New_York"))
+    per_unit = int(cfg.get("backfill_max_per_unit", 500))
+    units = [(d, c) for d, c in work_units(start, end, cats) if f"{d.isoformat()}_{c}" not in ckpt.done]
+    print(f" 回填 {start} ~ {end}: 共 {len(units)} 个待处理单元 (已完成 {len(ckpt.done)})")
+
+    period_lock = threading.Lock()
+    local = threading.local()
+
+    def run_unit(day, cat):
+        if not hasattr(local, "client"):
+            local.client = make_client(cfg)
+        papers = fetch_day(cfg, day, cat, max_items=per_unit, client=local.client)
+        by_period = {}
+        for p in pack_papers(cfg, papers):
+            pub_local = datetime.fromisoformat(p["published"]).astimezone(tz_local)
+            by_period.setdefault(fmt_period(pub_local), []).append(p)
+        for period, items in by_period.items():
+            _merge_into_period(period, items, period_lock)
+        ckpt.mark(f"{day.isoformat()}_{cat}", by_period.keys())
+        return day, cat, sum(len(v) for v in by_period.values())
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_unit, d, c) for d, c in units]
+        for fut in as_completed(futures):
+            try:
+                day, cat, n = fut.result()
+                print(f" 单元 {day} {cat}: {n} 篇")
+            except Exception as e:
+                # 失败的单元不写检查点，下次运行会重试
+                print(f" 单元失败: {e}")
+
+    periods = sorted(ckpt.periods)
+    if summarize:
+        _summarize_periods(cfg, periods, tz_local)
+    return periods
+
+
+def _summarize_periods(cfg, periods, tz_local):
+    import pipeline
+    from llm_sched import request_class
+
+    hours = int(cfg.get("time_window_hours", 12))
+    for period in periods:
+        st = PeriodState(period)
+        if st.report_md.exists() or not st.raw_json.exists():
+            continue  # 已生成的报告即视为完成，便于断点续跑
+        data = json.loads(st.raw_json.read_text(encoding="utf-8"))
+        if not data:
+            continue
+        day, ap = period.split("_")
+        since_local = datetime.fromisoformat(day).replace(hour=0 if ap == "AM" else 12, tzinfo=tz_local)
+        now_local = since_local + timedelta(hours=hours)
+        label = "早报" if ap == "AM" else "晚报"
+        # raw_papers.json 保留全部论文，报告只取前 digest_max_items 篇
+        items = data[:int(cfg.get("digest_max_items", 20))]
+        try:
+            with request_class("batch"):  # 回填让位于对话和定时报告
+                md = pipeline.generate(cfg, label, since_local, now_local, items)
+        except Exception as e:
+            print(f" 期别 {period} 报告生成失败: {e}")
+            continue
+        st.save_report(md)
+        st.save_prompt(pipeline.prompt_context(items, md))
+        print(f" 期别 {period} 报告已生成")
@@ -1,18 +1,30 @@
 # bot.py
-import os, json, yaml, asyncio, psutil, subprocess, sys, time
-from datetime import datetime
+import os, copy, json, yaml, asyncio, psutil, subprocess, sys, time
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from discord.ext import commands
 import discord
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from dateutil import tz
 import logging
 
-from utils import now_in_tz, last_window_start, fmt_period
-from arxiv_fetch import fetch_window, pack_papers
-from summarizer import run_ollama
+from utils import now_in_tz, last_window_start, fmt_period, load_config
 from state import PeriodState, latest_active_period
+from catalog import get_catalog
+import pipeline
+import answer_cache
+import jobqueue
+import worker
+import trends
+import profiler
+import ranking
+import loopwatch
+import config_reload
+from contextlib import nullcontext
+from ollama_pool import get_pool
+from watchlist import Watchlists
 
 # 设置日志
 logging.basicConfig(
@@ -31,12 +43,15 @@ intents = discord.Intents.default()
 intents.message_content = True
 bot = commands.Bot(command_prefix="arxiv-", intents=intents)  # 改为 arxiv- 前缀
 
-with open("config.yaml", "r", encoding="utf-8") as f:
-    CFG = yaml.safe_load(f)
+CONFIG_PATH = "config.yaml"
+CFG = load_config(CONFIG_PATH)
+CONFIG_MTIME = os.path.getmtime(CONFIG_PATH)
 
 TZNAME = CFG.get("timezone", "America/New_York")
 CHANNEL_ID = int(CFG["discord_channel_id"])  # 必填
 WINDOW_H = int(CFG.get("time_window_hours", 12))
+ANSWERS = answer_cache.from_cfg(CFG, hours=WINDOW_H)
+CATALOG = get_catalog(CFG)  # 期别索引使用配置的时区与推送时间
 
 # 全局状态
 BOT_STATUS = {
@@ -51,8 +66,87 @@ BOT_STATUS = {
 
 scheduler = AsyncIOScheduler(timezone=TZNAME)
 
+# 个人关注列表
+WATCHLISTS = Watchlists()
+
+# 事件循环卡顿监测（on_ready 时启动）
+WATCHDOG = loopwatch.from_cfg(CFG, logger)
+
+# 预取任务: period_label -> asyncio.Task(pipeline.prepare 的结果)
+PREPARED = {}
+
+# 后台通知任务（保留引用，避免任务在完成前被回收）
+NOTIFY_TASKS = set()
+
+# 任务队列：启用时抓取与模型调用交给独立的 worker 进程，bot 只负责推送
+JOBS = jobqueue.from_cfg(CFG)
+JOB_CFG = CFG.get("job_queue", {}) or {}
+
+async def offload(kind, payload, priority=0, timeout=None, on_event=None, llm=("manual", None)):
+    """
+    执行 worker.HANDLERS 中的任务：有队列时入队等待 worker，否则在线程池中执行
+
+    llm: (优先级类别, 截止时间戳)，决定任务中模型调用的准入顺序
+    """
+    payload = dict(payload, _llm=list(llm))
+    if JOBS is None:
+        return await asyncio.to_thread(worker.run_job, kind, CFG, payload, on_event or (lambda data: None))
+    job_id = await asyncio.to_thread(JOBS.enqueue, kind, payload, priority)
+    logger.info(f"任务 {job_id} ({kind}) 已入队")
+    return await jobqueue.wait_async(JOBS, job_id, poll=float(JOB_CFG.get("poll_interval", 1.0)),
+                                     timeout=timeout, on_event=on_event)
+
+async def prepare_digest(period_label: str, hour: int, minute: int):
+    """在推送时间之前后台抓取论文并完成耗时的模型调用"""
+    now_local = now_in_tz(TZNAME)
+    slot = now_local.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if slot < now_local:
+        slot += timedelta(days=1)
+    since_local = slot - timedelta(hours=WINDOW_H)
+
+    logger.info(f"开始预取{period_label}: 推送时间 {slot.strftime('%H:%M')}")
+    old = PREPARED.pop(period_label, None)
+    if old is not None and not old.done():
+        old.cancel()
+    PREPARED[period_label] = asyncio.create_task(_prepare(period_label, since_local, slot))
+
+async def _prepare(period_label, since_local, slot):
+    prepared = await offload("prepare", {"label": period_label, "since": since_local.isoformat(),
+                                         "until": slot.isoformat()},
+                             llm=("scheduled", slot.timestamp()))
+    return worker.decode_prepared(prepared)
+
 async def post_digest(period_label: str, manual=False):
-    """生成并发送 arXiv 摘要报告"""
+    """生成并发送 arXiv 摘要报告；arxiv-prof digest 开启时本次运行会被剖析"""
+    prof = profiler.take("digest")
+    if prof is None:
+        return await _post_digest(period_label, manual)
+    info = {}
+    with prof:
+        result = await _post_digest(period_label, manual, info)
+    # 保存到本次运行实际使用的期别（运行跨过早/晚报分界时与当前时间对应的期别不同）
+    if "period" not in info:
+        logger.warning("报告未确定期别，剖析结果未保存")
+        return result
+    await send_profile(prof, PeriodState(info["period"]).dir, bot.get_channel(CHANNEL_ID))
+    return result
+
+async def send_profile(prof, directory, channel):
+    """保存剖析结果到期别目录，并在频道中发送热点摘要"""
+    try:
+        prof_path, txt_path = await asyncio.to_thread(prof.save, directory)
+        logger.info(f"剖析结果已保存: {prof_path}")
+        if channel:
+            text = f" 剖析结果已保存到 `{txt_path}`\n" + prof.summary()
+            if JOBS is not None:
+                text += "\n(已启用任务队列：worker 进程中的部分未计入)"
+            for chunk in split_message(text):
+                await channel.send(chunk)
+    except Exception as e:
+        logger.error(f"保存剖析结果失败: {e}")
+
+async def _post_digest(period_label: str, manual=False, info=None):
+    """info 不为空时写入本次使用的期别 (info["period"])"""
     try:
         channel = bot.get_channel(CHANNEL_ID)
         if not channel:
@@ -61,10 +155,54 @@ async def post_digest(period_label: str, manual=False):
 
         now_local = now_in_tz(TZNAME)
         since_local = last_window_start(TZNAME, WINDOW_H)
-
-        logger.info(f"开始获取论文: {since_local} ~ {now_local}")
-        papers = fetch_window(CFG, since_local, now_local)
-        data = pack_papers(CFG, papers)
+        period = fmt_period(now_local)
+        st = PeriodState(period)
+        if info is not None:
+            info["period"] = period
+        # 定时报告带截止时间，临近截止时模型调用优先于对话；手动运行排在定时报告之后
+        grace = int(CFG.get("ollama", {}).get("deadline_grace_seconds", 900))
+        llm = ("manual", None) if manual else ("scheduled", time.time() + grace)
+
+        # 阶段清单：已完整推送的定时任务不重复推送；手动运行则重新生成
+        if st.stage_done("delivered"):
+            if not manual:
+                logger.info(f"{period} 已推送，跳过")
+                return True
+            st.reset_manifest()
+        resuming = st.stage_done("packed")
+        if resuming:
+            meta = st.manifest["meta"]
+            since_local = datetime.fromisoformat(meta["since"])
+            now_local = datetime.fromisoformat(meta["until"])
+            logger.info(f"从阶段清单恢复 {period}: 已完成 {', '.join(st.manifest['stages'])}")
+
+        # 定时任务优先使用提前预取的结果（预取仍在进行时等待其完成）
+        prepared = None
+        task = None if manual else PREPARED.pop(period_label, None)
+        if task is not None and not resuming:
+            try:
+                prepared = await task
+            except Exception as e:
+                logger.warning(f"预取结果不可用，改为完整生成: {e}")
+            if prepared and abs((now_local - prepared["until"]).total_seconds()) > 3600:
+                logger.info("预取结果已过期，改为完整生成")
+                prepared = None
+
+        md = None
+        if resuming:
+            data = json.loads(st.raw_json.read_text(encoding="utf-8"))
+            if st.stage_done("assembled"):
+                md = st.report_md.read_text(encoding="utf-8")
+        elif prepared:
+            since_local = prepared["since"]
+            logger.info(f"使用预取结果，执行增量补齐: {period_label}")
+            result = await offload("finalize", {"label": period_label, "now": now_local.isoformat(),
+                                                "prepared": worker.encode_prepared(prepared)}, llm=llm)
+            data, md = result["data"], result["md"]
+        else:
+            logger.info(f"开始获取论文: {since_local} ~ {now_local}")
+            data = await offload("collect", {"since": since_local.isoformat(), "until": now_local.isoformat()},
+                                 llm=llm)
 
         BOT_STATUS["last_fetch"] = now_local
         logger.info(f"获取到 {len(data)} 篇论文")
@@ -75,30 +213,38 @@ async def post_digest(period_label: str, manual=False):
             await channel.send(f" {period_label} | 本次时间窗口内没有新论文")
             return True
 
-        period = fmt_period(now_local)
-        st = PeriodState(period)
-        st.save_raw(data)
-
-        # 调用 Ollama 生成摘要
-        logger.info("开始生成摘要...")
-        md = run_ollama(CFG, period_label, since_local.isoformat(), now_local.isoformat(), json.dumps(data, ensure_ascii=False))
-        st.save_report(md)
-
-        # 生成 prompt 上下文
-        prompt_ctx = (
-            "# 原始条目 (JSON)\n" + json.dumps(data, ensure_ascii=False, indent=2) +
-            "\n\n# 早/晚报 (Markdown)\n" + md
-        )
-        st.save_prompt(prompt_ctx)
-
-        # 发送到 Discord
-        prefix = "" if manual else ""
-        title = f"{prefix} {period_label} | arXiv Digest ({since_local.strftime('%Y-%m-%d %H:%M')} ~ {now_local.strftime('%H:%M')} {TZNAME})"
-        await channel.send(title)
-
-        # 分段发送 md
-        for chunk in split_message(md):
-            await channel.send(chunk)
+        if not resuming:
+            st.save_raw(data)
+            # 关注列表通知在后台发送，不推迟报告生成
+            task = asyncio.create_task(notify_watchers(data), name="notify_watchers")
+            NOTIFY_TASKS.add(task)
+            task.add_done_callback(NOTIFY_TASKS.discard)
+            st.mark_stage("fetched")
+            st.mark_stage("packed", label=period_label, since=since_local.isoformat(), until=now_local.isoformat())
+
+        if md is None:
+            # 调用 Ollama 生成摘要（启用全文时先摄取 PDF；逐篇结果写入清单，失败重试时跳过已完成的论文）
+            logger.info("开始生成摘要...")
+            md = await offload("generate", {"period": period, "label": period_label,
+                                            "since": since_local.isoformat(), "until": now_local.isoformat()},
+                               on_event=lambda ev: logger.info(f"摘要完成: {ev.get('paper')}"), llm=llm)
+        if not st.stage_done("assembled"):
+            # 写文件并把本期计入趋势基线（分词、numpy 读写），放到线程池中执行
+            await asyncio.to_thread(pipeline.save, st, data, md, CFG)
+            # 发送到 Discord
+            prefix = "" if manual else ""
+            title = f"{prefix} {period_label} | arXiv Digest ({since_local.strftime('%Y-%m-%d %H:%M')} ~ {now_local.strftime('%H:%M')} {TZNAME})"
+            st.mark_stage("assembled", title=title)
+
+        # 分段发送，每段发送后记录消息 id；恢复时跳过已发送的分段
+        chunks = [st.manifest["meta"]["title"]] + split_message(md)
+        delivered = st.manifest["delivered"]
+        for idx, chunk in enumerate(chunks):
+            if str(idx) in delivered:
+                continue
+            msg = await channel.send(chunk)
+            st.mark_delivered(idx, msg.id)
+        st.mark_stage("delivered")
 
         BOT_STATUS["last_report"] = now_local
         BOT_STATUS["total_reports"] += 1
@@ -112,6 +258,38 @@ async def post_digest(period_label: str, manual=False):
         return False
 
 
+async def notify_watchers(papers):
+    """新抓取的论文与个人关注列表匹配，命中时私信通知（私信失败则在频道中提及）"""
+    try:
+        hits = WATCHLISTS.match_new(papers)
+    except Exception as e:
+        logger.error(f"关注列表匹配失败: {e}")
+        return
+    for uid, items in hits.items():
+        lines = [f"• {p['title']} ({p['link']}) — {', '.join(rs)}" for p, rs in items[:10]]
+        if len(items) > 10:
+            lines.append(f"…… 另有 {len(items) - 10} 篇")
+        text = "你关注的论文有更新：\n" + "\n".join(lines)
+        try:
+            user = await bot.fetch_user(int(uid))
+            for chunk in split_message(text):
+                await user.send(chunk)
+        except Exception:
+            channel = bot.get_channel(CHANNEL_ID)
+            if not channel:
+                continue
+            try:
+                for chunk in split_message(f"<@{uid}> " + text):
+                    await channel.send(chunk)
+            except Exception as e:
+                logger.warning(f"关注列表通知发送失败 ({uid}): {e}")
+                continue  # 未记录为已通知，下次抓取到时重试
+        # 只有发送成功才记录，失败的论文下次仍会通知
+        WATCHLISTS.mark_notified(uid, [p.get("id") for p, _ in items])
+    if hits:
+        logger.info(f"关注列表命中: {len(hits)} 位用户")
+
+
 def split_message(text, limit=1800):
     lines = text.split("\n")
     out, buf = [], []
@@ -223,13 +401,17 @@ async def manual_report(ctx, which: str):
     else:
         await ctx.send(" 生成失败，请检查日志")
 
-@bot.command(name="p-config", help="配置管理: get | set <key> <value>")
-async def config_manage(ctx, action: str, key: str = None, value: str = None):
-    """配置管理"""
+@bot.command(name="p-config", help="配置管理: get [key] | set <key> <value> | reload")
+async def config_manage(ctx, action: str, key: str = None, *, value: str = None):
+    """配置管理：修改立即生效，无需重启"""
+    global CONFIG_MTIME
     if action == "get":
         if key:
-            if key in CFG:
-                await ctx.send(f" {key}: `{CFG[key]}`")
+            node = CFG
+            for part in key.split("."):
+                node = node.get(part) if isinstance(node, dict) else None
+            if node is not None:
+                await ctx.send(f" {key}: `{node}`")
             else:
                 await ctx.send(f" 配置项 '{key}' 不存在")
         else:
@@ -244,28 +426,109 @@ async def config_manage(ctx, action: str, key: str = None, value: str = None):
                 await ctx.send(f" 当前配置:\n```yaml\n{config_text}\n```")
 
     elif action == "set" and key and value:
+        # key 可用 a.b 表示嵌套项，如 ollama.model；校验通过后立即生效并写回 config.yaml
         try:
-            # 尝试转换值的类型
-            if value.lower() in ["true", "false"]:
-                value = value.lower() == "true"
-            elif value.isdigit():
-                value = int(value)
-            elif "." in value and value.replace(".", "").isdigit():
-                value = float(value)
-
-            CFG[key] = value
-
-            with open("config.yaml", "w", encoding="utf-8") as f:
-                yaml.safe_dump(CFG, f, allow_unicode=True, sort_keys=False)
-
-            await ctx.send(f" 已更新 {key}: `{value}`")
+            value = config_reload.parse_value(value)
+            changes, actions = apply_config(config_reload.with_value(CFG, key, value))
+            await asyncio.to_thread(config_reload.save, CFG, CONFIG_PATH)
+            CONFIG_MTIME = os.path.getmtime(CONFIG_PATH)
+            await ctx.send(f" 已更新 {key}: `{value}`" + (f"\n已应用: {'; '.join(actions)}" if actions else ""))
             logger.info(f"配置已更新: {key} = {value}")
-
         except Exception as e:
             await ctx.send(f" 更新失败: {str(e)}")
 
+    elif action == "reload":
+        try:
+            changes, actions = await reload_config()
+            if not changes:
+                await ctx.send(" 配置没有变化")
+            else:
+                await ctx.send(f" 已重新加载 {len(changes)} 项: {', '.join(changes)[:1500]}" +
+                               (f"\n已应用: {'; '.join(actions)}" if actions else ""))
+        except Exception as e:
+            await ctx.send(f" 重新加载失败: {str(e)}")
+
     else:
-        await ctx.send(" 语法错误，使用: `arxiv-p-config get|set <key> <value>`")
+        await ctx.send(" 语法错误，使用: `arxiv-p-config get [key] | set <key> <value> | reload`")
+
+def apply_config(new):
+    """
+    校验并应用新配置：原地更新 CFG，只重建受影响的组件
+
+    Returns:
+        tuple: (变化的配置路径, 执行的操作说明)；校验失败时抛出 ValueError
+    """
+    global TZNAME, CHANNEL_ID, WINDOW_H, ANSWERS, CATALOG, JOBS, JOB_CFG, WATCHDOG
+    errors = config_reload.validate(new)
+    if errors:
+        raise ValueError("; ".join(errors))
+    changes = config_reload.diff(CFG, new)
+    if not changes:
+        return [], []
+    # 逐键替换而不是先清空：线程池/其他协程此时读取 CFG 只会看到旧值或新值，不会看到空配置
+    new = copy.deepcopy(new)
+    for key in [k for k in CFG if k not in new]:
+        CFG.pop(key, None)
+    CFG.update(new)
+
+    def hit(*keys):
+        return config_reload.touched(changes, *keys)
+
+    actions = []
+    if hit("timezone", "time_window_hours", "discord_channel_id"):
+        TZNAME = CFG.get("timezone", "America/New_York")
+        WINDOW_H = int(CFG.get("time_window_hours", 12))
+        CHANNEL_ID = int(CFG["discord_channel_id"])
+        actions.append("时区/时间窗口/频道")
+    if hit("timezone", "report_times"):
+        CATALOG = get_catalog(CFG)
+        actions.append("期别索引")
+    if hit("report_times", "prefetch_lead_minutes", "timezone", "retention", "config_reload"):
+        moved = sync_jobs()
+        if moved:
+            actions.append("定时任务 " + ", ".join(moved))
+    if hit(*(f"ollama.{k}" for k in ("hosts", "host", "ps_ttl", "fail_threshold", "cooldown", "cold_penalty",
+                                     "reserve_interactive", "urgent_seconds"))):
+        get_pool(CFG)  # 新请求使用新连接池，进行中的请求在旧连接池上完成
+        actions.append("Ollama 连接池")
+    if hit("answer_cache", "time_window_hours"):
+        ANSWERS = answer_cache.from_cfg(CFG, hours=WINDOW_H)
+        actions.append("答案缓存")
+    if hit("job_queue"):
+        JOBS = jobqueue.from_cfg(CFG)
+        JOB_CFG = CFG.get("job_queue", {}) or {}
+        actions.append("任务队列")
+    if hit("loop_watchdog"):
+        if WATCHDOG:
+            WATCHDOG.stop()
+        WATCHDOG = loopwatch.from_cfg(CFG, logger)
+        if WATCHDOG and bot.is_ready():
+            WATCHDOG.start()
+        actions.append("卡顿监测")
+    # 趋势、HTTP 缓存与排序参数下次使用时按新配置原地调整；嵌入后端/模型/维度变化时，排序改用该嵌入空间
+    # 自己的目录 storage/embeddings/<嵌入空间>/（已有向量与兴趣直接复用，切回原模型也不会互相覆盖）
+    for section, name in (("trends", "趋势统计"), ("ranking", "个性化排序"), ("http_cache", "HTTP 缓存")):
+        if hit(section):
+            actions.append(name)
+    logger.info(f"配置变化: {', '.join(changes)} | 已应用: {'; '.join(actions) or '无需重建'}")
+    return changes, actions
+
+async def reload_config():
+    """从 config.yaml 重新加载（config.yaml 被修改后由定时检查或 arxiv-p-config reload 触发）"""
+    global CONFIG_MTIME
+    mtime = os.path.getmtime(CONFIG_PATH)
+    new = await asyncio.to_thread(load_config, CONFIG_PATH)
+    CONFIG_MTIME = mtime
+    return apply_config(new)
+
+async def watch_config():
+    """config.yaml 的修改时间变化时自动重新加载；校验失败则保留当前配置"""
+    try:
+        if os.path.getmtime(CONFIG_PATH) == CONFIG_MTIME:
+            return
+        await reload_config()
+    except Exception as e:
+        logger.error(f"配置重新加载失败，保留当前配置: {e}")
 
 @bot.command(name="p-logs", help="查看日志: [lines=10]")
 async def show_logs(ctx, lines: int = 10):
@@ -287,57 +550,187 @@ async def show_logs(ctx, lines: int = 10):
     except Exception as e:
         await ctx.send(f" 读取日志失败: {str(e)}")
 
+# 已添加到调度器的任务: id -> 规格，配置变化时只改动规格不同的任务
+SCHEDULED = {}
+
+def desired_jobs():
+    """按当前配置计算应有的定时任务 {id: (函数, 触发器参数, args, 名称)}"""
+    jobs = {}
+    lead = int(CFG.get("prefetch_lead_minutes", 20))
+    for t in CFG.get("report_times", ["10:00", "22:00"]):
+        hour, minute = map(int, t.split(":"))
+        label = "早报" if hour < 12 else "晚报"
+        if lead > 0:
+            # 提前 lead 分钟预取与生成，推送时只做增量补齐和发送
+            prep = (hour * 60 + minute - lead) % (24 * 60)
+            jobs[f"prep_{label}"] = (prepare_digest, ("cron", prep // 60, prep % 60, TZNAME),
+                                     (label, hour, minute), f"{label}预取")
+        jobs[f"daily_{label}"] = (post_digest, ("cron", hour, minute, TZNAME), (label,), f"{label}")
+
+    # 每天归档过期的期别目录
+    keep_days = int((CFG.get("retention", {}) or {}).get("archive_after_days", 0))
+    if keep_days > 0:
+        jobs["archive_periods"] = (archive_periods, ("cron", int(CFG["retention"].get("archive_hour", 4)), 0, TZNAME),
+                                   (keep_days,), "归档旧报告")
+
+    # 检查 config.yaml 是否被修改
+    watch = int((CFG.get("config_reload", {}) or {}).get("watch_seconds", 30))
+    if watch > 0:
+        jobs["watch_config"] = (watch_config, ("interval", watch), (), "配置检查")
+    return jobs
+
+def sync_jobs():
+    """使调度器中的任务与配置一致，返回有变动的任务 id"""
+    want = desired_jobs()
+    moved = []
+    for job_id in set(SCHEDULED) - set(want):
+        if scheduler.get_job(job_id):
+            scheduler.remove_job(job_id)
+        del SCHEDULED[job_id]
+        moved.append(f"-{job_id}")
+    for job_id, spec in want.items():
+        if SCHEDULED.get(job_id) == spec:
+            continue
+        func, trig, args, name = spec
+        trigger = (CronTrigger(hour=trig[1], minute=trig[2], timezone=trig[3]) if trig[0] == "cron"
+                   else IntervalTrigger(seconds=trig[1]))
+        scheduler.add_job(func, trigger, args=list(args), name=name, id=job_id, replace_existing=True)
+        moved.append(f"~{job_id}" if job_id in SCHEDULED else f"+{job_id}")
+        SCHEDULED[job_id] = spec
+    return moved
+
 def start_scheduler():
     """启动调度器"""
     if scheduler.running:
         return
 
-    # 清除现有任务
+    # 清除现有任务后按配置重新添加
     scheduler.remove_all_jobs()
-
-    # 添加定时任务
-    for t in CFG.get("report_times", ["10:00", "22:00"]):
-        hour, minute = map(int, t.split(":"))
-        label = "早报" if hour < 12 else "晚报"
-        scheduler.add_job(
-            post_digest,
-            CronTrigger(hour=hour, minute=minute),
-            args=[label],
-            name=f"{label}",
-            id=f"daily_{label}"
-        )
+    SCHEDULED.clear()
+    sync_jobs()
 
     scheduler.start()
     BOT_STATUS["scheduler"] = scheduler
     logger.info("调度器已启动")
 
+async def archive_periods(keep_days):
+    """把早于 keep_days 天的期别打包归档"""
+    try:
+        done = await asyncio.to_thread(get_catalog().archive, keep_days)
+        if done:
+            logger.info(f"已归档 {len(done)} 期: {done[0]} ~ {done[-1]}")
+    except Exception as e:
+        logger.error(f"归档失败: {e}")
+
 def stop_scheduler():
     """停止调度器"""
     if scheduler.running:
         scheduler.shutdown(wait=False)
         logger.info("调度器已停止")
 
+WATCH_KINDS = {"author": "authors", "keyword": "keywords", "kw": "keywords", "cat": "categories", "category": "categories"}
+
+@bot.command(name="watch", help="关注列表: add|remove <author|keyword|cat> <值> | list")
+async def watch(ctx, action: str = "list", kind: str = None, *, value: str = None):
+    """个人关注列表：新论文命中作者/关键词/分类时私信通知"""
+    if action == "list":
+        w = WATCHLISTS.get(ctx.author.id)
+        if not any(w.get(k) for k in ("authors", "keywords", "categories")):
+            await ctx.send(" 你还没有关注任何作者、关键词或分类")
+            return
+        text = "\n".join(f"**{name}**: {', '.join(w.get(k, [])) or '无'}"
+                         for name, k in (("作者", "authors"), ("关键词", "keywords"), ("分类", "categories")))
+        await ctx.send(f" {ctx.author.mention} 的关注列表:\n{text}")
+        return
+
+    if action not in ("add", "remove") or kind not in WATCH_KINDS or not value:
+        await ctx.send(" 语法错误，使用: `arxiv-watch add|remove author|keyword|cat <值>` 或 `arxiv-watch list`")
+        return
+
+    value = value.strip()
+    if action == "add":
+        changed = WATCHLISTS.add(ctx.author.id, WATCH_KINDS[kind], value)
+        await ctx.send(f" 已关注 {kind}: `{value}`" if changed else f" 已在关注列表中: `{value}`")
+    else:
+        changed = WATCHLISTS.remove(ctx.author.id, WATCH_KINDS[kind], value)
+        await ctx.send(f" 已取消关注 {kind}: `{value}`" if changed else f" 关注列表中没有: `{value}`")
+
+@bot.command(name="trends", help="跨期趋势: 最近一期的高频词、上升词与分类占比变化")
+async def trends_cmd(ctx):
+    """显示最近一期相对滚动基线的趋势（记录时已算好，不重新扫描历史）"""
+    if not trends.enabled(CFG):
+        await ctx.send(" 趋势统计未启用 (trends.enabled)")
+        return
+    store = trends.get_store(CFG)
+    last = await asyncio.to_thread(store.last)
+    if not last:
+        await ctx.send(" 还没有趋势数据，请先生成报告")
+        return
+    top_terms, rising_terms, category_shift = trends.format_trends(last)
+    embed = discord.Embed(
+        title=f" 趋势 | {last['period']}",
+        description=f"本期 {last['papers']} 篇，基线 {last['baseline_periods']} 期 / {last['baseline_papers']} 篇",
+        color=discord.Color.purple()
+    )
+    embed.add_field(name="高频词", value=top_terms[:1024], inline=False)
+    embed.add_field(name="上升词", value=rising_terms[:1024], inline=False)
+    embed.add_field(name="分类占比", value=category_shift[:1024], inline=False)
+    await ctx.send(embed=embed)
+
+@bot.command(name="prof", help="性能剖析: digest | chat | off | status")
+async def prof_cmd(ctx, target: str = "status"):
+    """为下一次报告或对话开启 cProfile + tracemalloc，运行一次后自动关闭"""
+    allowed = CFG.get("allowed_users") or []
+    if allowed and ctx.author.id not in allowed and str(ctx.author) not in allowed:
+        await ctx.send(" 没有权限")
+        return
+    target = target.lower()
+    if target in profiler.TARGETS:
+        profiler.arm(target)
+        await ctx.send(f" 已开启剖析: 下一次{'报告' if target == 'digest' else '对话'}运行时记录")
+    elif target == "off":
+        profiler.disarm()
+        await ctx.send(" 已关闭剖析")
+    elif target == "status":
+        armed = profiler.armed()
+        await ctx.send(f" 等待剖析: {', '.join(armed)}" if armed else " 剖析未开启")
+    else:
+        await ctx.send(" 语法错误，使用: `arxiv-prof digest|chat|off|status`")
+
 # ===== 专用命令 =====
 
 @bot.command(name="smi", help="显示 arXiv Push 实时状态 (类似 nvidia-smi)")
 async def smi(ctx):
     """实时状态检测 - 类似 nvidia-smi"""
 
-    # 系统资源信息
-    cpu_percent = psutil.cpu_percent(interval=1)
+    # 系统资源信息（cpu_percent 会阻塞 1 秒，放到线程中）
+    cpu_percent = await asyncio.to_thread(psutil.cpu_percent, interval=1)
     memory = psutil.virtual_memory()
     disk = psutil.disk_usage('/')
 
-    # Ollama 状态检查
-    ollama_status = " 运行中"
+    # Ollama 状态检查（连接池中的每台主机，并发探测）
     ollama_model = CFG.get("ollama", {}).get("model", "未知")
-    try:
-        import requests
-        response = requests.get(f"{CFG.get('ollama', {}).get('host', 'http://127.0.0.1:11434')}/api/tags", timeout=5)
-        if response.status_code != 200:
-            ollama_status = " 无响应"
-    except:
-        ollama_status = " 连接失败"
+    ollama_lines = []
+    import requests
+
+    def probe(host):
+        try:
+            response = requests.get(f"{host}/api/tags", timeout=5)
+            return " 运行中" if response.status_code == 200 else " 无响应"
+        except Exception:
+            return " 连接失败"
+
+    backends = get_pool(CFG).status()
+    states = await asyncio.gather(*(asyncio.to_thread(probe, be["host"]) for be in backends))
+    for be, state in zip(backends, states):
+        if not be["healthy"]:
+            state += " (熔断)"
+        ollama_lines.append(f"{be['host']}: {state} | 在途 {be['inflight']}/{be['weight']} | 完成 {be['served']}")
+
+    # 模型调用准入（本进程；启用任务队列时各 worker 各自调度）
+    sched = get_pool(CFG).scheduler.stats()
+    sched_lines = [f"{c}: 运行 {v['inflight']} | 排队 {v['queued']} | 完成 {v['served']} | p95 等待 {v['wait_p95_s']}s"
+                   for c, v in sched["classes"].items() if v["served"] or v["inflight"] or v["queued"]]
 
     # 调度器状态
     scheduler_status = " 运行中" if scheduler.running else " 已停止"
@@ -378,10 +771,52 @@ async def smi(ctx):
     # Ollama 状态
     embed.add_field(
         name=" Ollama",
-        value=f"**状态**: {ollama_status}\n**模型**: {ollama_model}\n**接口**: {CFG.get('ollama', {}).get('host', 'http://127.0.0.1:11434')}",
+        value=f"**模型**: {ollama_model}\n**主机**:\n" + "\n".join(ollama_lines) +
+              f"\n**准入** (容量 {sched['capacity']}):\n" + ("\n".join(sched_lines) or "空闲"),
         inline=True
     )
 
+    # 对话答案缓存
+    if ANSWERS:
+        ac = ANSWERS.stats()
+        embed.add_field(
+            name=" 答案缓存",
+            value=f"**命中**: {ac['hits']} (相似 {ac['similar_hits']})\n**未命中**: {ac['misses']}\n**命中率**: {ac['hit_rate']:.0%}\n**条目**: {ac['entries']}",
+            inline=True
+        )
+
+    # 个性化排序
+    if ranking.enabled(CFG):
+        rs = await asyncio.to_thread(ranking.get_ranker(CFG).stats)
+        embed.add_field(
+            name=" 个性化排序",
+            value=f"**模型**: {rs['model']}\n**已嵌入**: {rs['papers']} 篇\n**回应**: {rs['reactions']} 次 / {rs['users']} 人\n**状态**: {'按兴趣排序' if rs['active'] else '回应不足，按时间排序'}",
+            inline=True
+        )
+
+    # 任务队列
+    if JOBS:
+        js = await asyncio.to_thread(JOBS.stats)
+        counts = js["counts"]
+        workers = "\n".join(f"• {w['worker']}" + (f" (任务 {w['current']})" if w["current"] else "")
+                             for w in js["workers"]) or "无在线 worker"
+        embed.add_field(
+            name=" 任务队列",
+            value=f"**排队**: {counts.get('queued', 0)} | **运行**: {counts.get('running', 0)}\n**完成**: {counts.get('done', 0)} | **失败**: {counts.get('failed', 0)}\n**Worker**:\n{workers}",
+            inline=True
+        )
+
+    # 事件循环卡顿
+    if WATCHDOG:
+        lw = WATCHDOG.stats(limit=3)
+        worst = "\n".join(f"• {o['source']} @ {o['site']} — {o['count']} 次, 最长 {o['max']}s"
+                          for o in lw["offenders"]) or "无"
+        embed.add_field(
+            name=" 事件循环",
+            value=f"**滞后 p99**: {lw['lag_p99_ms']} ms | **最大**: {lw['lag_max_ms']} ms\n**阻塞次数**: {lw['stalls']} (>{WATCHDOG.threshold}s)\n**主要来源**:\n{worst}"[:1024],
+            inline=False
+        )
+
     # 网络状态
     embed.add_field(
         name=" 网络",
@@ -460,7 +895,29 @@ async def help_cmd(ctx):
     # 配置管理
     embed.add_field(
         name="配置管理",
-        value="`arxiv-p-config get [key]` - 查看配置项\n`arxiv-p-config set <key> <value>` - 修改配置\n`arxiv-p-logs [lines=10]` - 查看系统日志",
+        value="`arxiv-p-config get [key]` - 查看配置项\n`arxiv-p-config set <key> <value>` - 修改配置（立即生效，如 `ollama.model`、`report_times [\"09:00\", \"21:00\"]`）\n`arxiv-p-config reload` - 重新加载 config.yaml\n`arxiv-p-logs [lines=10]` - 查看系统日志",
+        inline=False
+    )
+
+    # 关注列表
+    embed.add_field(
+        name="趋势",
+        value="`arxiv-trends` - 最近一期的高频词、上升词与分类占比变化（相对近期滚动基线）",
+        inline=False
+    )
+    embed.add_field(
+        name="性能剖析",
+        value="`arxiv-prof digest|chat` - 剖析下一次报告/对话，结果写入期别目录\n`arxiv-prof off` - 关闭",
+        inline=False
+    )
+    embed.add_field(
+        name="个性化排序",
+        value="启用 `ranking` 后，对报告消息添加表情回应（👎 表示不感兴趣）即可训练团队兴趣，之后的报告会从更多候选中优先挑选相关论文",
+        inline=False
+    )
+    embed.add_field(
+        name="关注列表",
+        value="`arxiv-watch add author|keyword|cat <值>` - 关注作者/关键词/分类\n`arxiv-watch remove ...` - 取消关注\n`arxiv-watch list` - 查看关注列表\n新论文命中时会私信通知",
         inline=False
     )
 
@@ -476,6 +933,16 @@ async def help_cmd(ctx):
 
 # ===== 事件处理 =====
 
+async def resume_pending():
+    """重启后继续本期未完成的报告（只检查当前期别，不补发历史报告）"""
+    period = fmt_period(now_in_tz(TZNAME))
+    m = PeriodState.load_manifest(period)
+    if not m or "delivered" in m["stages"] or "packed" not in m["stages"]:
+        return
+    label = m["meta"].get("label", "早报" if period.endswith("_AM") else "晚报")
+    logger.info(f"发现未完成的报告 {period}，从阶段清单恢复")
+    await post_digest(label)
+
 @bot.event
 async def on_ready():
     """Bot 启动事件"""
@@ -484,6 +951,14 @@ async def on_ready():
     # 启动调度器
     start_scheduler()
 
+    if WATCHDOG and not WATCHDOG.running:
+        WATCHDOG.start()
+
+    # 只在首次就绪时恢复，断线重连触发的 on_ready 不重复执行
+    if not BOT_STATUS.get("resumed"):
+        BOT_STATUS["resumed"] = True
+        asyncio.create_task(resume_pending())
+
     # 发送启动消息
     try:
         channel = bot.get_channel(CHANNEL_ID)
@@ -498,10 +973,51 @@ async def on_message(message: discord.Message):
     if message.author == bot.user:
         return
 
+    # 先处理命令
     try:
-        # 先处理命令
         await bot.process_commands(message)
+    except Exception as e:
+        logger.error(f"处理命令失败: {e}")
+
+    await handle_chat(message)
+
+@bot.before_invoke
+async def name_command_task(ctx):
+    """命令运行期间以命令名标记当前任务，卡顿监测据此归类"""
+    asyncio.current_task().set_name(f"arxiv-{ctx.command.name}")
+
+@bot.after_invoke
+async def restore_task_name(ctx):
+    asyncio.current_task().set_name("discord.py: on_message")
+
+@bot.event
+async def on_raw_reaction_add(payload):
+    await record_reaction(payload, removed=False)
+
+@bot.event
+async def on_raw_reaction_remove(payload):
+    await record_reaction(payload, removed=True)
 
+async def record_reaction(payload, removed):
+    """报告消息上的表情回应用于更新该用户的兴趣向量（ranking.enabled）"""
+    if not ranking.enabled(CFG) or payload.channel_id != CHANNEL_ID or payload.user_id == bot.user.id:
+        return
+    try:
+        channel = bot.get_channel(CHANNEL_ID)
+        msg = await channel.fetch_message(payload.message_id)
+        if msg.author != bot.user:
+            return
+        ids = list(dict.fromkeys(ranking.ARXIV_ID.findall(msg.content)))
+        if not ids:
+            return
+        n = await asyncio.to_thread(ranking.get_ranker(CFG).feedback, payload.user_id, ids, payload.emoji, removed)
+        logger.info(f"兴趣反馈: 用户 {payload.user_id} {'撤销' if removed else ''}{payload.emoji} → {n} 篇")
+    except Exception as e:
+        logger.warning(f"记录表情回应失败: {e}")
+
+async def handle_chat(message):
+    """以 / 开头的消息：与最近一期报告对话（负载测试直接调用此函数）"""
+    try:
         # 普通聊天：如果在 12 小时有效期内，与最近的报告对话
         if message.channel.id != CHANNEL_ID:
             return
@@ -530,30 +1046,40 @@ async def on_message(message: discord.Message):
             await message.channel.send(" 没有找到报告上下文，请先生成报告")
             return  # 没有上下文
 
-        st.append_chat("user", user_msg)
-
-        # 构建对话提示
-        prompt = (
-            "你是学术助手。以下是某期 arXiv 早/晚报的上下文，请基于此逐问逐答。"
-            "若用户要求对比/延伸，请引用报文中的条目并给出具体理由。\n\n" + ctx_text +
-            "\n\n# 用户提问\n" + user_msg
-        )
-
-        # 调用 Ollama 进行对话
-        import requests
-        host = CFG.get("ollama", {}).get("host", "http://127.0.0.1:11434")
-        model = CFG.get("ollama", {}).get("model", "qwen2.5:7b")
-        payload = {"model": model, "prompt": prompt, "stream": False, "keep_alive": CFG.get("ollama", {}).get("keep_alive", 0)}
-
-        response = requests.post(f"{host}/api/generate", json=payload, timeout=300)
-        response.raise_for_status()
-        answer = response.json().get("response", "").strip()
-
-        st.append_chat("assistant", answer)
+        # arxiv-prof chat 开启时剖析本轮对话
+        prof = profiler.take("chat")
+        with prof or nullcontext():
+            t0 = time.perf_counter()
+            fsync = CFG.get("chat_fsync", "never")
+            history = st.recent_chat(int(CFG.get("chat_history_turns", 6)))
+            st.append_chat("user", user_msg, user=str(message.author), channel=message.channel.id,
+                           message_id=message.id, fsync=fsync)
+
+            # 先查答案缓存；未命中再调用 Ollama（报告上下文按期别/模型只编码一次）
+            stamp = st.prompt_context.stat().st_mtime_ns
+            model = CFG.get("ollama", {}).get("model", "qwen2.5:7b")
+            asker = str(message.author)
+            answer = (ANSWERS.get(name, st.dir, model, user_msg, stamp=stamp, history=history, user=asker)
+                      if ANSWERS else None)
+            cached = answer is not None
+            if not cached:
+                # 无队列时在线程池中执行，模型调用（及准入等待）不阻塞事件循环；
+                # 有队列时对话任务优先于报告任务被 worker 领取
+                answer = await offload("chat", {"period": name, "question": user_msg, "history": history,
+                                                "stamp": stamp}, priority=10, llm=("interactive", None),
+                                       timeout=float(JOB_CFG.get("chat_timeout", 300)))
+                if ANSWERS:
+                    ANSWERS.put(name, st.dir, model, user_msg, answer, stamp=stamp, history=history, user=asker)
+
+            st.append_chat("assistant", answer, user=str(bot.user), channel=message.channel.id,
+                           message_id=message.id, latency_ms=round((time.perf_counter() - t0) * 1000),
+                           cached=cached or None, fsync=fsync)
 
         # 分段发送回复
         for chunk in split(answer):
             await message.channel.send(chunk)
+        if prof:
+            await send_profile(prof, st.dir, message.channel)
 
     except Exception as e:
         logger.error(f"处理消息失败: {e}")
@@ -0,0 +1,298 @@
+# catalog.py
+import bisect, json, os, re, shutil, threading, time, zipfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from dateutil import tz
+
+import state
+
+# 期别目录索引 storage/catalog.json
+#   periods: {期别: {"slot": 推送时间戳, "state": open|ready|archived, "bytes", "files", "archive"}}
+# 推送时间按配置的 timezone 与 report_times 计算（AM 取中午前的时间，PM 取中午后的时间），
+# 内存中另有按 slot 排序的列表，查找最近一期为 O(1)，按时间定位为 O(log n)。
+#
+# 保留策略：早于 archive_after_days 的期别按月打包进 storage/archive/<YYYY-MM>.zip 并删除原目录，
+# 再次访问时 (PeriodState) 自动从压缩包解出，因此旧报告仍可读取和对话。
+
+PERIOD_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})_(AM|PM)$")
+
+
+def _slot_hours(report_times):
+    am, pm = (10, 0), (22, 0)
+    for t in report_times or []:
+        h, m = (int(x) for x in str(t).split(":"))
+        if h < 12:
+            am = (h, m)
+        else:
+            pm = (h, m)
+    return am, pm
+
+
+class Catalog:
+    def __init__(self, root, tzname="America/New_York", report_times=None):
+        self.root = Path(root)
+        self.path = self.root / "catalog.json"
+        self.archive_dir = self.root / "archive"
+        self.tz = tz.gettz(tzname)
+        self.am, self.pm = _slot_hours(report_times)
+        self._lock = threading.RLock()
+        self._mtime = None
+        self.periods = {}
+        self._order = []  # [(slot, period)]，按 slot 升序
+        self._load()
+
+    # ---- 索引维护 ----
+
+    def slot(self, period):
+        """期别名对应的推送时间（配置时区）"""
+        m = PERIOD_RE.match(period)
+        if not m:
+            return None
+        h, mi = self.am if m.group(2) == "AM" else self.pm
+        return datetime.fromisoformat(m.group(1)).replace(hour=h, minute=mi, tzinfo=self.tz)
+
+    def _reindex(self):
+        self._order = sorted((e["slot"], p) for p, e in self.periods.items())
+
+    def _load(self):
+        if not self.path.exists():
+            self.rebuild()
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (ValueError, OSError):
+            self.rebuild()
+            return
+        self._mtime = self.path.stat().st_mtime_ns
+        self.periods = data.get("periods", {})
+        self._reindex()
+
+    def _refresh(self):
+        # worker 等其他进程也会更新索引，文件变化时重新读取
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._mtime:
+            self._load()
+
+    def _save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"version": 1, "periods": self.periods}, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.path)
+        self._mtime = self.path.stat().st_mtime_ns
+
+    def _measure(self, d):
+        size = files = 0
+        for dirpath, _, names in os.walk(d):
+            for n in names:
+                size += os.path.getsize(os.path.join(dirpath, n))
+                files += 1
+        return size, files
+
+    def _entry(self, period, state_name):
+        d = self.root / period
+        size, files = self._measure(d) if d.is_dir() else (0, 0)
+        return {"slot": self.slot(period).timestamp(), "state": state_name, "bytes": size, "files": files}
+
+    def rebuild(self):
+        """扫描 storage/ 与压缩包重建索引（索引丢失或升级时使用）"""
+        with self._lock:
+            periods = {}
+            if self.archive_dir.is_dir():
+                for zp in sorted(self.archive_dir.glob("*.zip")):
+                    with zipfile.ZipFile(zp) as zf:
+                        for info in zf.infolist():
+                            name = info.filename.split("/", 1)[0]
+                            if not PERIOD_RE.match(name):
+                                continue
+                            e = periods.setdefault(name, {"slot": self.slot(name).timestamp(), "state": "archived",
+                                                          "bytes": 0, "files": 0, "archive": zp.name})
+                            e["bytes"] += info.file_size
+                            e["files"] += 1
+            if self.root.is_dir():
+                for d in self.root.iterdir():
+                    if d.is_dir() and PERIOD_RE.match(d.name):
+                        e = self._entry(d.name, "ready" if (d / "prompt_context.txt").exists() else "open")
+                        if d.name in periods:
+                            e["archive"] = periods[d.name]["archive"]
+                        periods[d.name] = e
+            self.periods = periods
+            self._reindex()
+            if periods or self.path.exists():
+                self._save()
+
+    def add(self, period):
+        """登记新期别"""
+        if not PERIOD_RE.match(period):
+            return
+        with self._lock:
+            self._refresh()
+            if period in self.periods:
+                return
+            self.periods[period] = self._entry(period, "open")
+            bisect.insort(self._order, (self.periods[period]["slot"], period))
+            self._save()
+
+    def update(self, period, state_name=None):
+        """刷新期别的状态与大小"""
+        if not PERIOD_RE.match(period):
+            return
+        with self._lock:
+            self._refresh()
+            old = self.periods.get(period, {})
+            e = self._entry(period, state_name or old.get("state", "open"))
+            e.update({k: old[k] for k in ("archive", "restored_at") if k in old})
+            if period not in self.periods:
+                bisect.insort(self._order, (e["slot"], period))
+            self.periods[period] = e
+            self._save()
+
+    # ---- 查询 ----
+
+    def latest(self):
+        with self._lock:
+            self._refresh()
+            return self._order[-1][1] if self._order else None
+
+    def latest_active(self, now_dt, hours=12):
+        """最近一期且推送时间距 now_dt 不超过 hours 小时，否则返回 None"""
+        name = self.latest()
+        if name is None:
+            return None
+        if now_dt.timestamp() - self.periods[name]["slot"] <= hours * 3600:
+            return name
+        return None
+
+    def at(self, dt):
+        """dt 时刻（含）之前最近的一期"""
+        with self._lock:
+            self._refresh()
+            i = bisect.bisect_right(self._order, dt.timestamp(), key=lambda x: x[0])
+            return self._order[i - 1][1] if i else None
+
+    def list(self, state_name=None):
+        with self._lock:
+            self._refresh()
+            return [(p, self.periods[p]) for _, p in self._order
+                    if state_name is None or self.periods[p]["state"] == state_name]
+
+    def stats(self):
+        with self._lock:
+            out = {}
+            for e in self.periods.values():
+                s = out.setdefault(e["state"], {"periods": 0, "bytes": 0, "files": 0})
+                s["periods"] += 1
+                s["bytes"] += e["bytes"]
+                s["files"] += e["files"]
+            return out
+
+    # ---- 归档 ----
+
+    def is_archived(self, period):
+        with self._lock:
+            self._refresh()
+            e = self.periods.get(period)
+            return bool(e and e["state"] == "archived")
+
+    def restore(self, period):
+        """把归档的期别解压回 storage/<period>/；不是归档状态时不做任何事"""
+        with self._lock:
+            if not self.is_archived(period):
+                return False
+            zp = self.archive_dir / self.periods[period]["archive"]
+            with zipfile.ZipFile(zp) as zf:
+                members = [n for n in zf.namelist() if n.startswith(period + "/")]
+                zf.extractall(self.root, members)
+            self.update(period, "ready")
+            self.periods[period]["restored_at"] = time.time()
+            self._save()
+            return True
+
+    def read_text(self, period, filename):
+        """不解压整期，直接读取某个文件"""
+        d = self.root / period
+        if d.is_dir():
+            return (d / filename).read_text(encoding="utf-8")
+        e = self.periods.get(period)
+        if not e or "archive" not in e:
+            raise FileNotFoundError(f"{period}/{filename}")
+        with zipfile.ZipFile(self.archive_dir / e["archive"]) as zf:
+            return zf.read(f"{period}/{filename}").decode("utf-8")
+
+    def _pack(self, zp, period, d):
+        prefix = period + "/"
+        if zp.exists():
+            with zipfile.ZipFile(zp) as zf:
+                stale = any(n.startswith(prefix) for n in zf.namelist())
+            if stale:
+                # zip 不支持替换条目：重写压缩包，去掉该期的旧内容
+                tmp = zp.with_suffix(".tmp")
+                with zipfile.ZipFile(zp) as src, zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED) as dst:
+                    for info in src.infolist():
+                        if not info.filename.startswith(prefix):
+                            dst.writestr(info, src.read(info.filename))
+                os.replace(tmp, zp)
+        with zipfile.ZipFile(zp, "a", zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
+            for f in sorted(d.rglob("*")):
+                if f.is_file():
+                    zf.write(f, f"{period}/{f.relative_to(d).as_posix()}")
+
+    def archive(self, older_than_days, now=None):
+        """
+        把推送时间早于 older_than_days 天的期别按月打包并删除原目录
+
+        Returns:
+            list: 本次归档的期别
+        """
+        cutoff = (now or datetime.now(self.tz)) - timedelta(days=older_than_days)
+        done = []
+        with self._lock:
+            self._refresh()
+            self.archive_dir.mkdir(parents=True, exist_ok=True)
+            for period, e in list(self.list()):
+                if e["slot"] >= cutoff.timestamp() or e["state"] == "archived":
+                    continue
+                d = self.root / period
+                if not d.is_dir():
+                    continue
+                zp = self.archive_dir / f"{period[:7]}.zip"
+                restored = e.get("restored_at")
+                unchanged = restored and e.get("archive") and all(
+                    f.stat().st_mtime <= restored for f in d.rglob("*") if f.is_file())
+                if not unchanged:
+                    self._pack(zp, period, d)
+                size, files = self._measure(d)
+                shutil.rmtree(d)
+                self.periods[period] = {"slot": e["slot"], "state": "archived", "bytes": size,
+                                        "files": files, "archive": zp.name}
+                done.append(period)
+            if done:
+                self._save()
+        return done
+
+
+_CATALOGS = {}
+_CFG = {}
+_LOCK = threading.Lock()
+
+
+def configure(cfg):
+    """记录时区与推送时间，之后创建的索引都按此计算推送时间"""
+    global _CFG
+    with _LOCK:
+        _CFG = {"tz": cfg.get("timezone", "America/New_York"), "times": tuple(cfg.get("report_times") or ())}
+
+
+def get_catalog(cfg=None):
+    """当前 storage 根目录对应的索引"""
+    if cfg is not None:
+        configure(cfg)
+    with _LOCK:
+        key = (str(state.BASE), _CFG.get("tz"), _CFG.get("times"))
+        cat = _CATALOGS.get(key)
+        if cat is None:
+            cat = _CATALOGS[key] = Catalog(state.BASE, _CFG.get("tz", "America/New_York"), _CFG.get("times"))
+        return cat
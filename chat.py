@@ -0,0 +1,142 @@
+# chat.py
+import threading, requests
+
+import fulltext
+from llm_sched import request_class
+from ollama_pool import get_pool
+
+# 报告上下文只编码一次：首次提问时把上下文作为前缀送入 Ollama，
+# 记下返回的 context（KV 缓存对应的 token 序列），之后的提问只追加新问题。
+# 注意 keep_alive 必须大于 0，否则模型卸载后 KV 缓存随之丢失。
+
+CHAT_SYSTEM = (
+    "你是学术助手。以下是某期 arXiv 早/晚报的上下文，请基于此逐问逐答。"
+    "若用户要求对比/延伸，请引用报文中的条目并给出具体理由。\n\n"
+)
+
+_PREFIX_CACHE = {}  # (period, model) -> {"stamp": ..., "context": [...], "host": ...}
+_LOCK = threading.Lock()
+
+
+def _ollama_cfg(cfg):
+    oc = cfg.get("ollama", {})
+    model = oc.get("model", "qwen2.5:7b")
+    keep_alive = oc.get("chat_keep_alive", "10m")
+    options = {}
+    if oc.get("chat_num_ctx"):
+        # 前缀与追问必须使用相同的 num_ctx，否则 Ollama 会重新加载模型
+        options["num_ctx"] = int(oc["chat_num_ctx"])
+    return model, keep_alive, options
+
+
+def format_history(history):
+    return "".join(
+        f"{'用户' if h.get('role') == 'user' else '助手'}: {h.get('text', '')}\n" for h in history
+    )
+
+
+def _question_block(question, history, passages=""):
+    history_text = format_history(history or [])
+    return (("\n\n# 对话历史\n" + history_text if history_text else "") +
+            ("\n\n# 论文全文相关片段\n" + passages if passages else "") +
+            "\n\n# 用户提问\n" + question)
+
+
+def _generate(cfg, payload, prefer=None, timeout=300):
+    # 对话请求优先于报告生成
+    with request_class("interactive"):
+        return get_pool(cfg).generate(payload, timeout=timeout, prefer=prefer)
+
+
+def _prefix_context(cfg, period, ctx_text, stamp):
+    """返回 (context, host)；KV 缓存只存在于完成预填充的那台主机上"""
+    model, keep_alive, options = _ollama_cfg(cfg)
+    key = (period, model)
+    with _LOCK:
+        hit = _PREFIX_CACHE.get(key)
+        if hit and hit["stamp"] == stamp:
+            return hit["context"], hit["host"]
+
+    # 只做预填充：生成 1 个 token 即可拿到前缀的 context
+    payload = {
+        "model": model,
+        "prompt": CHAT_SYSTEM + ctx_text,
+        "stream": False,
+        "keep_alive": keep_alive,
+        "options": dict(options, num_predict=1),
+    }
+    data, host = _generate(cfg, payload)
+    context = data.get("context")
+    if not isinstance(context, list):
+        return None, host
+    # 返回的 context 包含生成的 token，去掉后才是纯前缀，否则之后每次提问都接在这个多余的 token 后面
+    generated = int(data.get("eval_count", 1 if data.get("response") else 0))
+    if generated:
+        context = context[:-generated]
+    if context:
+        with _LOCK:
+            _PREFIX_CACHE[key] = {"stamp": stamp, "context": context, "host": host}
+    return context, host
+
+
+def invalidate(period=None):
+    """丢弃缓存的前缀 context；period 为空时全部清空"""
+    with _LOCK:
+        for key in [k for k in _PREFIX_CACHE if period is None or k[0] == period]:
+            del _PREFIX_CACHE[key]
+
+
+def answer(cfg, period, ctx_text, question, history=None, stamp=None):
+    """
+    基于某期报告上下文回答问题
+
+    Args:
+        cfg: 配置字典
+        period: 期别名，如 2025-10-09_AM
+        ctx_text: 报告上下文 (prompt_context.txt)
+        question: 用户问题
+        history: 最近的对话记录 (PeriodState.recent_chat)
+        stamp: 上下文版本标记（如文件 mtime），变化时重新编码前缀
+
+    Returns:
+        str: 模型回答
+    """
+    model, keep_alive, options = _ollama_cfg(cfg)
+    # 全文片段放在问题部分，不影响已编码的报告前缀
+    passages = fulltext.retrieve(cfg, period, question)
+    tail = _question_block(question, history, passages)
+
+    context, host = None, None
+    try:
+        context, host = _prefix_context(cfg, period, ctx_text, stamp)
+    except (requests.RequestException, ValueError, KeyError, TypeError):
+        # 请求失败或响应不是预期的 JSON：退回完整提示，不让本轮对话失败
+        context = None
+
+    if context:
+        payload = {
+            "model": model,
+            "prompt": tail,
+            "context": context,
+            "stream": False,
+            "keep_alive": keep_alive,
+        }
+        if options:
+            payload["options"] = options
+        try:
+            # 优先回到持有该前缀 KV 缓存的主机；它不可用时连接池会切换主机
+            return _generate(cfg, payload, prefer=host)[0].get("response", "").strip()
+        except requests.HTTPError:
+            # context 失效（如模型被替换），退回完整提示并重建前缀
+            invalidate(period)
+
+    # 完整提示：前缀保持不变，Ollama 仍可复用已加载模型的前缀缓存
+    payload = {
+        "model": model,
+        "prompt": CHAT_SYSTEM + ctx_text + tail,
+        "stream": False,
+        "keep_alive": keep_alive,
+    }
+    if options:
+        payload["options"] = options
+    return _generate(cfg, payload, prefer=host)[0].get("response", "").strip()
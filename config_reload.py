@@ -0,0 +1,111 @@
+# config_reload.py
+import copy, os, re
+from pathlib import Path
+
+import yaml
+
+# 配置热更新：校验新配置 → 与当前配置逐项比较 → 只重建受影响的部分
+#   - diff 返回变化的配置路径（如 report_times、ollama.hosts、ranking.min_reactions）
+#   - 调用方用 touched(changes, 前缀...) 判断某个组件是否需要重建
+#   - 抓取过滤（categories / exclude / queries）每次抓取时读取，无需额外处理
+# 运行中的 bot 与 CFG 是同一个字典，原地更新后所有模块立即看到新值。
+
+_TIME = re.compile(r"^([01]?\d|2[0-3]):([0-5]\d)$")
+
+
+def validate(cfg):
+    """
+    检查会导致运行时出错的配置
+
+    Returns:
+        list: 错误说明，空列表表示通过
+    """
+    from dateutil import tz
+
+    errors = []
+    try:
+        int(cfg.get("discord_channel_id"))
+    except (TypeError, ValueError):
+        errors.append("discord_channel_id 必须是数字")
+    if tz.gettz(cfg.get("timezone", "America/New_York")) is None:
+        errors.append(f"未知时区: {cfg.get('timezone')}")
+    times = cfg.get("report_times", ["10:00", "22:00"])
+    if not isinstance(times, list) or not all(isinstance(t, str) and _TIME.match(t) for t in times):
+        errors.append("report_times 必须是 HH:MM 字符串列表")
+    for key in ("time_window_hours", "digest_max_items", "prefetch_lead_minutes", "search_max_days"):
+        if key in cfg and (not isinstance(cfg[key], int) or isinstance(cfg[key], bool) or cfg[key] < 0):
+            errors.append(f"{key} 必须是非负整数")
+    if not cfg.get("time_window_hours", 12):
+        errors.append("time_window_hours 不能为 0")
+    from state import ChatLog
+    try:
+        ChatLog.check_fsync(cfg.get("chat_fsync", "never"))
+    except ValueError as e:
+        errors.append(f"chat_fsync: {e}")
+    for key in ("categories", "exclude", "queries", "allowed_users"):
+        if key in cfg and not isinstance(cfg[key], list):
+            errors.append(f"{key} 必须是列表")
+    oc = cfg.get("ollama", {}) or {}
+    if not isinstance(oc, dict):
+        errors.append("ollama 必须是映射")
+    else:
+        for h in oc.get("hosts") or []:
+            if not (isinstance(h, str) or (isinstance(h, dict) and h.get("host"))):
+                errors.append(f"ollama.hosts 中的条目无效: {h}")
+    for key, value in cfg.items():
+        if key in ("http_cache", "dedup", "trends", "ranking", "fulltext", "retention", "job_queue",
+                   "answer_cache", "loop_watchdog", "config_reload") and not isinstance(value, dict):
+            errors.append(f"{key} 必须是映射")
+    return errors
+
+
+def diff(old, new, prefix=""):
+    """两份配置中值不同的路径（逐层比较映射，列表整体比较）"""
+    out = []
+    for key in sorted(set(old) | set(new), key=str):
+        path = f"{prefix}{key}"
+        a, b = old.get(key), new.get(key)
+        if isinstance(a, dict) and isinstance(b, dict):
+            out += diff(a, b, path + ".")
+        elif a != b:
+            out.append(path)
+    return out
+
+
+def touched(changes, *prefixes):
+    """changes 中是否有位于 prefixes 之下的路径"""
+    return any(c == p or c.startswith(p + ".") for c in changes for p in prefixes)
+
+
+def parse_value(text):
+    """命令行中的值：true/false、数字按类型转换，[...] / {...} 按 YAML 解析，其余为字符串"""
+    if text.lower() in ("true", "false"):
+        return text.lower() == "true"
+    if re.fullmatch(r"-?\d+", text):
+        return int(text)
+    if re.fullmatch(r"-?\d+\.\d*", text):
+        return float(text)
+    if text[:1] in "[{":
+        return yaml.safe_load(text)
+    return text
+
+
+def with_value(cfg, key, value):
+    """返回设置了 key（可用 a.b 表示嵌套）的新配置，不修改 cfg"""
+    new = copy.deepcopy(cfg)
+    node = new
+    parts = key.split(".")
+    for part in parts[:-1]:
+        node = node.setdefault(part, {})
+        if not isinstance(node, dict):
+            raise ValueError(f"{part} 不是映射，无法设置 {key}")
+    node[parts[-1]] = value
+    return new
+
+
+def save(cfg, path="config.yaml"):
+    path = Path(path)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        yaml.safe_dump(cfg, f, allow_unicode=True, sort_keys=False)
+    os.replace(tmp, path)
@@ -0,0 +1,155 @@
+# dedup.py
+import re, zlib
+
+import numpy as np
+
+# 近重复论文聚类：MinHash + LSH
+# 同组后续工作、摘要略有改动的交叉投稿会被归为一簇，每簇只送模型摘要一次。
+#   1. 标题+摘要切成词级 shingle，crc32 哈希为 32 位整数
+#   2. 文档的 shingle 拼成数组（按块），一次矩阵运算得到 k 个哈希，
+#      再用 np.minimum.reduceat 按文档取最小值得到签名
+#   3. 签名分成 bands 段，段内完全相同的文档成为候选对
+#   4. 候选对按签名估计 Jaccard，超过阈值的用并查集合并
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def shingles(text, n=3):
+    words = _TOKEN.findall(text.lower())
+    if len(words) < n:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def minhash_signatures(docs, num_perm=64, seed=1, chunk=1 << 16):
+    """
+    Args:
+        docs: 每篇文档的 shingle 集合
+    Returns:
+        np.ndarray: (文档数, num_perm) 的 uint64 签名；无 shingle 的文档为全 1 的最大值
+    """
+    rng = np.random.default_rng(seed)
+    # a 取满 64 位的奇数，乘法按 2^64 回绕；a < 2^32 时 a*x 不溢出，高 32 位随 x 单调，
+    # 所有哈希函数的最小值落在同一个 shingle 上，签名退化为单个排列
+    a = rng.integers(0, 2**64, size=num_perm, dtype=np.uint64, endpoint=False) | np.uint64(1)
+    b = rng.integers(0, 2**64, size=num_perm, dtype=np.uint64, endpoint=False)
+
+    sig = np.full((len(docs), num_perm), np.iinfo(np.uint64).max, dtype=np.uint64)
+    lengths = np.array([len(d) for d in docs], dtype=np.int64)
+    nonempty = np.flatnonzero(lengths)
+    if len(nonempty) == 0:
+        return sig
+
+    # 分块处理，限制 (num_perm × shingle 数) 中间矩阵的大小
+    start = 0
+    while start < len(nonempty):
+        stop, total = start, 0
+        while stop < len(nonempty) and (stop == start or total + lengths[nonempty[stop]] <= chunk):
+            total += lengths[nonempty[stop]]
+            stop += 1
+        idx = nonempty[start:stop]
+        values = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for i in idx for s in docs[i]),
+            dtype=np.uint64, count=int(total),
+        )
+        offsets = np.concatenate(([0], np.cumsum(lengths[idx])[:-1]))
+
+        # multiply-shift 哈希族：(a*x + b) mod 2^64 取高 32 位（uint64 运算自然回绕）
+        hashed = (a[:, None] * values[None, :] + b[:, None]) >> np.uint64(32)
+        sig[idx] = np.minimum.reduceat(hashed, offsets, axis=1).T
+        start = stop
+    return sig
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def cluster(docs, threshold=0.6, num_perm=64, bands=16):
+    """
+    Returns:
+        list[list[int]]: 按首个成员下标排序的簇，每簇内下标升序
+    """
+    n = len(docs)
+    sig = minhash_signatures(docs, num_perm=num_perm)
+    rows = num_perm // bands
+    parent = list(range(n))
+    valid = [i for i in range(n) if docs[i]]
+
+    checked = set()
+    for band in range(bands):
+        block = np.ascontiguousarray(sig[:, band * rows:(band + 1) * rows])
+        buckets = {}
+        for i in valid:
+            buckets.setdefault(block[i].tobytes(), []).append(i)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            head = members[0]
+            for j in members[1:]:
+                if (head, j) in checked:
+                    continue
+                checked.add((head, j))
+                if np.mean(sig[head] == sig[j]) >= threshold:
+                    ri, rj = _find(parent, head), _find(parent, j)
+                    if ri != rj:
+                        parent[max(ri, rj)] = min(ri, rj)
+
+    groups = {}
+    for i in range(n):
+        groups.setdefault(_find(parent, i), []).append(i)
+    return sorted(groups.values(), key=lambda g: g[0])
+
+
+def cluster_papers(cfg, data):
+    """
+    把近重复论文合并到簇代表（列表中最靠前、即最新的一篇）下
+
+    代表条目增加 "duplicates": [{"id", "title", "link"}, ...]
+    """
+    dc = cfg.get("dedup", {}) or {}
+    docs = [shingles(p.get("title", "") + " " + p.get("abstract", "")) for p in data]
+    groups = cluster(docs, threshold=float(dc.get("threshold", 0.6)),
+                     num_perm=int(dc.get("num_perm", 64)), bands=int(dc.get("bands", 16)))
+
+    out = []
+    for g in groups:
+        head = dict(data[g[0]])
+        if len(g) > 1:
+            head["duplicates"] = [
+                {"id": data[i]["id"], "title": data[i]["title"], "link": data[i]["link"]} for i in g[1:]
+            ]
+        out.append(head)
+
+    merged = len(data) - len(out)
+    if merged:
+        print(f" 近重复聚类: {len(data)} 篇合并为 {len(out)} 簇")
+    return out
+
+
+def check(num_perm=256, trials=200, seed=0):
+    """
+    用已知 Jaccard 的整数集合检验签名估计：python -m dedup
+
+    Returns:
+        float: 估计值与真实值的平均绝对误差
+    """
+    rng = np.random.default_rng(seed)
+    errors = []
+    for _ in range(trials):
+        shared, only = int(rng.integers(1, 200)), int(rng.integers(0, 200))
+        pool = [str(x) for x in rng.choice(10**6, size=shared + 2 * only, replace=False)]
+        a, b = set(pool[:shared + only]), set(pool[:shared] + pool[shared + only:])
+        sig = minhash_signatures([a, b], num_perm=num_perm, seed=int(rng.integers(1 << 30)))
+        errors.append(abs(np.mean(sig[0] == sig[1]) - len(a & b) / len(a | b)))
+    return float(np.mean(errors))
+
+
+if __name__ == "__main__":
+    err = check()
+    print(f"MinHash Jaccard 估计平均误差: {err:.3f}")
+    # 256 个哈希时标准差约 0.03，平均误差明显偏大说明哈希族退化
+    raise SystemExit(0 if err < 0.05 else 1)
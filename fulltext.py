@@ -0,0 +1,325 @@
+# fulltext.py
+import asyncio, hashlib, json, math, os, re, threading, time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import state
+
+try:
+    import pypdf
+except ImportError:  # 可选依赖：pip install pypdf
+    pypdf = None
+
+# 全文 PDF 摄取（可选，fulltext.enabled）
+#   - 下载: aiohttp 异步并发，Semaphore 限制同时下载数，令牌桶限制每秒开始的下载数
+#   - 解析: pypdf 在进程池中提取文本，按章节标题切分，丢弃参考文献
+#   - 缓存: storage/fulltext/objects/<sha256[:2]>/<sha256>.json 以 PDF 内容哈希寻址，
+#           index.json 记录 论文 id -> 哈希，同一篇论文只下载、解析一次
+#   - 检索: 章节切成段落，按 BM25 打分，对话时把最相关的段落附在问题后面
+
+_SECTION = (r"(Abstract|Introduction|Related Work|Background|Preliminaries|Method(?:s|ology)?|"
+            r"Approach|Model|Experiments?|Evaluation|Results?|Discussion|Analysis|Limitations|Conclusions?|"
+            r"References|Bibliography|Acknowledg(?:e)?ments?|Appendix)")
+# 标题的形状：带编号（"3 Method"、"IV. Experiments and Results"），或整行只有标题词（可带 "and X" 与冒号）；
+# 正文中以这些词开头的句子（"References to prior work are ..."、"Model sizes range ..."）不算标题
+_HEADING = re.compile(
+    r"^(?:(?:\d{1,2}(?:\.\d{1,2})*|[IVX]{1,4})\.?\s+" + _SECTION + r"\b[^.]{0,40}"
+    r"|" + _SECTION + r"(?:\s+(?:and|&)\s+[A-Za-z]+(?:\s+[A-Za-z]+)?)?:?)$",
+    re.I,
+)
+_WORD = re.compile(r"[a-z0-9]+|[一-鿿]")
+
+
+class AsyncTokenBucket:
+    """asyncio 版令牌桶，与 arxiv_fetch.TokenBucket 语义相同"""
+
+    def __init__(self, rate=1.0, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._stamp = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# ---- 解析（在子进程中运行）----
+
+def split_sections(text):
+    """按常见章节标题切分，返回 [{"title", "text"}]；后半部分出现的参考文献及之后的内容丢弃"""
+    sections, title, buf = [], "Front", []
+    half, pos = len(text) // 2, 0
+    for line in text.splitlines():
+        pos += len(line) + 1
+        s = line.strip()
+        m = _HEADING.match(s) if len(s) < 60 else None
+        if m:
+            if buf:
+                sections.append({"title": title, "text": " ".join(buf)})
+            title, buf = (m.group(1) or m.group(2)).title(), []
+            # 参考文献通常在正文之后；出现在前半部分时多半是误判，只当作普通章节
+            if title in ("References", "Bibliography") and pos > half:
+                return sections
+            continue
+        if s:
+            buf.append(s)
+    if buf:
+        sections.append({"title": title, "text": " ".join(buf)})
+    return sections
+
+
+def extract_pdf(path):
+    """提取 PDF 文本并切分章节（进程池中执行，参数和返回值都可序列化）"""
+    reader = pypdf.PdfReader(path)
+    pages = []
+    for page in reader.pages:
+        try:
+            pages.append(page.extract_text() or "")
+        except Exception:
+            pages.append("")
+    text = "\n".join(pages)
+    text = re.sub(r"-\n(?=[a-z])", "", text)  # 连字符断行
+    return {"pages": len(pages), "sections": split_sections(text)}
+
+
+# ---- 内容寻址缓存 ----
+
+class FulltextStore:
+    def __init__(self, root):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.index_path = self.root / "index.json"
+        self._lock = threading.Lock()
+        self.index = {}
+        if self.index_path.exists():
+            self.index = json.loads(self.index_path.read_text(encoding="utf-8"))
+
+    def _object(self, digest):
+        return self.objects / digest[:2] / f"{digest}.json"
+
+    def has(self, paper_id):
+        digest = self.index.get(paper_id)
+        return bool(digest) and self._object(digest).exists()
+
+    def get(self, paper_id):
+        """返回 {"pages", "sections"}，未摄取时返回 None"""
+        digest = self.index.get(paper_id)
+        if not digest:
+            return None
+        p = self._object(digest)
+        return json.loads(p.read_text(encoding="utf-8")) if p.exists() else None
+
+    def has_object(self, digest):
+        return self._object(digest).exists()
+
+    def put(self, paper_id, digest, doc=None):
+        """记录 paper_id -> digest；doc 不为空时写入对象"""
+        if doc is not None:
+            p = self._object(digest)
+            p.parent.mkdir(parents=True, exist_ok=True)
+            tmp = p.with_suffix(".tmp")
+            tmp.write_text(json.dumps(doc, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, p)
+        with self._lock:
+            self.index[paper_id] = digest
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp = self.index_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.index), encoding="utf-8")
+            os.replace(tmp, self.index_path)
+
+
+def get_store():
+    return FulltextStore(state.BASE / "fulltext")
+
+
+def _fcfg(cfg):
+    return cfg.get("fulltext", {}) or {}
+
+
+def enabled(cfg):
+    return bool(_fcfg(cfg).get("enabled", False))
+
+
+# ---- 摄取 ----
+
+async def ingest(cfg, papers):
+    """
+    下载并解析 papers 中尚未摄取的论文（最多 fulltext.max_papers 篇）
+
+    Returns:
+        dict: {"downloaded", "parsed", "cached", "failed", "ok"}；ok 为假表示未安装 pypdf 或全部下载失败
+    """
+    import aiohttp
+
+    fc = _fcfg(cfg)
+    stats = {"downloaded": 0, "parsed": 0, "cached": 0, "failed": 0, "ok": False}
+    if pypdf is None:
+        print(" 未安装 pypdf，跳过全文摄取 (pip install pypdf)")
+        return stats
+
+    store = get_store()
+    todo = []
+    for p in papers[:int(fc.get("max_papers", 10))]:
+        if store.has(p["id"]):
+            stats["cached"] += 1
+        else:
+            todo.append(p)
+    stats["ok"] = True
+    if not todo:
+        return stats
+
+    url_tpl = fc.get("pdf_url", "https://arxiv.org/pdf/{id}")
+    max_bytes = int(float(fc.get("max_pdf_mb", 30)) * 1024 * 1024)
+    sem = asyncio.Semaphore(int(fc.get("concurrency", 4)))
+    bucket = AsyncTokenBucket(rate=float(fc.get("rate", 1.0)))
+    tmp_dir = store.root / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    loop = asyncio.get_running_loop()
+    timeout = aiohttp.ClientTimeout(total=float(fc.get("timeout", 120)))
+
+    async def one(session, pool, paper):
+        pid = paper["id"]
+        try:
+            async with sem:
+                await bucket.acquire()
+                async with session.get(url_tpl.format(id=pid)) as resp:
+                    resp.raise_for_status()
+                    data = bytearray()
+                    async for chunk in resp.content.iter_chunked(1 << 16):
+                        data += chunk
+                        if len(data) > max_bytes:
+                            raise ValueError(f"PDF 超过 {max_bytes // 1024 // 1024} MB")
+            stats["downloaded"] += 1
+            digest = hashlib.sha256(data).hexdigest()
+            if store.has_object(digest):
+                # 内容相同的 PDF 已解析过（如同一论文的不同 id 写法）
+                store.put(pid, digest)
+                return
+            path = tmp_dir / f"{digest}.pdf"
+            path.write_bytes(data)
+            try:
+                doc = await loop.run_in_executor(pool, extract_pdf, str(path))
+            finally:
+                path.unlink(missing_ok=True)
+            doc["id"] = pid
+            store.put(pid, digest, doc)
+            stats["parsed"] += 1
+        except Exception as e:
+            stats["failed"] += 1
+            print(f" 全文摄取失败 {pid}: {e}")
+
+    with ProcessPoolExecutor(max_workers=int(fc.get("extract_workers", 2))) as pool:
+        async with aiohttp.ClientSession(timeout=timeout, headers={"User-Agent": "arxivpush"}) as session:
+            await asyncio.gather(*(one(session, pool, p) for p in todo))
+    stats["ok"] = stats["failed"] < len(todo)
+    print(f" 全文摄取: 下载 {stats['downloaded']} | 解析 {stats['parsed']} | 缓存命中 {stats['cached']} | 失败 {stats['failed']}")
+    return stats
+
+
+def ingest_sync(cfg, papers):
+    """在没有事件循环的线程/进程中调用"""
+    return asyncio.run(ingest(cfg, papers))
+
+
+# ---- 检索 ----
+
+def tokenize(text):
+    return _WORD.findall(text.lower())
+
+
+def passages(doc, size=800):
+    """把章节切成约 size 字符的段落 [(章节, 文本)]"""
+    out = []
+    for sec in doc.get("sections", []):
+        text = sec["text"]
+        for i in range(0, len(text), size):
+            out.append((sec["title"], text[i:i + size]))
+    return out
+
+
+class Retriever:
+    """一期论文全文段落的 BM25 索引"""
+
+    def __init__(self, docs, k1=1.5, b=0.75):
+        self.items = []  # (paper_id, title, section, text)
+        tfs = []
+        for pid, title, doc in docs:
+            for section, text in passages(doc):
+                self.items.append((pid, title, section, text))
+                tf = {}
+                for w in tokenize(text):
+                    tf[w] = tf.get(w, 0) + 1
+                tfs.append(tf)
+        self.tfs = tfs
+        self.lens = [sum(tf.values()) for tf in tfs]
+        self.avg = (sum(self.lens) / len(self.lens)) if self.lens else 0.0
+        df = {}
+        for tf in tfs:
+            for w in tf:
+                df[w] = df.get(w, 0) + 1
+        n = len(tfs)
+        self.idf = {w: math.log(1 + (n - c + 0.5) / (c + 0.5)) for w, c in df.items()}
+        self.k1, self.b = k1, b
+
+    def search(self, query, k=4):
+        q = set(tokenize(query))
+        scored = []
+        for i, tf in enumerate(self.tfs):
+            s = 0.0
+            for w in q:
+                f = tf.get(w)
+                if f:
+                    s += self.idf[w] * f * (self.k1 + 1) / (f + self.k1 * (1 - self.b + self.b * self.lens[i] / self.avg))
+            if s > 0:
+                scored.append((s, i))
+        scored.sort(reverse=True)
+        return [self.items[i] for _, i in scored[:k]]
+
+
+_RETRIEVERS = {}  # period -> (raw_papers.json 的 mtime, {id: 标题}, 已摄取的 id, Retriever)
+_LOCK = threading.Lock()
+
+
+def retrieve(cfg, period, question, k=None):
+    """在某期论文的全文中检索与问题最相关的段落，返回可直接附在提示词中的文本（无结果时为空串）"""
+    if not enabled(cfg):
+        return ""
+    raw = state.BASE / period / "raw_papers.json"
+    if not raw.exists():
+        return ""
+    k = k or int(_fcfg(cfg).get("chat_passages", 4))
+    store = get_store()
+    mtime = raw.stat().st_mtime_ns
+    with _LOCK:
+        cached = _RETRIEVERS.get(period)
+        if cached is None or cached[0] != mtime:
+            papers = json.loads(raw.read_text(encoding="utf-8"))
+            cached = (mtime, {p["id"]: p.get("title", "") for p in papers}, None, None)
+        # 摄取可能在对话开始后才完成：已摄取的集合变化时重建索引
+        ids = [pid for pid in cached[1] if store.has(pid)]
+        if ids != cached[2]:
+            cached = (mtime, cached[1], ids, Retriever([(pid, cached[1][pid], store.get(pid)) for pid in ids]))
+        _RETRIEVERS[period] = cached
+    if not cached[2]:
+        return ""
+    hits = cached[3].search(question, k)
+    return "\n\n".join(f"[{pid} {title} · {section}]\n{text}" for pid, title, section, text in hits)
+
+
+def intro_excerpt(paper_id, max_chars=1500):
+    """论文引言部分的节选（已摄取时），供逐篇摘要使用"""
+    doc = get_store().get(paper_id)
+    if not doc:
+        return ""
+    secs = doc.get("sections", [])
+    sec = next((s for s in secs if s["title"] == "Introduction"), secs[0] if secs else None)
+    return sec["text"][:max_chars] if sec else ""
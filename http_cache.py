@@ -0,0 +1,139 @@
+# http_cache.py
+import hashlib, json, os, re, threading, time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# arXiv 查询结果的磁盘缓存
+# - 键: 规范化后的查询 (search_query 合并空白、参数排序) + 分页参数
+# - TTL: 近期数据很快会变化，用短 TTL；提交日期早已结束的历史查询用长 TTL
+# - 过期后若有 ETag / Last-Modified，发条件请求，304 时直接复用缓存
+# - 总大小有上限，超出时按最近访问时间 (文件 mtime) 淘汰
+
+_DATE_RANGE = re.compile(r"submittedDate:\[(\d{8})\d*\s+TO\s+(\d{8})\d*\]", re.I)
+
+
+def normalize_url(url):
+    parts = urlsplit(url)
+    args = []
+    for k, v in parse_qsl(parts.query, keep_blank_values=True):
+        if k == "search_query":
+            v = " ".join(v.split())
+        args.append((k, v))
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, urlencode(sorted(args)), ""))
+
+
+class ResponseCache:
+    def __init__(self, root, max_bytes=200 * 1024 * 1024, ttl_recent=300, ttl_historical=7 * 86400):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.ttl_recent = ttl_recent
+        self.ttl_historical = ttl_historical
+        self._lock = threading.Lock()
+        self._size = None
+        self.hits = self.misses = self.revalidated = 0
+
+    def _paths(self, key):
+        h = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return self.root / f"{h}.body", self.root / f"{h}.meta.json"
+
+    def ttl_for(self, key):
+        """查询的提交日期范围整体早于两天前时视为历史数据"""
+        m = _DATE_RANGE.search(dict(parse_qsl(urlsplit(key).query)).get("search_query", ""))
+        if m:
+            end = datetime.strptime(m.group(2), "%Y%m%d").replace(tzinfo=timezone.utc)
+            if end < datetime.now(timezone.utc) - timedelta(days=2):
+                return self.ttl_historical
+        return self.ttl_recent
+
+    def get(self, key):
+        body_p, meta_p = self._paths(key)
+        try:
+            meta = json.loads(meta_p.read_text(encoding="utf-8"))
+            body = body_p.read_bytes()
+        except (OSError, ValueError):
+            return None, None
+        os.utime(body_p)  # 记录访问时间，用于 LRU
+        return meta, body
+
+    def put(self, key, resp):
+        body_p, meta_p = self._paths(key)
+        meta = {
+            "url": key,
+            "stored_at": time.time(),
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "content_type": resp.headers.get("Content-Type"),
+        }
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            size = self._current_size()
+            old = body_p.stat().st_size if body_p.exists() else 0
+            tmp = body_p.with_suffix(".tmp")
+            tmp.write_bytes(resp.content)
+            os.replace(tmp, body_p)
+            meta_p.write_text(json.dumps(meta), encoding="utf-8")
+            self._size = size - old + len(resp.content)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def touch(self, key, meta):
+        _, meta_p = self._paths(key)
+        meta["stored_at"] = time.time()
+        meta_p.write_text(json.dumps(meta), encoding="utf-8")
+
+    def _current_size(self):
+        if self._size is None:
+            self._size = sum(p.stat().st_size for p in self.root.glob("*.body"))
+        return self._size
+
+    def _evict(self):
+        # 只在超出上限时排序一次，按访问时间从旧到新删除直到低于上限的 90%
+        bodies = sorted(self.root.glob("*.body"), key=lambda p: p.stat().st_mtime)
+        target = self.max_bytes * 0.9
+        for p in bodies:
+            if self._size <= target:
+                break
+            size = p.stat().st_size
+            p.unlink(missing_ok=True)
+            p.with_name(p.name[:-len(".body")] + ".meta.json").unlink(missing_ok=True)
+            self._size -= size
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "revalidated": self.revalidated,
+                "bytes": self._current_size() if self.root.exists() else 0}
+
+
+def cached_response(url, meta, body):
+    resp = requests.Response()
+    resp.status_code = 200
+    resp._content = body
+    resp.url = url
+    resp.headers = CaseInsensitiveDict({"Content-Type": meta.get("content_type") or "application/atom+xml",
+                                        "X-Cache": "HIT"})
+    resp.encoding = "utf-8"
+    return resp
+
+
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_cache(cfg):
+    """按配置返回共享的 ResponseCache；http_cache.enabled 为 false 时返回 None"""
+    hc = (cfg or {}).get("http_cache", {}) or {}
+    if not hc.get("enabled", True):
+        return None
+    root = hc.get("dir", "storage/http_cache")
+    with _CACHES_LOCK:
+        cache = _CACHES.get(root)
+        if cache is None:
+            cache = _CACHES[root] = ResponseCache(root)
+        # 大小与有效期每次按当前配置设置，修改配置后无需重建缓存
+        cache.max_bytes = int(hc.get("max_mb", 200)) * 1024 * 1024
+        cache.ttl_recent = int(hc.get("ttl_recent", 300))
+        cache.ttl_historical = int(hc.get("ttl_historical", 7 * 86400))
+        return cache
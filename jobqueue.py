@@ -0,0 +1,230 @@
+# jobqueue.py
+import asyncio, json, os, socket, sqlite3, time
+from contextlib import contextmanager
+from pathlib import Path
+
+# 基于 SQLite 的本地任务队列：bot 只负责入队和推送，抓取/模型调用交给独立的 worker 进程
+#   - jobs   任务表；worker 以租约方式领取 (lease_until)，超时未续约的任务会被其他 worker 重新领取
+#   - events 进度事件，worker 逐条写入，bot 轮询后即时处理（如逐篇摘要进度）
+#   - workers 心跳表，smi 据此显示在线 worker
+# 多台机器共享 storage/ 时可共用同一个数据库；网络文件系统上请确认其支持文件锁。
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, priority, id);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_job ON events (job_id, seq);
+CREATE TABLE IF NOT EXISTS workers (
+    worker TEXT PRIMARY KEY,
+    host TEXT,
+    pid INTEGER,
+    kinds TEXT,
+    current INTEGER,
+    last_seen REAL NOT NULL
+);
+"""
+
+
+class JobFailed(RuntimeError):
+    pass
+
+
+class JobQueue:
+    def __init__(self, path, lease=120, max_attempts=2):
+        self.path = Path(path)
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # 每次操作单独连接：bot 的线程池和多个 worker 进程之间不共享连接
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            yield db
+        finally:
+            db.close()
+
+    # ---- bot 端 ----
+
+    def enqueue(self, kind, payload, priority=0):
+        now = time.time()
+        with self._connect() as db:
+            cur = db.execute(
+                "INSERT INTO jobs (kind, payload, priority, created, updated) VALUES (?, ?, ?, ?, ?)",
+                (kind, json.dumps(payload, ensure_ascii=False), priority, now, now),
+            )
+            return cur.lastrowid
+
+    def get(self, job_id):
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def events(self, job_id, after=0):
+        with self._connect() as db:
+            rows = db.execute("SELECT seq, data FROM events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                              (job_id, after)).fetchall()
+        return [(r["seq"], json.loads(r["data"])) for r in rows]
+
+    def cancel(self, job_id):
+        """撤销尚未被领取的任务；已在运行的任务由 worker 继续完成"""
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET status = 'cancelled', updated = ? WHERE id = ? AND status = 'queued'",
+                       (time.time(), job_id))
+
+    def stats(self, worker_ttl=60):
+        now = time.time()
+        with self._connect() as db:
+            counts = {r["status"]: r["n"] for r in
+                      db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+            workers = [dict(r) for r in
+                       db.execute("SELECT * FROM workers WHERE last_seen > ?", (now - worker_ttl,))]
+        return {"counts": counts, "workers": workers}
+
+    def prune(self, older_than=7 * 86400):
+        """删除已结束的旧任务及其事件"""
+        cutoff = time.time() - older_than
+        with self._connect() as db:
+            db.execute("DELETE FROM events WHERE job_id IN (SELECT id FROM jobs WHERE status IN "
+                       "('done', 'failed', 'cancelled') AND updated < ?)", (cutoff,))
+            db.execute("DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND updated < ?",
+                       (cutoff,))
+
+    # ---- worker 端 ----
+
+    def claim(self, worker, kinds=None):
+        """
+        领取一个任务：优先级高者优先，同优先级先进先出；租约过期的运行中任务视为可领取
+
+        租约过期说明 worker 进程已退出（如解析 PDF 时 OOM/崩溃），fail() 不会被调用；
+        这类任务在这里计入失败，次数用尽的标记为 failed，避免反复拖垮 worker
+
+        Returns:
+            dict | None
+        """
+        now = time.time()
+        kind_sql, params = "", [now, self.max_attempts]
+        if kinds:
+            kind_sql = f" AND kind IN ({','.join('?' * len(kinds))})"
+            params += list(kinds)
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, worker = NULL, lease_until = NULL, updated = ? "
+                    "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                    (f"worker 失联（租约过期），已尝试 {self.max_attempts} 次", now, now, self.max_attempts),
+                )
+                row = db.execute(
+                    "SELECT id FROM jobs WHERE (status = 'queued' OR "
+                    "(status = 'running' AND lease_until < ? AND attempts < ?))"
+                    + kind_sql + " ORDER BY priority DESC, id LIMIT 1", params,
+                ).fetchone()
+                if row is None:
+                    db.execute("COMMIT")
+                    return None
+                db.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, "
+                    "attempts = attempts + 1, updated = ? WHERE id = ?",
+                    (worker, now + self.lease, now, row["id"]),
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return self.get(row["id"])
+
+    def heartbeat(self, worker, kinds=None, job_id=None):
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO workers (worker, host, pid, kinds, current, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (worker, socket.gethostname(), os.getpid(), ",".join(kinds or []), job_id, now),
+            )
+            if job_id is not None:
+                db.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                           (now + self.lease, job_id, worker))
+
+    def emit(self, job_id, data):
+        with self._connect() as db:
+            db.execute("INSERT INTO events (job_id, ts, data) VALUES (?, ?, ?)",
+                       (job_id, time.time(), json.dumps(data, ensure_ascii=False)))
+
+    def complete(self, job_id, worker, result):
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET status = 'done', result = ?, updated = ? WHERE id = ? AND worker = ?",
+                       (json.dumps(result, ensure_ascii=False), time.time(), job_id, worker))
+
+    def fail(self, job_id, worker, error):
+        """失败次数未达上限时重新排队，否则标记为 failed"""
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts < ? THEN 'queued' ELSE 'failed' END, "
+                "error = ?, worker = NULL, lease_until = NULL, updated = ? WHERE id = ? AND worker = ?",
+                (self.max_attempts, error, time.time(), job_id, worker),
+            )
+
+
+async def wait_async(q, job_id, poll=1.0, timeout=None, on_event=None):
+    """
+    在事件循环中等待任务完成，期间把进度事件交给 on_event
+
+    Returns:
+        任务结果 (JSON 反序列化后)
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    seq = 0
+    try:
+        while True:
+            job = await asyncio.to_thread(q.get, job_id)
+            if on_event is not None:
+                for seq, data in await asyncio.to_thread(q.events, job_id, seq):
+                    on_event(data)
+            if job["status"] == "done":
+                return job["result"]
+            if job["status"] in ("failed", "cancelled"):
+                raise JobFailed(f"任务 {job_id} ({job['kind']}) {job['status']}: {job['error'] or ''}")
+            if deadline is not None and time.monotonic() > deadline:
+                raise asyncio.TimeoutError(f"任务 {job_id} ({job['kind']}) 等待超时，状态 {job['status']}")
+            await asyncio.sleep(poll)
+    except (asyncio.CancelledError, asyncio.TimeoutError):
+        await asyncio.to_thread(q.cancel, job_id)
+        raise
+
+
+def from_cfg(cfg):
+    """job_queue.enabled 为真时返回队列，否则返回 None（所有任务在 bot 进程内执行）"""
+    jc = cfg.get("job_queue", {}) or {}
+    if not jc.get("enabled", False):
+        return None
+    return JobQueue(jc.get("path", "storage/jobs.db"), lease=int(jc.get("lease_seconds", 120)),
+                    max_attempts=int(jc.get("max_attempts", 2)))
@@ -0,0 +1,115 @@
+# llm_sched.py
+import contextvars, heapq, itertools, threading, time
+from collections import deque
+from contextlib import contextmanager
+
+# 模型调用准入控制：对话、定时报告、手动报告、回填等所有 Ollama 请求共用一个调度器
+#   - 优先级: interactive (对话) > scheduled (定时报告) > manual (手动报告) > batch (回填等)
+#   - 截止时间: 定时任务带 deadline，剩余时间少于 urgent_seconds 时提升到对话之前
+#   - 并发上限取连接池报告的容量（健康主机权重之和）；容量大于 1 时为对话预留 reserve_interactive 个名额，
+#     逐篇摘要等低优先级请求最多占用其余名额
+#   - 逐篇摘要每篇单独申请名额，有更高优先级请求排队时自然让出，不会整批占住模型
+# 请求类别通过 contextvars 传递，asyncio.to_thread 会自动携带；线程池中需用 copy_context().run 提交。
+
+CLASSES = ("interactive", "scheduled", "manual", "batch")
+_RANK = {c: i for i, c in enumerate(CLASSES)}
+
+_CURRENT = contextvars.ContextVar("llm_class", default=("manual", None))
+
+
+@contextmanager
+def request_class(cls, deadline=None):
+    """在此上下文中发出的模型请求使用该优先级类别；deadline 为 time.time() 时间戳"""
+    token = _CURRENT.set((cls, deadline))
+    try:
+        yield
+    finally:
+        _CURRENT.reset(token)
+
+
+def current():
+    return _CURRENT.get()
+
+
+class LLMScheduler:
+    def __init__(self, capacity_fn, reserve_interactive=1, urgent_seconds=120):
+        self.capacity_fn = capacity_fn
+        self.reserve_interactive = reserve_interactive
+        self.urgent_seconds = urgent_seconds
+        self._cond = threading.Condition()
+        self._waiting = []  # 堆: (排序键, 序号, 类别)
+        self._seq = itertools.count()
+        self.inflight = {c: 0 for c in CLASSES}
+        self.served = {c: 0 for c in CLASSES}
+        self.waits = {c: deque(maxlen=200) for c in CLASSES}
+
+    def _key(self, cls, deadline, now):
+        if deadline is not None and deadline - now <= self.urgent_seconds:
+            return (-1, deadline)  # 临近截止，优先于对话
+        return (_RANK.get(cls, len(CLASSES)), deadline if deadline is not None else float("inf"))
+
+    def _limit(self, cls):
+        cap = max(int(self.capacity_fn()), 1)
+        if cls == "interactive" or cap <= self.reserve_interactive:
+            return cap
+        return cap - self.reserve_interactive
+
+    def _admissible(self, entry):
+        """entry 是否为当前可准入的最优等待者"""
+        total = sum(self.inflight.values())
+        for key, seq, cls in sorted(self._waiting):
+            urgent = key[0] == -1
+            if total < (self._limit("interactive") if urgent else self._limit(cls)):
+                return (key, seq, cls) == entry
+        return False
+
+    @contextmanager
+    def admit(self, cls=None, deadline=None):
+        """申请一个模型调用名额，退出上下文时归还"""
+        if cls is None:
+            cls, deadline = current()
+        t0 = time.monotonic()
+        with self._cond:
+            entry = (self._key(cls, deadline, time.time()), next(self._seq), cls)
+            heapq.heappush(self._waiting, entry)
+            try:
+                # 超时唤醒：截止时间临近时需要重新计算排序键
+                while not self._admissible(entry):
+                    self._cond.wait(timeout=5)
+                    if deadline is not None:
+                        self._waiting.remove(entry)
+                        entry = (self._key(cls, deadline, time.time()), entry[1], cls)
+                        self._waiting.append(entry)
+                        heapq.heapify(self._waiting)
+            except BaseException:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                raise
+            self._waiting.remove(entry)
+            heapq.heapify(self._waiting)
+            self.inflight[cls] += 1
+            self.waits[cls].append(time.monotonic() - t0)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.inflight[cls] -= 1
+                self.served[cls] += 1
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            queued = {c: 0 for c in CLASSES}
+            for _, _, cls in self._waiting:
+                queued[cls] += 1
+            out = {}
+            for c in CLASSES:
+                w = sorted(self.waits[c])
+                out[c] = {
+                    "inflight": self.inflight[c],
+                    "queued": queued[c],
+                    "served": self.served[c],
+                    "wait_p95_s": round(w[int(0.95 * (len(w) - 1))], 2) if w else 0.0,
+                }
+            return {"capacity": max(int(self.capacity_fn()), 1), "classes": out}
@@ -0,0 +1,225 @@
+# loadtest.py
+"""
+对话负载测试：按设定到达率向 bot.handle_chat 投递伪造的 Discord 消息，
+后端是延迟可调的假 Ollama，统计端到端延迟分位数、排队深度、事件循环延迟和内存增长。
+
+    python loadtest.py --rate 2 --count 100 --latency 1.5 --jitter 0.5
+    python loadtest.py --replay 2025-10-09_AM --speed 10
+
+需要 config.yaml（bot 模块导入时读取），不会连接 Discord，也不会写入真实的 storage/。
+"""
+import argparse, asyncio, json, random, tempfile, threading, time, tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def start_fake_ollama(latency, jitter, per_kchar=0.0):
+    """
+    启动假 Ollama：/api/generate 按 latency ± jitter 秒延迟返回，
+    per_kchar 为每千字符提示额外增加的秒数（模拟预填充开销）
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def _json(self, obj):
+            body = json.dumps(obj).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._json({"models": [{"name": "fake"}]})
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            prompt = payload.get("prompt", "")
+            time.sleep(max(0.0, random.uniform(latency - jitter, latency + jitter)) +
+                       per_kchar * len(prompt) / 1000)
+            self._json({"response": f"[fake] {prompt[-40:]}", "context": [1, 2, 3], "done": True})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class FakeUser:
+    def __init__(self, name):
+        self.name, self.id, self.bot = name, abs(hash(name)) & 0xFFFFFF, False
+
+    def __str__(self):
+        return self.name
+
+
+class FakeChannel:
+    """记录每条提问最后一段回复的发送时间"""
+
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.sent = {}  # 提问消息 id -> 最后一次发送时间
+
+    def bind(self, msg_id):
+        return _BoundChannel(self, msg_id)
+
+
+class _BoundChannel:
+    def __init__(self, parent, msg_id):
+        self.parent, self.msg_id, self.id = parent, msg_id, parent.id
+
+    async def send(self, content=None, **kwargs):
+        self.parent.sent[self.msg_id] = time.perf_counter()
+        return SimpleNamespace(id=self.msg_id, content=content)
+
+
+def make_message(channel, msg_id, content, author="loadtest"):
+    return SimpleNamespace(id=msg_id, content=content, author=FakeUser(author), channel=channel.bind(msg_id))
+
+
+def replay_questions(storage, period):
+    """从某期的对话记录中取出用户提问及其相对时间"""
+    import state
+    old = state.BASE
+    state.BASE = Path(storage)
+    try:
+        turns = [t for t in state.PeriodState(period).iter_chat() if t.get("role") == "user"]
+    finally:
+        state.BASE = old
+    t0 = next((t["ts"] for t in turns if "ts" in t), 0)
+    return [(t.get("ts", t0) - t0, t.get("text", "")) for t in turns]
+
+
+async def _lag_sampler(samples, stop, interval=0.05):
+    while not stop.is_set():
+        t = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - t - interval))
+
+
+async def run(args):
+    import bot, state
+
+    server = start_fake_ollama(args.latency, args.jitter, args.per_kchar)
+    host = f"http://127.0.0.1:{server.server_port}"
+    bot.CFG["ollama"] = dict(bot.CFG.get("ollama", {}), host=host, hosts=None, model="fake")
+    if not args.answer_cache:
+        bot.ANSWERS = None  # 默认测量模型调用路径；--answer-cache 时包含缓存命中
+
+    # 在临时目录中准备一期报告，避免污染真实 storage/
+    real_storage = state.BASE
+    tmp = tempfile.TemporaryDirectory()
+    state.BASE = Path(tmp.name)
+    period = bot.fmt_period(bot.now_in_tz(bot.TZNAME))
+    st = state.PeriodState(period)
+    ctx_file = Path(args.context) if args.context else None
+    st.save_prompt(ctx_file.read_text(encoding="utf-8") if ctx_file else "# 原始条目 (JSON)\n[]\n\n# 早/晚报\n" + "示例内容。\n" * args.context_lines)
+
+    if args.replay:
+        schedule = [(at / args.speed, q) for at, q in replay_questions(real_storage, args.replay)]
+    else:
+        at, schedule = 0.0, []
+        for i in range(args.count):
+            at += random.expovariate(args.rate)
+            schedule.append((at, random.choice(QUESTIONS)))
+
+    channel = FakeChannel(bot.CHANNEL_ID)
+    started, latencies, depth_samples = {}, [], []
+    inflight = 0
+    lag, stop = [], asyncio.Event()
+
+    tracemalloc.start()
+    mem_before = tracemalloc.get_traced_memory()[0]
+    lag_task = asyncio.create_task(_lag_sampler(lag, stop))
+
+    async def one(msg_id, question, arrival):
+        nonlocal inflight
+        inflight += 1
+        depth_samples.append(inflight)
+        # 端到端延迟从计划到达时间算起，包含被阻塞的事件循环造成的排队
+        started[msg_id] = arrival
+        await bot.handle_chat(make_message(channel, msg_id, "/" + question))
+        inflight -= 1
+        if msg_id in channel.sent:
+            latencies.append(channel.sent[msg_id] - started[msg_id])
+
+    t_start = time.perf_counter()
+    tasks = []
+    for msg_id, (at, question) in enumerate(schedule, 1):
+        delay = at - (time.perf_counter() - t_start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(msg_id, question, t_start + at)))
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - t_start
+
+    stop.set()
+    await lag_task
+    mem_after, mem_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    server.shutdown()
+    state.BASE = real_storage
+    tmp.cleanup()
+
+    report = {
+        "requests": len(schedule),
+        "answered": len(latencies),
+        "wall_s": round(wall, 3),
+        "latency_p50_s": round(percentile(latencies, 0.50), 3),
+        "latency_p95_s": round(percentile(latencies, 0.95), 3),
+        "latency_p99_s": round(percentile(latencies, 0.99), 3),
+        "queue_depth_max": max(depth_samples, default=0),
+        "queue_depth_mean": round(sum(depth_samples) / len(depth_samples), 2) if depth_samples else 0,
+        "loop_lag_p99_ms": round(percentile(lag, 0.99) * 1000, 1),
+        "loop_lag_max_ms": round(max(lag, default=0) * 1000, 1),
+        "mem_growth_kb": round((mem_after - mem_before) / 1024, 1),
+        "mem_peak_kb": round(mem_peak / 1024, 1),
+    }
+    return report
+
+
+QUESTIONS = [
+    "有哪些值得关注的论文？",
+    "summarize paper 1",
+    "这些论文有什么共同点？",
+    "详细解释第一篇论文的方法",
+    "哪篇论文和多模态相关？",
+]
+
+
+def build_parser(parser=None):
+    parser = parser or argparse.ArgumentParser(prog="loadtest", description="对话负载测试")
+    parser.add_argument("--rate", type=float, default=1.0, help="平均每秒到达的提问数 (泊松)")
+    parser.add_argument("--count", type=int, default=50, help="提问总数")
+    parser.add_argument("--latency", type=float, default=1.0, help="假 Ollama 平均延迟 (秒)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="延迟抖动 (秒)")
+    parser.add_argument("--per-kchar", type=float, default=0.0, help="每千字符提示额外延迟 (秒)")
+    parser.add_argument("--context", help="使用指定文件作为报告上下文")
+    parser.add_argument("--context-lines", type=int, default=200, help="合成上下文的行数")
+    parser.add_argument("--replay", help="回放 storage/<period> 中记录的提问")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放加速倍数")
+    parser.add_argument("--answer-cache", action="store_true", help="启用对话答案缓存")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser
+
+
+def main(args):
+    random.seed(args.seed)
+    report = asyncio.run(run(args))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(build_parser().parse_args()))
@@ -0,0 +1,129 @@
+# loopwatch.py
+import asyncio, sys, threading, time, traceback
+from collections import deque
+from pathlib import Path
+
+# 事件循环卡顿监测
+#   - 循环内的心跳协程每 interval 秒醒来一次，实际延迟超出部分即为循环滞后
+#   - 监视线程发现心跳超过 threshold 未更新时，抓取事件循环线程的调用栈（sys._current_frames）
+#   - 卡顿结束后按 (来源, 位置) 归类：来源为当前任务名（如 discord.py: on_message、arxiv-smi），
+#     通用任务名时取栈中最外层的本项目函数；位置为栈中最内层的本项目代码行，即发出阻塞调用的地方
+#   - 记录各类的次数、总时长、最长一次及其调用栈；每类第一次出现或刷新最长记录时把调用栈写入日志
+
+_ROOT = str(Path(__file__).resolve().parent)
+
+
+def _own(frame):
+    return frame.filename.startswith(_ROOT) and not frame.filename.endswith("loopwatch.py")
+
+
+class LoopWatchdog:
+    def __init__(self, interval=0.1, threshold=0.25, logger=None):
+        self.interval = interval
+        self.threshold = threshold
+        self.logger = logger
+        self.loop = None
+        self.offenders = {}  # (来源, 位置) -> {"count", "total", "max", "stack"}
+        self.lags = deque(maxlen=600)
+        self.stalls = 0
+        self._beat = time.monotonic()
+        self._pending = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """在事件循环中调用"""
+        self.loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = self.loop.create_task(self._tick(), name="loopwatch")
+        threading.Thread(target=self._watch, name="loopwatch", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _tick(self):
+        while True:
+            t0 = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - t0 - self.interval, 0.0)
+            with self._lock:
+                self._beat = now
+                pending, self._pending = self._pending, None
+            self.lags.append(lag)
+            if lag >= self.threshold:
+                self._record(lag, pending)
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 2):
+            with self._lock:
+                if self._pending is not None or time.monotonic() - self._beat < self.threshold:
+                    continue
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            source = self._source(stack)
+            with self._lock:
+                self._pending = (source, stack)
+
+    def _source(self, stack):
+        try:
+            task = asyncio.current_task(self.loop)
+        except RuntimeError:
+            task = None
+        name = task.get_name() if task is not None else ""
+        if name and not name.startswith("Task-"):
+            return name.replace("discord.py: ", "")
+        own = [f for f in stack if _own(f)]
+        if own:
+            return own[0].name
+        return task.get_coro().__qualname__ if task is not None else "unknown"
+
+    def _record(self, lag, pending):
+        source, stack = pending or ("unknown", None)
+        own = [f for f in (stack or []) if _own(f)] or (stack or [])[-1:]
+        site = f"{Path(own[-1].filename).name}:{own[-1].lineno} {own[-1].name}" if own else "?"
+        with self._lock:
+            self.stalls += 1
+            entry = self.offenders.setdefault((source, site), {"count": 0, "total": 0.0, "max": 0.0, "stack": ""})
+            entry["count"] += 1
+            entry["total"] += lag
+            worst = lag > entry["max"]
+            if worst:
+                entry["max"] = lag
+                entry["stack"] = "".join(traceback.format_list(stack[-15:])) if stack else ""
+        if self.logger:
+            self.logger.warning(f"事件循环阻塞 {lag:.2f}s: {source} @ {site}")
+            if worst and entry["stack"]:
+                self.logger.warning(f"阻塞调用栈 ({source}):\n{entry['stack']}")
+
+    def stats(self, limit=5):
+        with self._lock:
+            lags = sorted(self.lags)
+            worst = sorted(self.offenders.items(), key=lambda kv: -kv[1]["total"])[:limit]
+            return {
+                "stalls": self.stalls,
+                "lag_p99_ms": round(lags[int(0.99 * (len(lags) - 1))] * 1000) if lags else 0,
+                "lag_max_ms": round(lags[-1] * 1000) if lags else 0,
+                "offenders": [dict(source=s, site=site, count=e["count"], total=round(e["total"], 2),
+                                   max=round(e["max"], 2)) for (s, site), e in worst],
+            }
+
+
+def from_cfg(cfg, logger=None):
+    """loop_watchdog.enabled 为假时返回 None"""
+    wc = cfg.get("loop_watchdog", {}) or {}
+    if not wc.get("enabled", True):
+        return None
+    return LoopWatchdog(interval=float(wc.get("interval", 0.1)), threshold=float(wc.get("threshold", 0.25)),
+                        logger=logger)
@@ -0,0 +1,180 @@
+# ollama_pool.py
+import threading, time
+import requests
+
+from llm_sched import LLMScheduler
+
+# 多台 Ollama 主机的负载均衡
+# - 每台主机可限定模型列表，并有并发权重 weight
+# - 选择 (在途请求数 / weight) 最小的健康主机；模型未常驻 (/api/ps) 的主机
+#   额外计 cold_penalty，使请求优先落到已加载模型的主机上
+# - 连续失败 fail_threshold 次后熔断 cooldown 秒，期间不再分配请求
+# - 请求失败（连接错误/超时/5xx）自动切换到下一台主机
+# - 所有请求先经过 LLMScheduler 按优先级准入，并发上限为 capacity
+
+
+class Backend:
+    def __init__(self, host, models=None, weight=1):
+        self.host = host.rstrip("/")
+        self.models = set(models or [])  # 为空表示不限模型
+        self.weight = max(int(weight), 1)
+        self.inflight = 0
+        self.failures = 0
+        self.open_until = 0.0
+        self.resident = set()
+        self.resident_at = 0.0
+        self.served = 0
+
+    def serves(self, model):
+        return not self.models or model in self.models
+
+    def healthy(self, now=None):
+        return (now or time.monotonic()) >= self.open_until
+
+    def status(self):
+        return {
+            "host": self.host,
+            "healthy": self.healthy(),
+            "inflight": self.inflight,
+            "weight": self.weight,
+            "served": self.served,
+            "resident": sorted(self.resident),
+        }
+
+
+class BackendPool:
+    def __init__(self, backends, ps_ttl=15, fail_threshold=3, cooldown=30, cold_penalty=1.0,
+                 reserve_interactive=1, urgent_seconds=120):
+        self.backends = backends
+        self.scheduler = LLMScheduler(lambda: self.capacity, reserve_interactive, urgent_seconds)
+        self.cold_penalty = cold_penalty
+        self.ps_ttl = ps_ttl
+        self.fail_threshold = fail_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_cfg(cls, cfg):
+        oc = cfg.get("ollama", {})
+        hosts = oc.get("hosts") or [{"host": oc.get("host", "http://127.0.0.1:11434")}]
+        backends = [
+            Backend(h, None, 1) if isinstance(h, str) else Backend(h["host"], h.get("models"), h.get("weight", 1))
+            for h in hosts
+        ]
+        return cls(backends, ps_ttl=oc.get("ps_ttl", 15), fail_threshold=oc.get("fail_threshold", 3),
+                   cooldown=oc.get("cooldown", 30), cold_penalty=oc.get("cold_penalty", 1.0),
+                   reserve_interactive=int(oc.get("reserve_interactive", 1)),
+                   urgent_seconds=float(oc.get("urgent_seconds", 120)))
+
+    @property
+    def capacity(self):
+        """可同时处理的请求数（健康主机权重之和）"""
+        return sum(b.weight for b in self.backends if b.healthy()) or 1
+
+    def _refresh_resident(self, be):
+        if time.monotonic() - be.resident_at < self.ps_ttl:
+            return
+        be.resident_at = time.monotonic()
+        try:
+            resp = requests.get(f"{be.host}/api/ps", timeout=2)
+            resp.raise_for_status()
+            be.resident = {m.get("name") or m.get("model") for m in resp.json().get("models", [])}
+        except (requests.RequestException, ValueError):
+            be.resident = set()
+
+    def _eligible(self, model):
+        now = time.monotonic()
+        pool = [b for b in self.backends if b.serves(model) and b.healthy(now)]
+        if not pool:
+            # 全部熔断时仍然尝试最早恢复的主机，而不是直接失败
+            pool = sorted((b for b in self.backends if b.serves(model)), key=lambda b: b.open_until)[:1]
+        return pool
+
+    def _rank(self, pool, model, prefer):
+        # 指定主机优先；其余按负载排序，模型未常驻的主机额外计 cold_penalty 个在途请求
+        return sorted(pool, key=lambda b: (
+            b.host != prefer,
+            b.inflight / b.weight + (0 if model in b.resident else self.cold_penalty),
+        ))
+
+    def _acquire(self, model, exclude, prefer):
+        pool = [b for b in self._eligible(model) if b.host not in exclude]
+        for b in pool:
+            self._refresh_resident(b)  # 网络请求放在锁外
+        with self._lock:
+            for b in self._rank(pool, model, prefer):
+                b.inflight += 1
+                return b
+        return None
+
+    def _release(self, be, ok):
+        with self._lock:
+            be.inflight -= 1
+            if ok:
+                be.failures = 0
+                be.served += 1
+            else:
+                be.failures += 1
+                if be.failures >= self.fail_threshold:
+                    be.open_until = time.monotonic() + self.cooldown
+
+    def post(self, path, payload, timeout=600, prefer=None):
+        """
+        把请求发往最合适的主机，失败时依次切换
+
+        Returns:
+            tuple: (响应 JSON, 实际使用的主机)
+        """
+        with self.scheduler.admit():
+            return self._post(path, payload, timeout, prefer)
+
+    def _post(self, path, payload, timeout, prefer):
+        model = payload.get("model")
+        tried, last_err = set(), None
+        while True:
+            be = self._acquire(model, tried, prefer)
+            if be is None:
+                raise last_err or requests.ConnectionError(f"没有可用的 Ollama 主机 (model={model})")
+            tried.add(be.host)
+            try:
+                resp = requests.post(f"{be.host}{path}", json=payload, timeout=timeout)
+                if resp.status_code >= 500:
+                    resp.raise_for_status()
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                self._release(be, ok=False)
+                last_err = e
+                continue
+            # 4xx 是请求本身的问题，换主机也无济于事
+            self._release(be, ok=True)
+            resp.raise_for_status()
+            return resp.json(), be.host
+
+    def generate(self, payload, timeout=600, prefer=None):
+        return self.post("/api/generate", payload, timeout=timeout, prefer=prefer)
+
+    def status(self):
+        return [b.status() for b in self.backends]
+
+
+_POOL = None
+_POOL_KEY = None
+_POOL_LOCK = threading.Lock()
+
+
+_POOL_FIELDS = ("hosts", "host", "ps_ttl", "fail_threshold", "cooldown", "cold_penalty",
+                "reserve_interactive", "urgent_seconds")
+
+
+def get_pool(cfg):
+    """
+    返回与当前 ollama 配置对应的共享连接池
+
+    主机或调度参数变化时新建连接池；进行中的请求仍在旧连接池上完成，不会中断
+    """
+    global _POOL, _POOL_KEY
+    oc = cfg.get("ollama", {})
+    key = repr(tuple(oc.get(k) for k in _POOL_FIELDS))
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_KEY != key:
+            _POOL, _POOL_KEY = BackendPool.from_cfg(cfg), key
+        return _POOL
@@ -0,0 +1,134 @@
+# pipeline.py
+import json
+from datetime import datetime
+
+from arxiv_fetch import fetch_window, fetch_delta, pack_papers
+from summarizer import run_ollama, summarize_papers, assemble_report
+import fulltext
+import ranking
+
+# 报告生成流程（不依赖 Discord）：抓取 → 打包 →（全文摄取）→ 摘要 → 拼装
+# summary_mode:
+#   single  一次调用模型生成整篇报告（默认）
+#   map     逐篇生成摘要，再按模板拼装报告
+
+
+def summary_mode(cfg):
+    return cfg.get("summary_mode", "single")
+
+
+def collect(cfg, since_local, now_local):
+    """抓取并打包论文，启用个性化排序时从更多候选中挑选，按配置合并近重复论文"""
+    max_items = cfg.get("digest_max_items", 20)
+    papers = fetch_window(cfg, since_local, now_local, max_items=ranking.candidate_count(cfg, max_items))
+    data = ranking.select(cfg, pack_papers(cfg, papers), max_items)
+    if data and (cfg.get("dedup", {}) or {}).get("enabled", True):
+        from dedup import cluster_papers
+        data = cluster_papers(cfg, data)
+    return data
+
+
+def ingest(cfg, data):
+    """
+    可选：摘要之前下载并解析全文 PDF，逐篇摘要附引言节选、对话检索全文；失败不影响报告
+
+    Returns:
+        bool: 全文是否可用（未启用、未安装 pypdf 或全部下载失败时为 False）
+    """
+    if not data or not fulltext.enabled(cfg):
+        return False
+    try:
+        return fulltext.ingest_sync(cfg, data)["ok"]
+    except Exception as e:
+        print(f" 全文摄取失败: {e}")
+        return False
+
+
+def generate(cfg, period_label, since_local, now_local, data, summaries=None, on_result=None, on_ingested=None):
+    """
+    根据 summary_mode 生成报告正文
+
+    map 模式下 summaries 中已有的论文不再调用模型，
+    每完成一篇调用 on_result(paper_id, result)，便于逐篇记录进度；
+    全文摄取成功后调用 on_ingested()
+    """
+    if ingest(cfg, data) and on_ingested:
+        on_ingested()
+    since_str, now_str = since_local.isoformat(), now_local.isoformat()
+    if summary_mode(cfg) == "map":
+        summaries = summarize_papers(cfg, data, done=summaries, on_result=on_result)
+        return assemble_report(cfg, period_label, since_str, now_str, data, summaries)
+    return run_ollama(cfg, period_label, since_str, now_str, json.dumps(data, ensure_ascii=False))
+
+
+def prepare(cfg, period_label, since_local, until_local):
+    """
+    预取阶段：在推送时间之前完成抓取、打包和耗时的模型调用
+
+    Returns:
+        dict: since / until / data / summaries (map) / md (single)
+    """
+    data = collect(cfg, since_local, until_local)
+    prepared = {"since": since_local, "until": until_local, "data": data, "summaries": {}, "md": None}
+    if data:
+        ingest(cfg, data)
+        if summary_mode(cfg) == "map":
+            prepared["summaries"] = summarize_papers(cfg, data)
+        else:
+            prepared["md"] = run_ollama(cfg, period_label, since_local.isoformat(),
+                                        until_local.isoformat(), json.dumps(data, ensure_ascii=False))
+    print(f" 预取完成: {period_label} {len(data)} 篇")
+    return prepared
+
+
+def finalize(cfg, period_label, prepared, now_local):
+    """
+    推送阶段：增量补齐预取之后的新论文，拼装最终报告
+
+    Returns:
+        tuple: (data, md)
+    """
+    data = prepared["data"]
+    max_items = cfg.get("digest_max_items", 20)
+
+    latest = max((datetime.fromisoformat(p["published"]) for p in data), default=prepared["since"])
+    delta = pack_papers(cfg, fetch_delta(cfg, latest, [p["id"] for p in data]))
+
+    since_str, now_str = prepared["since"].isoformat(), now_local.isoformat()
+    if summary_mode(cfg) == "map":
+        data = ranking.select(cfg, delta + data, max_items)
+        ingest(cfg, data)  # 预取时已摄取的论文直接命中缓存
+        summaries = summarize_papers(cfg, data, done=prepared["summaries"])
+        return data, assemble_report(cfg, period_label, since_str, now_str, data, summaries)
+
+    md = prepared["md"]
+    if md is None:
+        data = ranking.select(cfg, delta + data, max_items)
+        ingest(cfg, data)
+        return data, run_ollama(cfg, period_label, since_str, now_str, json.dumps(data, ensure_ascii=False))
+    if delta:
+        # 整篇报告已生成，新增论文以附录形式补充，避免推送前再跑一次长生成
+        extra = "\n".join(f"• {p['title']} ({p['link']})" for p in delta)
+        md = md + "\n\n补充：推送前新增论文\n" + extra
+        data = delta + data
+        ingest(cfg, delta)  # 供对话检索
+    return data, md
+
+
+def prompt_context(data, md):
+    """对话使用的上下文：原始条目 + 报告"""
+    return (
+        "# 原始条目 (JSON)\n" + json.dumps(data, ensure_ascii=False, indent=2) +
+        "\n\n# 早/晚报 (Markdown)\n" + md
+    )
+
+
+def save(st, data, md, cfg=None):
+    """把一期结果写入 PeriodState，并把本期计入跨期趋势基线"""
+    st.save_raw(data)
+    st.save_report(md)
+    st.save_prompt(prompt_context(data, md))
+    if cfg is not None and data:
+        import trends
+        if trends.enabled(cfg):
+            trends.get_store(cfg).record(st.period, data)
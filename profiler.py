@@ -0,0 +1,160 @@
+# profiler.py
+import contextvars, cProfile, io, pstats, re, sys, threading, time, tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# 按需性能剖析：arxiv-prof digest|chat 为下一次报告/对话开启 cProfile 与 tracemalloc，运行一次后自动关闭
+#   - 未开启时只有一次字典查询，几乎没有开销
+#   - 事件循环线程在会话期间整体剖析（同时运行的其他协程也会计入）；Python 3.12+ 的 cProfile 基于
+#     sys.monitoring，对所有线程生效，to_thread 中的任务自然计入。更早的版本 cProfile 按线程生效，
+#     to_thread 中执行的任务通过 contextvars 找到会话，在各自线程中单独剖析后合并
+#   - 启用任务队列时在 worker 进程中执行的部分不在统计范围内
+#   - 结果写入期别目录: profile_<目标>_<时间>.prof (pstats) 与 .txt (热点与内存分配位置)
+
+TARGETS = ("digest", "chat")
+
+_ARMED = {t: False for t in TARGETS}
+_ACTIVE = threading.Lock()  # 同一时间只允许一个会话（cProfile 在同一线程上不能嵌套）
+_SESSION = contextvars.ContextVar("profile_session", default=None)
+_PROCESS_WIDE = sys.version_info >= (3, 12)
+_LOCAL = threading.local()  # 本线程是否已在 thread_scope 中
+_IDLE = re.compile(r"select\.(epoll|kqueue|poll|select)|selectors\.py|base_events\.py|events\.py:\d+\)$|"
+                   r"threading\.py|acquire' of '_thread")
+
+
+def arm(target):
+    _ARMED[target] = True
+
+
+def disarm():
+    for t in TARGETS:
+        _ARMED[t] = False
+
+
+def armed():
+    return [t for t in TARGETS if _ARMED[t]]
+
+
+def take(target):
+    """若 target 已开启则返回一次性的会话，否则返回 None"""
+    if not _ARMED.get(target):
+        return None
+    if not _ACTIVE.acquire(blocking=False):
+        return None  # 其他会话进行中，保持开启留给下一次
+    _ARMED[target] = False
+    return Session(target)
+
+
+class Session:
+    def __init__(self, target, frames=10):
+        self.target = target
+        self.frames = frames
+        self.main = cProfile.Profile()
+        self.thread_profiles = []
+        self.snapshot = None
+        self.peak = 0
+        self.wall = 0.0
+        self._lock = threading.Lock()
+        self._own_tracemalloc = False
+
+    def __enter__(self):
+        self._token = _SESSION.set(self)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._own_tracemalloc = True
+        tracemalloc.reset_peak()
+        self._t0 = time.perf_counter()
+        self.main.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.main.disable()
+        self.wall = time.perf_counter() - self._t0
+        self.snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+        self.peak = tracemalloc.get_traced_memory()[1]
+        if self._own_tracemalloc:
+            tracemalloc.stop()
+        _SESSION.reset(self._token)
+        _ACTIVE.release()
+        return False
+
+    def stats(self):
+        s = pstats.Stats(self.main)
+        for p in self.thread_profiles:
+            s.add(p)
+        return s
+
+    def top_allocations(self, limit=15):
+        return self.snapshot.statistics("lineno")[:limit] if self.snapshot else []
+
+    def hotspots(self, sort="tottime", limit=5):
+        """[(函数位置, 调用次数, 自身耗时, 累计耗时)]"""
+        s = self.stats()
+        rows = []
+        for (file, line, name), (cc, nc, tt, ct, _) in s.stats.items():
+            where = f"{name} ({file.rsplit('/', 1)[-1]}:{line})" if line else name
+            if _IDLE.search(where):
+                continue  # 事件循环空等与调度本身不算热点
+            rows.append((where, nc, tt, ct))
+        key = 2 if sort == "tottime" else 3
+        return sorted(rows, key=lambda r: -r[key])[:limit]
+
+    def save(self, directory):
+        """写入 .prof 与 .txt，返回 (prof 路径, txt 路径)"""
+        stamp = datetime.now().strftime("%H%M%S")
+        prof_path = directory / f"profile_{self.target}_{stamp}.prof"
+        txt_path = directory / f"profile_{self.target}_{stamp}.txt"
+        self.stats().dump_stats(prof_path)
+
+        buf = io.StringIO()
+        buf.write(f"# {self.target} 剖析  用时 {self.wall:.2f}s  内存峰值 {self.peak / 1024 / 1024:.1f} MB\n\n")
+        s = self.stats()
+        s.stream = buf
+        buf.write("## 累计耗时 Top 30\n")
+        s.sort_stats("cumulative").print_stats(30)
+        buf.write("## 自身耗时 Top 30\n")
+        s.sort_stats("tottime").print_stats(30)
+        buf.write("## 内存分配位置 Top 20\n")
+        for stat in self.top_allocations(20):
+            buf.write(f"{stat}\n")
+        txt_path.write_text(buf.getvalue(), encoding="utf-8")
+        return prof_path, txt_path
+
+    def summary(self):
+        """频道中显示的简短热点摘要"""
+        lines = [f"**{self.target}** 用时 {self.wall:.2f}s | 内存峰值 {self.peak / 1024 / 1024:.1f} MB"]
+        lines.append("自身耗时:")
+        lines += [f"• {w} — {tt:.3f}s / {nc} 次" for w, nc, tt, _ in self.hotspots("tottime")]
+        lines.append("累计耗时:")
+        lines += [f"• {w} — {ct:.3f}s" for w, _, _, ct in self.hotspots("cumulative")]
+        lines.append("内存分配:")
+        for stat in self.top_allocations(5):
+            frame = stat.traceback[0]
+            lines.append(f"• {frame.filename.rsplit('/', 1)[-1]}:{frame.lineno} — {stat.size / 1024:.0f} KB / {stat.count} 块")
+        return "\n".join(lines)
+
+
+@contextmanager
+def thread_scope():
+    """在 to_thread 等工作线程中调用：若当前上下文处于剖析会话中，则剖析本线程（3.12+ 无需处理）"""
+    session = _SESSION.get()
+    if session is None or _PROCESS_WIDE or getattr(_LOCAL, "active", False):
+        yield  # 嵌套调用由外层统计
+        return
+    prof = cProfile.Profile()
+    try:
+        prof.enable()
+    except ValueError:
+        yield  # 其他剖析工具已在运行
+        return
+    _LOCAL.active = True
+    try:
+        yield
+    finally:
+        _LOCAL.active = False
+        prof.disable()
+        with session._lock:
+            session.thread_profiles.append(prof)
@@ -0,0 +1,358 @@
+# ranking.py
+import hashlib, json, os, re, threading
+from pathlib import Path
+
+import numpy as np
+
+import state
+
+# 个性化排序（可选，ranking.enabled）
+#   - 向量: 标题+摘要按论文版本（如 2510.01234v2）只嵌入一次，写入内存映射矩阵
+#           storage/embeddings/<嵌入空间>/vectors.f32（如 ollama-nomic-embed-text、hash-256），meta.json 记录 版本 id -> 行号；
+#           后端为 Ollama /api/embed，或本地特征哈希 (backend: hash，模型名为 hash-<维度>，无需模型)
+#           每个嵌入空间一个目录，切换模型/维度（包括热更新后再切回）互不覆盖
+#   - 兴趣: 每位用户一个兴趣向量，由报告消息上的表情回应更新（👎 等为负，其余为正），新回应前先按 decay 衰减
+#   - 排序: 候选论文的向量按行号一次取出，与团队兴趣向量（各用户兴趣之和）做一次矩阵-向量乘法；
+#           回应数不足 min_reactions 时保持原有的时间顺序
+# 抓取阶段（可能在 worker 进程中）写向量，bot 进程写兴趣；双方读取前按文件 mtime 重新加载。
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_VERSION = re.compile(r"v\d+$")
+ARXIV_ID = re.compile(r"arxiv\.org/(?:abs|pdf)/(\d{4}\.\d{4,5})")
+
+
+def base_id(paper_id):
+    return _VERSION.sub("", paper_id)
+
+
+def paper_text(p):
+    return f"{p.get('title', '')}. {p.get('abstract', '')}"
+
+
+def _normalize(m):
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    return m / np.where(norms > 0, norms, 1)
+
+
+# ---- 嵌入后端 ----
+
+def hash_embed(texts, dim=256):
+    """特征哈希：单词与二元词组带符号地散列到 dim 维，作为无模型时的替代"""
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    for i, text in enumerate(texts):
+        words = _TOKEN.findall(text.lower())
+        for tok in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            h = int.from_bytes(hashlib.blake2b(tok.encode(), digest_size=8).digest(), "little")
+            out[i, h % dim] += 1.0 if (h >> 63) else -1.0
+    return _normalize(out)
+
+
+def ollama_embed(cfg, texts, model, batch_size=32):
+    from ollama_pool import get_pool
+    pool = get_pool(cfg)
+    vecs = []
+    for i in range(0, len(texts), batch_size):
+        resp, _ = pool.post("/api/embed", {"model": model, "input": texts[i:i + batch_size]}, timeout=300)
+        vecs.extend(resp["embeddings"])
+    return _normalize(np.asarray(vecs, dtype=np.float32))
+
+
+# ---- 向量索引 ----
+
+class EmbeddingIndex:
+    def __init__(self, root, model, dim=None):
+        self.root = Path(root)
+        self.model = model
+        self.dim = dim  # None 表示由模型决定（首次写入时确定）
+        self.meta_path = self.root / "meta.json"
+        self.data_path = self.root / "vectors.f32"
+        self._reset()
+        self._mtime = None
+        self._load()
+
+    def _reset(self):
+        self.meta = {"model": self.model, "dim": 0, "rows": 0, "capacity": 0, "ids": {}}
+        self._mm = None
+        self._latest = {}  # 不带版本号的 id -> 最新版本所在行
+
+    def _load(self):
+        if not self.meta_path.exists():
+            return
+        meta = json.loads(self.meta_path.read_text(encoding="utf-8"))
+        self._mtime = self.meta_path.stat().st_mtime_ns
+        if meta.get("model") != self.model or (self.dim and meta.get("dim") and meta["dim"] != self.dim):
+            # 目录按嵌入空间区分，正常不会出现；文件被手工替换时丢弃旧向量，不按错误的形状打开
+            print(f" 向量索引为 {meta.get('model')}/{meta.get('dim')} 维，与 {self.model} 不符，重建")
+            self._reset()
+            self.data_path.unlink(missing_ok=True)
+            return
+        self.meta = meta
+        if meta["capacity"]:
+            self._mm = np.memmap(self.data_path, dtype=np.float32, mode="r+", shape=(meta["capacity"], meta["dim"]))
+        self._latest = {base_id(pid): row for pid, row in sorted(meta["ids"].items(), key=lambda x: x[1])}
+
+    def refresh(self):
+        """其他进程写入新向量后重新加载"""
+        if self.meta_path.exists() and self.meta_path.stat().st_mtime_ns != self._mtime:
+            self._reset()
+            self._load()
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def rows(self, paper_ids):
+        return [self.meta["ids"].get(pid) for pid in paper_ids]
+
+    def latest_row(self, paper_id):
+        return self._latest.get(base_id(paper_id))
+
+    def vectors(self, rows):
+        return np.asarray(self._mm[rows]) if len(rows) else np.zeros((0, self.meta["dim"]), dtype=np.float32)
+
+    def _grow(self, need, dim):
+        cap = max(self.meta["capacity"], 1024)
+        while cap < need:
+            cap *= 2
+        if self.meta["capacity"] == 0:
+            self.meta["dim"] = dim
+        elif cap == self.meta["capacity"]:
+            return
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm = None
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.data_path, "ab") as f:
+            f.truncate(cap * dim * 4)
+        self.meta["capacity"] = cap
+        self._mm = np.memmap(self.data_path, dtype=np.float32, mode="r+", shape=(cap, dim))
+
+    def add(self, paper_ids, matrix):
+        start = self.meta["rows"]
+        self._grow(start + len(paper_ids), matrix.shape[1])
+        self._mm[start:start + len(paper_ids)] = matrix
+        self._mm.flush()
+        for i, pid in enumerate(paper_ids):
+            self.meta["ids"][pid] = start + i
+            self._latest[base_id(pid)] = start + i
+        self.meta["rows"] = start + len(paper_ids)
+        tmp = self.meta_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.meta), encoding="utf-8")
+        os.replace(tmp, self.meta_path)
+        self._mtime = self.meta_path.stat().st_mtime_ns
+
+
+# ---- 兴趣向量 ----
+
+class InterestProfiles:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.users, self.counts = [], []
+        self.vectors = None
+        self._mtime = None
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        z = np.load(self.path)
+        self.users = [str(u) for u in z["users"]]
+        self.counts = [int(c) for c in z["counts"]]
+        self.vectors = z["vectors"]
+        self._mtime = self.path.stat().st_mtime_ns
+
+    def refresh(self):
+        if self.path.exists() and self.path.stat().st_mtime_ns != self._mtime:
+            self._load()
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp.npz")
+        np.savez(tmp, users=np.array(self.users), counts=np.array(self.counts, dtype=np.int64), vectors=self.vectors)
+        os.replace(tmp, self.path)
+        self._mtime = self.path.stat().st_mtime_ns
+
+    def update(self, user_id, vec, decay=1.0, count=1):
+        """兴趣 = decay × 旧兴趣 + vec；维度变化（换了嵌入模型）时清空"""
+        uid = str(user_id)
+        if self.vectors is None or self.vectors.shape[1] != len(vec):
+            self.users, self.counts = [], []
+            self.vectors = np.zeros((0, len(vec)), dtype=np.float32)
+        if uid not in self.users:
+            self.users.append(uid)
+            self.counts.append(0)
+            self.vectors = np.vstack([self.vectors, np.zeros((1, len(vec)), dtype=np.float32)])
+        i = self.users.index(uid)
+        self.vectors[i] = decay * self.vectors[i] + vec
+        self.counts[i] = max(self.counts[i] + count, 0)
+        self._save()
+
+    def reactions(self):
+        return sum(self.counts)
+
+    def team(self):
+        """各用户兴趣方向之和（每人权重相同，避免回应多的人主导）"""
+        if self.vectors is None or not len(self.vectors):
+            return None
+        v = _normalize(self.vectors).sum(axis=0)
+        n = np.linalg.norm(v)
+        return v / n if n > 0 else None
+
+
+# ---- 排序 ----
+
+def _identity(rc):
+    """决定嵌入空间的配置：(后端, 模型名, 维度)；Ollama 的维度由模型决定，记为 None"""
+    backend = rc.get("backend", "ollama")
+    if backend == "hash":
+        dim = int(rc.get("dim", 256))
+        return backend, f"hash-{dim}", dim
+    return backend, rc.get("model", "nomic-embed-text"), None
+
+
+def _migrate_legacy(root, directory, model, slug):
+    """旧版把所有模型的索引放在 storage/embeddings/ 下，模型一致时移入对应目录（兴趣向量不丢失）"""
+    legacy = root / "meta.json"
+    if (directory / "meta.json").exists() or not legacy.exists():
+        return
+    try:
+        if json.loads(legacy.read_text(encoding="utf-8")).get("model") != model:
+            return
+    except ValueError:
+        return
+    directory.mkdir(parents=True, exist_ok=True)
+    for src, dst in (("vectors.f32", "vectors.f32"), (f"profiles_{slug}.npz", "profiles.npz"),
+                     ("meta.json", "meta.json")):
+        if (root / src).exists():
+            os.replace(root / src, directory / dst)
+
+
+class Ranker:
+    def __init__(self, cfg):
+        rc = cfg.get("ranking", {}) or {}
+        self.backend, self.model, self.dim = _identity(rc)
+        self._lock = threading.RLock()
+        self.configure(cfg)
+        # 向量与兴趣向量都只在同一嵌入空间内有意义，按 后端-模型 分目录保存
+        root = state.BASE / "embeddings"
+        slug = re.sub(r"[^\w.-]", "_", self.model)
+        directory = root / (slug if self.backend == "hash" else f"{self.backend}-{slug}")  # hash-256 / ollama-nomic-embed-text
+        _migrate_legacy(root, directory, self.model, slug)
+        self.index = EmbeddingIndex(directory, self.model, self.dim)
+        self.profiles = InterestProfiles(directory / "profiles.npz")
+
+    def configure(self, cfg):
+        """更新不影响嵌入空间的参数（配置热更新时原地调用）"""
+        rc = cfg.get("ranking", {}) or {}
+        with self._lock:
+            self.cfg = cfg
+            self.batch_size = int(rc.get("batch_size", 32))
+            self.min_reactions = int(rc.get("min_reactions", 3))
+            self.recency_weight = float(rc.get("recency_weight", 0.1))
+            self.decay = float(rc.get("decay", 0.98))
+            self.negative = set(rc.get("negative_emojis", ["👎"]))
+
+    def _embed(self, texts):
+        if self.backend == "hash":
+            return hash_embed(texts, self.dim)
+        return ollama_embed(self.cfg, texts, self.model, self.batch_size)
+
+    def embed(self, papers):
+        """确保每篇论文（按版本）都已嵌入，返回对应的行号"""
+        with self._lock:
+            self.index.refresh()
+            ids = [p["id"] for p in papers]
+            missing = list(dict.fromkeys(pid for pid, row in zip(ids, self.index.rows(ids)) if row is None))
+            if missing:
+                by_id = {p["id"]: p for p in papers}
+                self.index.add(missing, self._embed([paper_text(by_id[pid]) for pid in missing]))
+                print(f" 嵌入新论文 {len(missing)} 篇（索引共 {len(self.index)} 篇）")
+            return self.index.rows(ids)
+
+    def rank(self, papers):
+        """
+        按团队兴趣排序（papers 需按时间降序）
+
+        Returns:
+            list: 排序后的论文；兴趣不足时原样返回
+        """
+        if not papers:
+            return papers
+        rows = self.embed(papers)
+        with self._lock:
+            self.profiles.refresh()
+            team = self.profiles.team()
+            if team is None or self.profiles.reactions() < self.min_reactions or len(team) != self.index.meta["dim"]:
+                return papers
+            scores = self.index.vectors(rows) @ team
+        # 时间先验：越新的论文加分越多，兴趣相近时仍偏向新论文
+        scores = scores + self.recency_weight * np.linspace(1, 0, len(papers))
+        order = np.argsort(-scores, kind="stable")
+        return [papers[i] for i in order]
+
+    def feedback(self, user_id, paper_ids, emoji, removed=False):
+        """
+        用户对包含 paper_ids 的消息添加/撤销了表情回应
+
+        消息中的每篇论文平分这次回应；撤销时减去同样的量且不衰减。
+
+        Returns:
+            int: 计入的论文数（未嵌入过的论文跳过）
+        """
+        with self._lock:
+            self.index.refresh()
+            rows = [r for r in (self.index.latest_row(pid) for pid in paper_ids) if r is not None]
+            if not rows:
+                return 0
+            self.profiles.refresh()
+            sign = -1.0 if str(emoji) in self.negative else 1.0
+            vec = sign * self.index.vectors(rows).mean(axis=0)
+            if removed:
+                self.profiles.update(user_id, -vec, count=-1)
+            else:
+                self.profiles.update(user_id, vec, decay=self.decay)
+            return len(rows)
+
+    def stats(self):
+        with self._lock:
+            self.profiles.refresh()
+            return {"papers": len(self.index), "model": self.model, "users": len(self.profiles.users),
+                    "reactions": self.profiles.reactions(), "active": self.profiles.reactions() >= self.min_reactions}
+
+
+_RANKERS = {}
+_LOCK = threading.Lock()
+
+
+def enabled(cfg):
+    return bool((cfg.get("ranking", {}) or {}).get("enabled", False))
+
+
+def get_ranker(cfg):
+    """每个嵌入空间 (存储目录, 后端, 模型, 维度) 一个实例，各自使用独立的索引目录；其余参数变化时原地更新"""
+    key = (str(state.BASE),) + _identity(cfg.get("ranking", {}) or {})
+    with _LOCK:
+        ranker = _RANKERS.get(key)
+        if ranker is None:
+            # 切换了嵌入空间：释放其他实例的内存映射，切回时从各自目录重新加载
+            _RANKERS.clear()
+            ranker = _RANKERS[key] = Ranker(cfg)
+        else:
+            ranker.configure(cfg)
+        return ranker
+
+
+def candidate_count(cfg, max_items):
+    """启用排序时多抓取候选论文，再从中挑选 max_items 篇"""
+    if not enabled(cfg):
+        return max_items
+    return max_items * int((cfg.get("ranking", {}) or {}).get("candidate_factor", 5))
+
+
+def select(cfg, papers, k):
+    """从候选论文中选出 k 篇：启用排序时按兴趣排序，否则保持时间顺序"""
+    if enabled(cfg):
+        try:
+            papers = get_ranker(cfg).rank(papers)
+        except Exception as e:
+            print(f" 个性化排序失败，按时间顺序选取: {e}")
+    return papers[:k]
@@ -1,16 +1,135 @@
 # state.py
-import json, os
+import json, os, threading, time
+from collections import deque
 from pathlib import Path
 from typing import Optional
 
-BASE = Path("storage")
-BASE.mkdir(parents=True, exist_ok=True)
+BASE = Path("storage")  # 首次写入时才创建
+
+class ChatLog:
+    """
+    按期别追加写入的对话记录 (JSONL)
+
+    每条消息一行，条数与最近 TAIL 条记录缓存在内存中，追加与取最近对话均为 O(1)。
+    fsync 策略: "always" 每条落盘, "never" 交给操作系统, 数字表示最短间隔秒数。
+    """
+
+    TAIL = 50
+    _registry = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, path: Path, fsync="never"):
+        self.path = path
+        self.fsync = self.check_fsync(fsync)
+        self._lock = threading.Lock()
+        self._count = None
+        self._tail = None
+        self._last_sync = 0.0
+
+    @classmethod
+    def for_path(cls, path: Path, fsync=None):
+        # 同一文件共用一个实例，保证条数缓存和写入锁只有一份
+        key = str(path)
+        with cls._registry_lock:
+            log = cls._registry.get(key)
+            if log is None:
+                log = cls._registry[key] = cls(path)
+            if fsync is not None:
+                log.fsync = cls.check_fsync(fsync)
+            return log
+
+    @staticmethod
+    def check_fsync(value):
+        """校验 fsync 策略，数字（或数字字符串）转为 float；无效时抛出 ValueError，而不是等到写入时才出错"""
+        if value in (None, "always", "never"):
+            return value
+        try:
+            seconds = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"无效的 fsync 策略: {value!r}（应为 always | never | 间隔秒数）") from None
+        if seconds < 0:
+            raise ValueError(f"fsync 间隔不能为负数: {value!r}")
+        return seconds
+
+    def _scan(self):
+        # 仅在首次访问时扫描一次已有文件，同时得到条数与最近的记录
+        n, lines = 0, deque(maxlen=self.TAIL)
+        if self.path.exists():
+            with self.path.open("rb") as f:
+                for line in f:
+                    n += 1
+                    lines.append(line)
+        tail = deque(maxlen=self.TAIL)
+        for line in lines:
+            try:
+                tail.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # 进程崩溃时可能留下半行
+        self._count, self._tail = n, tail
+
+    @property
+    def count(self) -> int:
+        if self._count is None:
+            self._scan()
+        return self._count
+
+    def tail(self, n: int) -> list:
+        """最近 n 条记录（n 不超过 TAIL）"""
+        with self._lock:
+            if self._tail is None:
+                self._scan()
+            return list(self._tail)[-n:] if n > 0 else []
+
+    def append(self, role: str, text: str, **meta) -> int:
+        with self._lock:
+            seq = self.count + 1
+            rec = {"seq": seq, "ts": time.time(), "role": role, "text": text}
+            rec.update({k: v for k, v in meta.items() if v is not None})
+            line = json.dumps(rec, ensure_ascii=False) + "\n"
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(line)
+                if self._should_sync():
+                    f.flush()
+                    os.fsync(f.fileno())
+                    self._last_sync = time.monotonic()
+            self._count = seq
+            self._tail.append(rec)
+            return seq
+
+    def _should_sync(self) -> bool:
+        if self.fsync == "always":
+            return True
+        if self.fsync in (None, "never"):
+            return False
+        return time.monotonic() - self._last_sync >= self.fsync
+
+    def __iter__(self):
+        # 流式读取，不把整个记录载入内存
+        if not self.path.exists():
+            return
+        with self.path.open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 进程崩溃时可能留下半行
+
 
 class PeriodState:
     def __init__(self, period: str):
         # period: 2025-10-09_AM 或 2025-10-09_PM
+        self.period = period
         self.dir = BASE / period
-        self.dir.mkdir(parents=True, exist_ok=True)
+        if not self.dir.exists():
+            # 新期别登记到索引；已归档的期别从压缩包解出
+            from catalog import get_catalog
+            cat = get_catalog()
+            if not cat.restore(period):
+                self.dir.mkdir(parents=True, exist_ok=True)
+                cat.add(period)
 
     @property
     def raw_json(self):
@@ -24,12 +143,72 @@ class PeriodState:
     def prompt_context(self):
         return self.dir / "prompt_context.txt"
 
+    @property
+    def chat_jsonl(self):
+        return self.dir / "chat.jsonl"
+
     @property
     def chat_dir(self):
         d = self.dir / "chat"
         d.mkdir(exist_ok=True)
         return d
 
+    # ===== 阶段清单 =====
+    # manifest.json 记录一期报告各阶段的完成情况，重试/重启时从最后完成的阶段继续：
+    #   stages:    {"fetched"|"packed"|"ingested"|"assembled"|"delivered": 完成时间}
+    #   summaries: {paper_id: {"summary", "comment"}}  逐篇摘要结果
+    #   delivered: {分段序号: Discord 消息 id}          已发送的分段不再重发
+    #   meta:      期别标签、时间窗、标题等恢复时需要的信息
+
+    @property
+    def manifest_path(self):
+        return self.dir / "manifest.json"
+
+    @property
+    def manifest(self):
+        if self.manifest_path.exists():
+            try:
+                return json.loads(self.manifest_path.read_text(encoding="utf-8"))
+            except json.JSONDecodeError:
+                pass
+        return {"stages": {}, "summaries": {}, "delivered": {}, "meta": {}}
+
+    def _write_manifest(self, m):
+        tmp = self.manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(m, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.manifest_path)
+
+    def stage_done(self, stage: str) -> bool:
+        return stage in self.manifest["stages"]
+
+    def mark_stage(self, stage: str, **meta):
+        m = self.manifest
+        m["stages"][stage] = time.time()
+        m["meta"].update(meta)
+        self._write_manifest(m)
+
+    def save_summary(self, paper_id: str, result: dict):
+        m = self.manifest
+        m["summaries"][paper_id] = result
+        self._write_manifest(m)
+
+    def mark_delivered(self, idx: int, message_id):
+        m = self.manifest
+        m["delivered"][str(idx)] = message_id
+        self._write_manifest(m)
+
+    def reset_manifest(self):
+        if self.manifest_path.exists():
+            self.manifest_path.unlink()
+
+    @staticmethod
+    def load_manifest(period: str) -> Optional[dict]:
+        """读取某期的阶段清单，不存在时返回 None（不创建目录）"""
+        p = BASE / period / "manifest.json"
+        if not p.exists():
+            return None
+        return PeriodState(period).manifest
+
     def save_raw(self, data):
         self.raw_json.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
 
@@ -38,33 +217,43 @@ class PeriodState:
 
     def save_prompt(self, txt: str):
         self.prompt_context.write_text(txt, encoding="utf-8")
+        from catalog import get_catalog
+        get_catalog().update(self.period, "ready")
 
-    def append_chat(self, author: str, msg: str):
-        idx = len(list(self.chat_dir.glob("*.txt"))) + 1
-        (self.chat_dir / f"{idx:03d}_{author}.txt").write_text(msg, encoding="utf-8")
+    def chat_log(self, fsync=None) -> ChatLog:
+        return ChatLog.for_path(self.chat_jsonl, fsync)
 
-# 最近一期（<=12 小时内）检索
-from datetime import datetime, timedelta
+    def append_chat(self, author: str, msg: str, user=None, channel=None,
+                    message_id=None, latency_ms=None, fsync=None, **meta) -> int:
+        return self.chat_log(fsync).append(
+            author, msg, user=user, channel=channel,
+            message_id=message_id, latency_ms=latency_ms, **meta,
+        )
 
+    def iter_chat(self):
+        """按时间顺序流式返回对话记录，兼容旧版 chat/*.txt 单文件格式"""
+        legacy = self.dir / "chat"
+        if legacy.is_dir():
+            for p in sorted(legacy.glob("*.txt")):
+                idx, _, role = p.stem.partition("_")
+                yield {"seq": int(idx) if idx.isdigit() else 0, "role": role,
+                       "text": p.read_text(encoding="utf-8"), "legacy": True}
+        yield from self.chat_log()
+
+    def recent_chat(self, turns: int = 6):
+        """最近若干条对话，用作 LLM 的历史上下文（通常直接取内存中的缓存，不读文件）"""
+        if turns <= 0:
+            return []
+        log = self.chat_log()
+        if turns <= ChatLog.TAIL:
+            recent = log.tail(turns)
+            if len(recent) == turns or not (self.dir / "chat").is_dir():
+                return recent
+        # 需要的条数超过缓存，或需要补上旧版 chat/*.txt 中的记录
+        return list(deque(self.iter_chat(), maxlen=turns))
+
+# 最近一期（<=12 小时内）检索
 def latest_active_period(now_dt, hours=12) -> Optional[str]:
-    # 遍历 storage 目录，找到最近且在 12h 内的 period
-    cand = sorted([p.name for p in BASE.glob("*_AM")] + [p.name for p in BASE.glob("*_PM")])
-    cand = sorted(cand, reverse=True)
-    for name in cand:
-        # 解析日期
-        day, ap = name.split("_")
-        if ap not in ("AM", "PM"): continue
-        # 估计期点（10:00 AM 或 10:00 PM）
-        hour = 10 if ap == "AM" else 22
-        try:
-            # 添加时区信息以匹配 now_dt
-            from dateutil import tz
-            dt = datetime.fromisoformat(day)
-            dt = dt.replace(hour=hour, minute=0, second=0, microsecond=0)
-            # 添加时区信息
-            dt = dt.replace(tzinfo=tz.gettz("America/New_York"))
-        except:
-            continue
-        if now_dt - dt <= timedelta(hours=hours):
-            return name
-    return None
\ No newline at end of file
+    """通过期别索引查找最近一期，推送时间按配置的时区计算"""
+    from catalog import get_catalog
+    return get_catalog().latest_active(now_dt, hours)
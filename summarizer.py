@@ -1,5 +1,10 @@
 # summarizer.py
-import os, requests, time
+import contextvars, os, requests, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import fulltext
+from ollama_pool import get_pool
+from textnorm import truncate_sentences
 
 # 通过 HTTP 调用 Ollama，本地已安装 `ollama` 并拉取 qwen 模型。
 # 设置 OLLAMA_KEEP_ALIVE=0，使其在请求完成后立即"休眠/退出"。
@@ -20,8 +25,9 @@ PROMPT_TEMPLATE = """
 - 自然语言处理 (cs.CL)：{nlp_papers} 篇
 - 其他（如AI安全、多模态等）：{other_papers} 篇
 
-从关键词来看，今日高频词包括多模态、深度学习、神经网络等；
-在模型方向上，轻量化模型和跨模态学习成为主要趋势。
+从关键词来看，今日高频词包括{top_terms}；
+与近期基线相比，上升最快的关键词是{rising_terms}。
+分类占比变化：{category_shift}
 
 ---
 
@@ -79,7 +85,6 @@ PROMPT_TEMPLATE = """
 
 
 def run_ollama(cfg, period_label, since_str, now_str, items_json):
-    host = cfg.get("ollama", {}).get("host", "http://127.0.0.1:11434")
     model = cfg.get("ollama", {}).get("model", "deepseek-r1:latest")
     keep_alive = cfg.get("ollama", {}).get("keep_alive", 0)
 
@@ -88,10 +93,7 @@ def run_ollama(cfg, period_label, since_str, now_str, items_json):
     papers = json.loads(items_json)
 
     # 统计各类别论文数量
-    ml_count = sum(1 for p in papers if 'cs.LG' in p.get('primary_category', ''))
-    cv_count = sum(1 for p in papers if 'cs.CV' in p.get('primary_category', ''))
-    cl_count = sum(1 for p in papers if 'cs.CL' in p.get('primary_category', ''))
-    other_count = len(papers) - ml_count - cv_count - cl_count
+    ml_count, cv_count, cl_count, other_count = category_counts(papers)
 
     # 生成论文条目文本
     papers_text = ""
@@ -100,7 +102,7 @@ def run_ollama(cfg, period_label, since_str, now_str, items_json):
         authors = ', '.join(paper.get('authors', [])[:3])  # 只显示前3个作者
         if len(paper.get('authors', [])) > 3:
             authors += ' et al.'
-        summary = paper.get('abstract', '')[:200] + '...' if len(paper.get('abstract', '')) > 200 else paper.get('abstract', '')
+        summary = short_abstract(paper)
 
         papers_text += f"""
 **{i}. {title}**
@@ -112,6 +114,7 @@ def run_ollama(cfg, period_label, since_str, now_str, items_json):
 
     # 确定时间段
     time_period = "明早10点" if "早报" in period_label else "今晚10点"
+    top_terms, rising_terms, category_shift = trend_texts(cfg, papers)
 
     # 填充模板变量
     prompt = PROMPT_TEMPLATE.format(
@@ -120,20 +123,23 @@ def run_ollama(cfg, period_label, since_str, now_str, items_json):
         cv_papers=cv_count,
         nlp_papers=cl_count,
         other_papers=other_count,
+        top_terms=top_terms,
+        rising_terms=rising_terms,
+        category_shift=category_shift,
         paper1_title=papers[0].get('title', '') if len(papers) > 0 else '',
         paper1_authors=', '.join(papers[0].get('authors', [])[:3]) if len(papers) > 0 else '',
-        paper1_summary=papers[0].get('abstract', '')[:200] + '...' if len(papers) > 0 and len(papers[0].get('abstract', '')) > 200 else papers[0].get('abstract', '') if len(papers) > 0 else '',
+        paper1_summary=short_abstract(papers[0]) if len(papers) > 0 else '',
         paper1_comment=papers[0].get('primary_category', '') + '分类研究' if len(papers) > 0 else '',
         paper2_title=papers[1].get('title', '') if len(papers) > 1 else '',
         paper2_authors=', '.join(papers[1].get('authors', [])[:3]) if len(papers) > 1 else '',
-        paper2_summary=papers[1].get('abstract', '')[:200] + '...' if len(papers) > 1 and len(papers[1].get('abstract', '')) > 200 else papers[1].get('abstract', '') if len(papers) > 1 else '',
+        paper2_summary=short_abstract(papers[1]) if len(papers) > 1 else '',
         paper2_comment=papers[1].get('primary_category', '') + '分类研究' if len(papers) > 1 else '',
         paper3_title=papers[2].get('title', '') if len(papers) > 2 else '',
         paper3_authors=', '.join(papers[2].get('authors', [])[:3]) if len(papers) > 2 else '',
-        paper3_summary=papers[2].get('abstract', '')[:200] + '...' if len(papers) > 2 and len(papers[2].get('abstract', '')) > 200 else papers[2].get('abstract', '') if len(papers) > 2 else '',
+        paper3_summary=short_abstract(papers[2]) if len(papers) > 2 else '',
         paper3_comment=papers[2].get('primary_category', '') + '分类研究' if len(papers) > 2 else '',
         opensource_news="暂无特别开源项目动态" if len(papers) < 3 else f"基于{len(papers)}篇论文分析，发现多个值得关注的开源工具",
-        trend_analysis=f"本期收录{len(papers)}篇论文，主要集中在机器学习{ml_count}篇、计算机视觉{cv_count}篇等方向" if len(papers) > 0 else "本期论文数量较少",
+        trend_analysis=f"本期收录{len(papers)}篇论文，上升关键词：{rising_terms}" if len(papers) > 0 else "本期论文数量较少",
         conference_news="暂无特别会议动向",
         time_period=time_period,
         period_label=period_label,
@@ -143,22 +149,200 @@ def run_ollama(cfg, period_label, since_str, now_str, items_json):
     )
 
     # 直接调用 /api/generate；设置 keep_alive 控制
-    url = f"{host}/api/generate"
-    headers = {"Content-Type": "application/json"}
+    out = generate(cfg, model, prompt, options={"num_ctx": 4096}, keep_alive=keep_alive, timeout=600)
+    return to_plain(out)
+
+
+def generate(cfg, model, prompt, options=None, keep_alive=0, timeout=600):
+    """调用 Ollama /api/generate 并返回生成文本（经由多主机连接池）"""
     payload = {
         "model": model,
         "prompt": prompt,
-        "options": {
-            "num_ctx": 4096,
-        },
+        "options": options or {},
         "stream": False,
         "keep_alive": keep_alive
     }
-    resp = requests.post(url, json=payload, headers=headers, timeout=600)
-    resp.raise_for_status()
-    out = resp.json().get("response", "").strip()
+    data, _ = get_pool(cfg).generate(payload, timeout=timeout)
+    return data.get("response", "").strip()
+
+
+def short_abstract(paper):
+    """约 200 字符的摘要，按句截断（只在拼装报告时计算，不随条目保存，避免摘要在提示词中重复出现）"""
+    return truncate_sentences(paper.get('abstract', ''), 200)
 
+
+def to_plain(out):
     # 移除markdown格式，转换为纯文本
-    out = out.replace('**', '').replace('## ', '').replace('# ', '').replace('- ', '• ').replace('---', '='*20)
+    return out.replace('**', '').replace('## ', '').replace('# ', '').replace('- ', '• ').replace('---', '='*20)
+
+
+def trend_texts(cfg, papers):
+    """(高频词, 上升词, 分类占比变化) 三段文字，基于跨期趋势统计"""
+    import trends
+    if not trends.enabled(cfg) or not papers:
+        return "暂无", "暂无", "暂无"
+    return trends.format_trends(trends.get_store(cfg).analyze(papers), limit=5)
+
+
+def category_counts(papers):
+    """返回 (cs.LG, cs.CV, cs.CL, 其他) 四类论文数量"""
+    ml_count = sum(1 for p in papers if 'cs.LG' in p.get('primary_category', ''))
+    cv_count = sum(1 for p in papers if 'cs.CV' in p.get('primary_category', ''))
+    cl_count = sum(1 for p in papers if 'cs.CL' in p.get('primary_category', ''))
+    return ml_count, cv_count, cl_count, len(papers) - ml_count - cv_count - cl_count
 
-    return out
+
+# ===== 逐篇摘要 + 拼装模式 =====
+# 每篇论文单独调用一次模型（可提前在后台完成），
+# 最终报告由模板直接拼装，不再需要一次长时间的整体生成。
+
+PAPER_PROMPT = """
+请基于以下 arXiv 论文的标题和摘要，用中文输出两行，不要编造摘要之外的内容：
+主要内容：<一到两句话概括论文做了什么>
+亮点与评论：<一句话点评其创新点或价值>
+
+标题：{title}
+分类：{category}
+摘要：{abstract}
+""".strip()
+
+# 启用全文时附引言节选；节选放在摘要之后，num_ctx 随之加大，避免截断指令和摘要
+PAPER_PROMPT_FULLTEXT = """
+请基于以下 arXiv 论文的标题、摘要和正文节选（引言部分，由 PDF 提取，可能有断行或乱码），用中文输出两行，不要编造这些内容之外的信息：
+主要内容：<一到两句话概括论文做了什么>
+亮点与评论：<一句话点评其创新点或价值>
+
+标题：{title}
+分类：{category}
+摘要：{abstract}
+正文节选：{intro}
+""".strip()
+
+
+def summarize_paper(cfg, paper):
+    """对单篇论文生成 {"summary", "comment"}"""
+    model = cfg.get("ollama", {}).get("model", "deepseek-r1:latest")
+    # 逐篇调用时保持模型常驻，避免每篇都重新加载
+    keep_alive = cfg.get("ollama", {}).get("map_keep_alive", "5m")
+
+    fields = dict(
+        title=paper.get('title', ''),
+        category=paper.get('primary_category', ''),
+        abstract=paper.get('abstract', ''),
+    )
+    intro = ""
+    if fulltext.enabled(cfg):
+        max_chars = int((cfg.get("fulltext", {}) or {}).get("excerpt_chars", 1500))
+        intro = fulltext.intro_excerpt(paper.get('id', ''), max_chars=max_chars)
+    if intro:
+        # 摘要至多约 500 token，节选按每 token 约 3 个字符估算，另留 1536 给指令与输出
+        num_ctx = max(2048, 1024 * -(-(500 + len(intro) // 3 + 1536) // 1024))
+        prompt = PAPER_PROMPT_FULLTEXT.format(intro=intro, **fields)
+    else:
+        num_ctx = 2048
+        prompt = PAPER_PROMPT.format(**fields)
+    out = generate(cfg, model, prompt, options={"num_ctx": num_ctx}, keep_alive=keep_alive, timeout=300)
+
+    summary, comment = "", ""
+    for line in to_plain(out).splitlines():
+        line = line.strip()
+        if line.startswith("主要内容"):
+            summary = line.split("：", 1)[-1].split(":", 1)[-1].strip()
+        elif line.startswith("亮点与评论"):
+            comment = line.split("：", 1)[-1].split(":", 1)[-1].strip()
+    if not summary:
+        summary = out.strip()
+    return {"summary": summary, "comment": comment}
+
+
+def _summarize_scoped(cfg, paper):
+    # 剖析会话进行中时，线程池中的逐篇调用也计入
+    from profiler import thread_scope
+    with thread_scope():
+        return summarize_paper(cfg, paper)
+
+
+def summarize_papers(cfg, papers, done=None, on_result=None):
+    """
+    逐篇生成摘要
+
+    Args:
+        done: 已有结果 {paper_id: {...}}，其中的论文会被跳过
+        on_result: 每篇完成后的回调 (paper_id, result)
+
+    Returns:
+        dict: {paper_id: {"summary", "comment"}}
+    """
+    results = dict(done or {})
+    todo = [p for p in papers[:10] if p.get('id') not in results]  # 报告最多展示10篇
+    if not todo:
+        return results
+
+    # 并发数取连接池中健康主机的权重之和，主机越多吞吐越高
+    workers = min(get_pool(cfg).capacity, len(todo))
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        # 每个线程带上调用方的优先级类别；每篇单独申请名额，对话到来时逐篇让出
+        futures = {ex.submit(contextvars.copy_context().run, _summarize_scoped, cfg, p): p.get('id') for p in todo}
+        for fut in as_completed(futures):
+            pid = futures[fut]
+            try:
+                results[pid] = fut.result()
+            except requests.RequestException as e:
+                print(f" 论文 {pid} 摘要生成失败: {e}")
+                continue
+            if on_result:
+                on_result(pid, results[pid])
+    return results
+
+
+def assemble_report(cfg, period_label, since_str, now_str, papers, summaries):
+    """用逐篇摘要拼装纯文本报告（不调用模型）"""
+    ml_count, cv_count, cl_count, other_count = category_counts(papers)
+    top_terms, rising_terms, category_shift = trend_texts(cfg, papers)
+    time_period = "明早10点" if "早报" in period_label else "今晚10点"
+    sep = '=' * 20
+
+    lines = [
+        "一、今日论文趋势",
+        "欢迎来到 arXiv日报，先来看看今天的研究热点。",
+        "",
+        f"今天 arXiv 上共收录 AI 方向论文 {len(papers)} 篇，",
+        "其中：",
+    ]
+    for name, n in (("机器学习 (cs.LG)", ml_count), ("计算机视觉 (cs.CV)", cv_count),
+                    ("自然语言处理 (cs.CL)", cl_count), ("其他", other_count)):
+        if n:
+            lines.append(f"• {name}：{n} 篇")
+    lines += [
+        "",
+        f"从关键词来看，今日高频词包括{top_terms}；",
+        f"与近期基线相比，上升最快的关键词是{rising_terms}。",
+        f"分类占比变化：{category_shift}",
+    ]
+    lines += ["", sep, "", "二、论文速览", ""]
+
+    for i, paper in enumerate(papers[:10], 1):
+        authors = ', '.join(paper.get('authors', [])[:3])
+        if len(paper.get('authors', [])) > 3:
+            authors += ' et al.'
+        s = summaries.get(paper.get('id'), {})
+        lines += [
+            f"{i}. {paper.get('title', '')}",
+            f"作者：{authors}",
+            f"主要内容：{s.get('summary') or short_abstract(paper)}",
+            f"亮点与评论：{s.get('comment') or paper.get('primary_category', '') + '分类研究'}",
+            f"链接：{paper.get('link', '')}",
+        ]
+        for dup in paper.get('duplicates', []):
+            lines.append(f"相关论文：{dup.get('title', '')} ({dup.get('link', '')})")
+        lines.append("")
+
+    lines += [
+        sep, "", "三、值得关注的动向", "",
+        f"• 趋势解读：本期收录{len(papers)}篇论文，上升关键词：{rising_terms}"
+        if papers else "• 趋势解读：本期论文数量较少",
+        "", sep, "",
+        f"今天的日报就到这里，{time_period}我们再见～",
+        "", f"【期别】{period_label}", f"【时间窗】{since_str} ~ {now_str}",
+    ]
+    return "\n".join(lines)
@@ -0,0 +1,131 @@
+# textnorm.py
+import re
+
+# 摘要规范化：在送入模型前压缩文本，每篇论文只做一次
+#   - LaTeX 数学公式与文本宏化简为纯文本 ($\mathcal{O}(n^{2})$ -> O(n^2))；
+#     常见符号/运算符转为 Unicode 或函数名，其余未知宏保留名字（\foo -> foo），不删除
+#   - 去掉 "In this paper, we propose" 之类的套话
+#   - 在句子边界截断，不再从单词或公式中间切断
+
+_GREEK = {
+    "alpha": "α", "beta": "β", "gamma": "γ", "delta": "δ", "epsilon": "ε", "varepsilon": "ε",
+    "theta": "θ", "lambda": "λ", "mu": "μ", "pi": "π", "rho": "ρ", "sigma": "σ", "tau": "τ",
+    "phi": "φ", "varphi": "φ", "omega": "ω", "Delta": "Δ", "Sigma": "Σ", "Omega": "Ω",
+    "times": "×", "cdot": "·", "leq": "≤", "le": "≤", "geq": "≥", "ge": "≥", "approx": "≈",
+    "sim": "~", "infty": "∞", "rightarrow": "→", "to": "→", "pm": "±", "ell": "ℓ",
+    "eta": "η", "zeta": "ζ", "kappa": "κ", "nu": "ν", "xi": "ξ", "chi": "χ", "psi": "ψ",
+    "Gamma": "Γ", "Theta": "Θ", "Lambda": "Λ", "Pi": "Π", "Phi": "Φ", "Psi": "Ψ",
+    "in": "∈", "notin": "∉", "subset": "⊂", "subseteq": "⊆", "cup": "∪", "cap": "∩", "forall": "∀",
+    "exists": "∃", "partial": "∂", "nabla": "∇", "neq": "≠", "ne": "≠", "ll": "≪", "gg": "≫",
+    "propto": "∝", "equiv": "≡", "leftarrow": "←", "Rightarrow": "⇒", "mapsto": "↦", "sum": "Σ",
+    "prod": "∏", "int": "∫", "top": "T", "dagger": "†", "ldots": "…", "cdots": "⋯", "dots": "…",
+}
+# 只影响排版、没有含义的宏直接去掉
+_LAYOUT = {"left", "right", "big", "Big", "bigg", "Bigg", "bigl", "bigr", "Bigl", "Bigr", "displaystyle",
+           "textstyle", "limits", "nolimits", "quad", "qquad", "hfill", "noindent", "centering"}
+_BLACKBOARD = {"R": "ℝ", "N": "ℕ", "Z": "ℤ", "Q": "ℚ", "C": "ℂ", "E": "𝔼", "P": "ℙ"}
+
+# 行内 $…$ 只匹配成对的公式：开头 $ 后、结尾 $ 前不能是空白，结尾 $ 后不能紧跟数字（"$5 and $10" 不是公式）
+_MATH = re.compile(r"\$\$(.+?)\$\$|(?<![\\$])\$(?![\s$])([^$]+?)(?<![\s\\])\$(?!\d)|\\\((.+?)\\\)|\\\[(.+?)\\\]", re.S)
+_DROP_ARG = re.compile(r"\\(?:cite[pt]?|ref|eqref|label|footnote)\{[^{}]*\}")
+_HREF = re.compile(r"\\href\{[^{}]*\}\{([^{}]*)\}")
+_KEEP_ARG = re.compile(r"\\[a-zA-Z]+\*?\{([^{}]*)\}")
+_MACRO = re.compile(r"\\([a-zA-Z]+)")
+_SYMBOL = re.compile(r"\\(" + "|".join(_GREEK) + r")(?![a-zA-Z])")
+_FRAC = re.compile(r"\\[dt]?frac\{([^{}]*)\}\{([^{}]*)\}")
+_BINOM = re.compile(r"\\binom\{([^{}]*)\}\{([^{}]*)\}")
+_SQRT = re.compile(r"\\sqrt\{([^{}]*)\}")
+_MATHBB = re.compile(r"\\mathbb\{([A-Z])\}")
+_TIE = re.compile(r"(?<=[\w.)])~(?=[\w\\])")  # Fig.~1、et al.~\cite：TeX 不换行空格；"~5%" 中的 ~ 保留
+
+_BOILERPLATE = [
+    (re.compile(r"\b(?:In|Within) this (?:paper|work|study|article|letter|note),?\s+we\b", re.I), "We"),
+    (re.compile(r"\bThis (?:paper|work|study|article) (?:proposes|presents|introduces)\b", re.I), "We propose"),
+    (re.compile(r"\b(?:In|Within) this (?:paper|work|study|article),?\s*(\w)", re.I), lambda m: m.group(1).upper()),
+    # 只去掉 novel/new，保留后面的形容词（"a novel and efficient method" -> "an efficient method"）
+    (re.compile(r"\b(?:a|an) (?:novel|new)(?:,? and|,)? (\w)", re.I),
+     lambda m: ("A" if m.group(0)[0] == "A" else "a") + ("n " if m.group(1).lower() in "aeiou" else " ") + m.group(1)),
+    (re.compile(r"\bExtensive (?:experiments|evaluations|experimental results)(?: on [^.]*?)? (?:demonstrate|show|verify|validate) that\b", re.I), "Experiments show"),
+    (re.compile(r"\bTo the best of our knowledge,\s*(\w)", re.I), lambda m: m.group(1).upper()),
+]
+
+_SENT_END = re.compile(r"(?<=[.!?。！？])\s+")
+
+
+def _macro(m):
+    name = m.group(1)
+    if name in _LAYOUT:
+        return ""
+    return _GREEK.get(name, name)  # \log、\max 等保留名字，未知宏同样保留
+
+
+def _group(x):
+    return x if re.fullmatch(r"√?\w+", x) else f"({x})"
+
+
+def _simplify_math(expr):
+    expr = _SYMBOL.sub(lambda m: _GREEK[m.group(1)], expr)
+    expr = _MATHBB.sub(lambda m: _BLACKBOARD.get(m.group(1), m.group(1)), expr)
+    expr = re.sub(r"\\[,;:!> ]", " ", expr)  # \, \; 等间距
+    # 带两个参数的宏要在通用展开之前处理，否则 \frac{1}{2} 会变成 12；由内向外处理嵌套
+    for _ in range(3):
+        expr = _FRAC.sub(lambda m: f"{_group(m.group(1).strip())}/{_group(m.group(2).strip())}", expr)
+        expr = _BINOM.sub(lambda m: f"C({m.group(1).strip()},{m.group(2).strip()})", expr)
+        expr = _SQRT.sub(lambda m: f"√{_group(m.group(1).strip())}", expr)
+    expr = _KEEP_ARG.sub(r"\1", expr)            # \mathcal{O} -> O
+    expr = _MACRO.sub(_macro, expr)
+    expr = re.sub(r"([_^])\{([^{}]*)\}", r"\1\2", expr)  # n^{2} -> n^2
+    expr = expr.replace("{", "").replace("}", "")
+    return " ".join(expr.split())
+
+
+def strip_latex(text):
+    text = _TIE.sub(" ", text)  # 须在公式转换之前处理（\sim 转换后也是 ~）
+    text = _MATH.sub(lambda m: _simplify_math(next(g for g in m.groups() if g is not None)), text)
+    text = _DROP_ARG.sub("", text)
+    text = _HREF.sub(r"\1", text)
+    for _ in range(3):  # 处理嵌套的 \textbf{\emph{x}}
+        text = _KEEP_ARG.sub(r"\1", text)
+    text = re.sub(r"\\([%&_#$])", r"\1", text)  # \% -> %
+    text = re.sub(r"\\[,;:!> ]", " ", text)
+    text = _MACRO.sub(_macro, text)
+    text = text.replace("``", '"').replace("''", '"').replace("--", "–")
+    return re.sub(r"\s+([.,;:])", r"\1", text)  # 删除引用后留下的 "xxx ."
+
+
+def drop_boilerplate(text):
+    for pat, repl in _BOILERPLATE:
+        text = pat.sub(repl, text)
+    return text
+
+
+def truncate_sentences(text, max_chars):
+    """在句子边界截断；第一句已超长时在词边界截断并加省略号"""
+    if len(text) <= max_chars:
+        return text
+    out = ""
+    for sent in _SENT_END.split(text):
+        cand = (out + " " + sent).strip()
+        if len(cand) > max_chars:
+            break
+        out = cand
+    if out:
+        return out
+    cut = text[:max_chars]
+    return (cut.rsplit(" ", 1)[0] if " " in cut else cut) + "…"
+
+
+def estimate_tokens(text):
+    """粗略估计 token 数：CJK 字符各算 1 个，其余约 4 个字符 1 个"""
+    cjk = sum(1 for ch in text if "\u4e00" <= ch <= "\u9fff")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def normalize_abstract(text, max_chars=500):
+    text = " ".join((text or "").split())
+    text = strip_latex(text)
+    text = drop_boilerplate(text)
+    text = " ".join(text.split())
+    if text[:1].islower():
+        text = text[0].upper() + text[1:]
+    return truncate_sentences(text, max_chars)
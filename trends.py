@@ -0,0 +1,297 @@
+# trends.py
+import json, os, re, threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+import state
+
+try:
+    import fcntl
+except ImportError:  # Windows：不加文件锁，同一时间只应有一个进程记录
+    fcntl = None
+
+# 跨期趋势统计（增量）
+#   - 每期只统计本期论文：词项（标题+摘要的单词与二元词组，按论文去重）和主分类的计数
+#   - 各期计数以稀疏形式存为 storage/trends/rows/<period>.npz
+#   - 滚动基线 = 最近 window_periods 期计数之和，保存在 state.npz 中；
+#     新增一期时加上本期、减去滑出窗口的那一期，只读一个旧文件，从不重新扫描历史
+#   - 上升词：本期文档频率与基线文档频率之比（加平滑），要求本期至少出现 min_count 次
+#   - bot、worker 进程与命令行都可能读写同一份基线：读取前按 state.json 的 mtime 重新加载，
+#     record 在文件锁 (trends.lock) 内先重新加载再写入，不会用过期的副本覆盖其他进程记录的期别
+
+_TOKEN = re.compile(r"[a-z][a-z0-9\-]+")
+_PUNCT = re.compile(r"[.,;:!?()\[\]\"]")
+STOPWORDS = set("""
+a an the and or of to in on for with by from as at is are was were be been being this that these those
+it its we our us they their them which who whom whose what when where how than then there here such
+can could may might will would should must do does did done not no nor but if so also into over under
+between among about via using use used based new novel propose proposes proposed present presents
+paper work study approach approaches method methods result results show shows shown demonstrate
+demonstrates achieve achieves achieved performance task tasks model models framework problem problems
+existing state-of-the-art sota significantly effective efficient however while both each other more most
+many several various different further first two three one large small high low well without within
+across through only recent recently experiments experimental extensive evaluation evaluate data dataset
+datasets benchmark benchmarks training trained learning learn learned network networks neural deep
+""".split())
+
+
+def tokenize(text):
+    """小写单词与相邻二元词组（去停用词，不跨标点），同一篇论文内去重"""
+    out = set()
+    for seg in _PUNCT.split((text or "").lower()):
+        words = [w.strip("-") for w in _TOKEN.findall(seg)]
+        words = [w for w in words if len(w) > 2 and w not in STOPWORDS]
+        out.update(words)
+        out.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return out
+
+
+class TrendStore:
+    def __init__(self, root, window=28, top_k=8, min_count=2):
+        self.root = Path(root)
+        self.rows = self.root / "rows"
+        self.window = window
+        self.top_k = top_k
+        self.min_count = min_count
+        self._lock = threading.RLock()
+        self.meta = {"terms": [], "categories": [], "periods": [], "papers": [], "last": None}
+        self.term_base = np.zeros(0, dtype=np.int32)
+        self.cat_base = np.zeros(0, dtype=np.int32)
+        self._mtime = None
+        self.refresh()
+
+    # ---- 持久化 ----
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程互斥（同一进程内由 self._lock 保证）"""
+        if fcntl is None:
+            yield
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / "trends.lock", "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _stamp(self):
+        meta = self.root / "state.json"
+        return meta.stat().st_mtime_ns if meta.exists() else None
+
+    def _load(self):
+        """调用方持有文件锁；state.json 与 state.npz 在锁内成对写入"""
+        meta = self.root / "state.json"
+        if not meta.exists():
+            return
+        self._mtime = self._stamp()
+        self.meta = json.loads(meta.read_text(encoding="utf-8"))
+        arrays = np.load(self.root / "state.npz")
+        self.term_base, self.cat_base = arrays["terms"], arrays["categories"]
+        self._terms_index = self._categories_index = None  # 词表可能已被其他进程扩充
+
+    def refresh(self):
+        """其他进程记录了新的期别时重新加载"""
+        with self._lock:
+            if self._stamp() == self._mtime:
+                return
+            with self._file_lock():
+                self._load()
+
+    def _save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / "state.tmp.npz"
+        np.savez(tmp, terms=self.term_base, categories=self.cat_base)
+        os.replace(tmp, self.root / "state.npz")
+        tmp = self.root / "state.json.tmp"
+        tmp.write_text(json.dumps(self.meta, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.root / "state.json")
+        self._mtime = self._stamp()
+
+    def _row_path(self, period):
+        return self.rows / f"{period}.npz"
+
+    def _read_row(self, period):
+        p = self._row_path(period)
+        if not p.exists():
+            return None
+        z = np.load(p)
+        return z["term_idx"], z["term_cnt"], z["cat_idx"], z["cat_cnt"]
+
+    # ---- 计数 ----
+
+    def _index(self, names, key):
+        idx = getattr(self, f"_{key}_index", None)
+        if idx is None or len(idx) != len(names):
+            idx = {n: i for i, n in enumerate(names)}
+            setattr(self, f"_{key}_index", idx)
+        return idx
+
+    def _count(self, papers, grow):
+        """
+        统计一批论文
+
+        Returns:
+            (term_counts, cat_counts, n): 与当前词表等长的计数数组；grow 为真时把新词加入词表
+        """
+        terms, cats = {}, {}
+        for p in papers:
+            for t in tokenize(p.get("title", "") + " . " + p.get("abstract", "")):
+                terms[t] = terms.get(t, 0) + 1
+            c = p.get("primary_category", "")
+            if c:
+                cats[c] = cats.get(c, 0) + 1
+
+        out = []
+        for counts, key, base_attr in ((terms, "terms", "term_base"), (cats, "categories", "cat_base")):
+            names = self.meta[key]
+            index = self._index(names, key)
+            if grow:
+                for name in counts:
+                    if name not in index:
+                        index[name] = len(names)
+                        names.append(name)
+                base = getattr(self, base_attr)
+                if len(base) < len(names):
+                    setattr(self, base_attr, np.concatenate([base, np.zeros(len(names) - len(base), dtype=np.int32)]))
+            vec = np.zeros(len(names), dtype=np.int32)
+            known = [(index[n], c) for n, c in counts.items() if n in index]
+            if known:
+                ids, cnt = zip(*known)
+                vec[list(ids)] = cnt
+            out.append((vec, {n: c for n, c in counts.items() if n not in index}))
+        return out[0], out[1], len(papers)
+
+    def analyze(self, papers):
+        """
+        本期论文相对滚动基线的趋势（只读，不修改基线）
+
+        Returns:
+            dict: top / rising 词项 (词, 本期篇数, 倍数)，categories (分类, 本期占比, 基线占比)
+        """
+        self.refresh()
+        with self._lock:
+            (tv, t_new), (cv, c_new), n = self._count(papers, grow=False)
+            n_base = sum(self.meta["papers"])
+            terms = self.meta["terms"]
+
+            # 高频词：本期篇数最多的词项（只在本期出现过的新词也算）
+            top = sorted([(terms[i], int(tv[i])) for i in np.flatnonzero(tv)] + list(t_new.items()),
+                         key=lambda x: (-x[1], x[0]))[:self.top_k]
+
+            rising = []
+            if n and n_base:
+                base = self.term_base[:len(tv)].astype(np.float64)
+                now_rate = (tv + 0.5) / (n + 1)
+                base_rate = (base + 0.5) / (n_base + 1)
+                ratio = now_rate / base_rate
+                ok = np.flatnonzero(tv >= self.min_count)
+                order = ok[np.argsort(-ratio[ok], kind="stable")][:self.top_k]
+                rising = [(terms[i], int(tv[i]), round(float(ratio[i]), 1)) for i in order if ratio[i] > 1.5]
+                fresh = [(t, c) for t, c in t_new.items() if c >= self.min_count]
+                for t, c in sorted(fresh, key=lambda x: -x[1])[:max(self.top_k - len(rising), 0)]:
+                    rising.append((t, c, round((c + 0.5) / (n + 1) / (0.5 / (n_base + 1)), 1)))
+                rising.sort(key=lambda x: -x[2])
+
+            cats = []
+            names = self.meta["categories"]
+            for i in np.flatnonzero(cv):
+                share = cv[i] / n
+                base_share = self.cat_base[i] / n_base if n_base else 0.0
+                cats.append((names[i], round(float(share), 3), round(float(base_share), 3)))
+            cats += [(c, round(k / n, 3), 0.0) for c, k in c_new.items()]
+            cats.sort(key=lambda x: -x[1])
+            return {"papers": n, "baseline_papers": n_base, "baseline_periods": len(self.meta["periods"]),
+                    "top": top, "rising": rising, "categories": cats}
+
+    def record(self, period, papers):
+        """
+        把一期计入基线；同一期重复记录时先撤销旧的计数
+
+        Returns:
+            dict: 该期相对记录前基线的趋势（同 analyze）
+        """
+        with self._lock, self._file_lock():
+            if self._stamp() != self._mtime:
+                self._load()
+            if period in self.meta["periods"]:
+                self._apply(period, -1)
+                i = self.meta["periods"].index(period)
+                del self.meta["periods"][i], self.meta["papers"][i]
+            report = self.analyze(papers)
+
+            (tv, _), (cv, _), n = self._count(papers, grow=True)
+            self.rows.mkdir(parents=True, exist_ok=True)
+            ti, ci = np.flatnonzero(tv), np.flatnonzero(cv)
+            np.savez(self._row_path(period), term_idx=ti.astype(np.int32), term_cnt=tv[ti],
+                     cat_idx=ci.astype(np.int32), cat_cnt=cv[ci])
+            self.term_base[ti] += tv[ti]
+            self.cat_base[ci] += cv[ci]
+            self.meta["periods"].append(period)
+            self.meta["papers"].append(n)
+
+            # 滑出窗口的期别从基线中减去（只读取这一期的计数）
+            while len(self.meta["periods"]) > self.window:
+                old = self.meta["periods"].pop(0)
+                self.meta["papers"].pop(0)
+                self._apply(old, -1)
+
+            self.meta["last"] = dict(report, period=period)
+            self._save()
+        return report
+
+    def _apply(self, period, sign):
+        row = self._read_row(period)
+        if row is None:
+            return
+        ti, tc, ci, cc = row
+        self.term_base[ti] += sign * tc
+        self.cat_base[ci] += sign * cc
+
+    def last(self):
+        self.refresh()
+        return self.meta.get("last")
+
+
+def format_trends(report, limit=None):
+    """趋势结果转为中文短句，供提示词和报告使用"""
+    top = report.get("top", [])[:limit]
+    rising = report.get("rising", [])[:limit]
+    top_text = "、".join(f"{t}（{c}篇）" for t, c in top) or "暂无"
+    if not report.get("baseline_papers"):
+        rising_text = "暂无历史基线"
+    else:
+        rising_text = "、".join(f"{t}（{c}篇，约为近期的{r}倍）" for t, c, r in rising) or "无明显上升的关键词"
+    shifts = []
+    for c, share, base in report.get("categories", [])[:5]:
+        if report.get("baseline_papers"):
+            shifts.append(f"{c} 占 {share:.0%}（近期 {base:.0%}）")
+        else:
+            shifts.append(f"{c} 占 {share:.0%}")
+    return top_text, rising_text, "；".join(shifts) or "暂无"
+
+
+_STORES = {}
+_LOCK = threading.Lock()
+
+
+def get_store(cfg):
+    """每个存储目录一个实例；参数变化（配置热更新）时原地调整，基线按文件变化重新加载"""
+    tc = cfg.get("trends", {}) or {}
+    root = state.BASE / "trends"
+    window, top_k, min_count = int(tc.get("window_periods", 28)), int(tc.get("top_k", 8)), int(tc.get("min_count", 2))
+    with _LOCK:
+        store = _STORES.get(str(root))
+        if store is None:
+            store = _STORES[str(root)] = TrendStore(root, window=window, top_k=top_k, min_count=min_count)
+        else:
+            with store._lock:
+                store.window, store.top_k, store.min_count = window, top_k, min_count
+        return store
+
+
+def enabled(cfg):
+    return (cfg.get("trends", {}) or {}).get("enabled", True)
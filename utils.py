@@ -10,4 +10,9 @@ def last_window_start(tzname: str, hours: int):
     return t - timedelta(hours=hours)
 
 def fmt_period(dt):
-    return dt.strftime("%Y-%m-%d_%p").upper()  # e.g. 2025-10-09_AM / _PM
\ No newline at end of file
+    return dt.strftime("%Y-%m-%d_%p").upper()  # e.g. 2025-10-09_AM / _PM
+
+def load_config(path="config.yaml"):
+    import yaml
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
@@ -0,0 +1,182 @@
+# watchlist.py
+import json, os, re, threading
+from collections import deque
+
+from state import BASE
+
+# 个人关注列表：作者 / 关键词 / 分类
+# 所有用户的关注项编译成一份索引：
+#   - 作者、分类：倒排表 {规范化值: {user_id}}，按论文的作者和分类逐个查表
+#   - 关键词：Aho-Corasick 自动机，标题+摘要只扫描一遍即可找出全部命中
+# 因此匹配一批论文的开销只与论文数量（及文本长度）有关，与用户数和关注项数无关。
+
+KINDS = ("authors", "keywords", "categories")
+_WORD = re.compile(r"\w")
+
+
+def norm_author(name):
+    return " ".join(name.lower().replace(".", " ").split())
+
+
+def norm_keyword(word):
+    return " ".join(word.lower().split())
+
+
+class KeywordAutomaton:
+    """多模式匹配 (Aho-Corasick)"""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for pat in patterns:
+            node = 0
+            for ch in pat:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                node = nxt
+            self.out[node].append(pat)
+
+        # 广度优先构建失败指针
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0) if self.goto[f].get(ch, 0) != nxt else 0
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def find(self, text):
+        """返回 text 中出现的模式集合；英文模式要求两端为词边界"""
+        found = set()
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for pat in self.out[node]:
+                start = i - len(pat) + 1
+                if _WORD.match(pat[0]) and pat[0].isascii() and start > 0 and _WORD.match(text[start - 1]):
+                    continue
+                if _WORD.match(pat[-1]) and pat[-1].isascii() and i + 1 < len(text) and _WORD.match(text[i + 1]):
+                    continue
+                found.add(pat)
+        return found
+
+
+class WatchIndex:
+    def __init__(self, watches):
+        self.authors, self.categories, self.keywords = {}, {}, {}
+        for uid, w in watches.items():
+            for a in w.get("authors", []):
+                self.authors.setdefault(norm_author(a), set()).add(uid)
+            for c in w.get("categories", []):
+                self.categories.setdefault(c.strip(), set()).add(uid)
+            for k in w.get("keywords", []):
+                self.keywords.setdefault(norm_keyword(k), set()).add(uid)
+        self.automaton = KeywordAutomaton(self.keywords) if self.keywords else None
+
+    def match(self, papers):
+        """
+        一次扫描整批论文
+
+        Returns:
+            dict: {user_id: [(paper, [命中原因, ...]), ...]}
+        """
+        hits = {}
+        for p in papers:
+            reasons = {}
+            for a in p.get("authors", []):
+                for uid in self.authors.get(norm_author(a), ()):
+                    reasons.setdefault(uid, []).append(f"作者 {a}")
+            cats = [p.get("primary_category", "")] + list(p.get("categories", []))
+            for c in dict.fromkeys(cats):
+                for uid in self.categories.get(c, ()):
+                    reasons.setdefault(uid, []).append(f"分类 {c}")
+            if self.automaton:
+                text = norm_keyword(p.get("title", "") + " \n " + p.get("abstract", ""))
+                for kw in self.automaton.find(text):
+                    for uid in self.keywords[kw]:
+                        reasons.setdefault(uid, []).append(f"关键词 {kw}")
+            for uid, rs in reasons.items():
+                hits.setdefault(uid, []).append((p, rs))
+        return hits
+
+
+class Watchlists:
+    """持久化在 storage/watchlists.json；修改后索引延迟重新编译"""
+
+    def __init__(self, path=None):
+        self.path = path or BASE / "watchlists.json"
+        self._lock = threading.Lock()
+        self._index = None
+        data = {}
+        if self.path.exists():
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        self.watches = data.get("watches", {})
+        self.notified = {uid: deque(ids, maxlen=500) for uid, ids in data.get("notified", {}).items()}
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({
+            "watches": self.watches,
+            "notified": {uid: list(ids) for uid, ids in self.notified.items()},
+        }, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def add(self, uid, kind, value):
+        with self._lock:
+            items = self.watches.setdefault(str(uid), {}).setdefault(kind, [])
+            if value in items:
+                return False
+            items.append(value)
+            self._index = None
+            self._save()
+            return True
+
+    def remove(self, uid, kind, value):
+        with self._lock:
+            items = self.watches.get(str(uid), {}).get(kind, [])
+            if value not in items:
+                return False
+            items.remove(value)
+            self._index = None
+            self._save()
+            return True
+
+    def get(self, uid):
+        return self.watches.get(str(uid), {})
+
+    @property
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                self._index = WatchIndex(self.watches)
+            return self._index
+
+    def match_new(self, papers):
+        """匹配一批论文，过滤掉已通知过的论文；发送成功后由调用方 mark_notified"""
+        hits = self.index.match(papers)
+        out = {}
+        with self._lock:
+            for uid, items in hits.items():
+                seen = self.notified.get(uid, ())
+                fresh = [(p, rs) for p, rs in items if p.get("id") not in seen]
+                if fresh:
+                    out[uid] = fresh
+        return out
+
+    def mark_notified(self, uid, paper_ids):
+        with self._lock:
+            seen = self.notified.setdefault(uid, deque(maxlen=500))
+            seen.extend(pid for pid in paper_ids if pid not in seen)
+            self._save()
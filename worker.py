@@ -0,0 +1,183 @@
+# worker.py
+"""
+任务队列的 worker 进程：领取 jobqueue 中的任务并执行，结果写回数据库由 bot 推送
+
+    python -m arxivpush worker [--processes 2] [--kinds chat] [--once]
+
+worker 与 bot 共享 storage/（可以是多台机器挂载的同一目录），不需要 Discord 令牌。
+"""
+import multiprocessing, os, socket, threading, time, traceback, uuid
+from datetime import datetime
+
+import jobqueue
+
+
+# ---- 任务载荷中的时间以 ISO 字符串传递 ----
+
+def encode_prepared(prepared):
+    return dict(prepared, since=prepared["since"].isoformat(), until=prepared["until"].isoformat())
+
+
+def decode_prepared(prepared):
+    return dict(prepared, since=datetime.fromisoformat(prepared["since"]),
+                until=datetime.fromisoformat(prepared["until"]))
+
+
+# ---- 各类任务 ----
+
+def job_collect(cfg, p, emit):
+    import pipeline
+    return pipeline.collect(cfg, datetime.fromisoformat(p["since"]), datetime.fromisoformat(p["until"]))
+
+
+def job_prepare(cfg, p, emit):
+    import pipeline
+    return encode_prepared(pipeline.prepare(cfg, p["label"], datetime.fromisoformat(p["since"]),
+                                            datetime.fromisoformat(p["until"])))
+
+
+def job_finalize(cfg, p, emit):
+    import pipeline
+    data, md = pipeline.finalize(cfg, p["label"], decode_prepared(p["prepared"]),
+                                 datetime.fromisoformat(p["now"]))
+    return {"data": data, "md": md}
+
+
+def job_generate(cfg, p, emit):
+    """论文已由 bot 写入 raw_papers.json；逐篇结果直接写入阶段清单并发送进度事件"""
+    import json
+    import pipeline
+    from state import PeriodState
+
+    st = PeriodState(p["period"])
+    data = json.loads(st.raw_json.read_text(encoding="utf-8"))
+
+    def on_result(paper_id, result):
+        st.save_summary(paper_id, result)
+        emit({"paper": paper_id})
+
+    return pipeline.generate(cfg, p["label"], datetime.fromisoformat(p["since"]),
+                             datetime.fromisoformat(p["until"]), data,
+                             st.manifest["summaries"], on_result, on_ingested=lambda: st.mark_stage("ingested"))
+
+
+def job_ingest(cfg, p, emit):
+    """下载并解析本期论文的全文 PDF"""
+    import json
+    import fulltext
+    from state import PeriodState
+
+    st = PeriodState(p["period"])
+    data = json.loads(st.raw_json.read_text(encoding="utf-8"))
+    return fulltext.ingest_sync(cfg, data)
+
+
+def job_chat(cfg, p, emit):
+    import chat
+    from state import PeriodState
+
+    st = PeriodState(p["period"])
+    ctx_text = st.prompt_context.read_text(encoding="utf-8")
+    return chat.answer(cfg, p["period"], ctx_text, p["question"], history=p.get("history"),
+                       stamp=p.get("stamp"))
+
+
+HANDLERS = {
+    "collect": job_collect,
+    "prepare": job_prepare,
+    "finalize": job_finalize,
+    "generate": job_generate,
+    "ingest": job_ingest,
+    "chat": job_chat,
+}
+
+
+def run_job(kind, cfg, payload, emit):
+    """执行任务；载荷中的 _llm 指定模型调用的优先级类别与截止时间"""
+    from llm_sched import request_class
+    from profiler import thread_scope
+    cls, deadline = (payload.get("_llm") or ["manual", None])
+    with request_class(cls, deadline), thread_scope():
+        return HANDLERS[kind](cfg, payload, emit)
+
+
+def _heartbeat_loop(q, worker_id, kinds, current, stop, interval):
+    while not stop.wait(interval):
+        try:
+            q.heartbeat(worker_id, kinds, current.get("job"))
+        except Exception:
+            pass
+
+
+def run_worker(cfg, kinds=None, once=False, worker_id=None):
+    """
+    循环领取并执行任务
+
+    Args:
+        cfg: 配置字典
+        kinds: 只处理这些类型的任务（默认全部）
+        once: 队列为空时立即退出
+    """
+    q = jobqueue.from_cfg(dict(cfg, job_queue=dict(cfg.get("job_queue", {}) or {}, enabled=True)))
+    jc = cfg.get("job_queue", {}) or {}
+    poll = float(jc.get("poll_interval", 1.0))
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    kinds = list(kinds or HANDLERS)
+
+    # 租约由心跳线程续期，长时间的模型调用不会被其他 worker 抢走
+    current, stop = {}, threading.Event()
+    q.heartbeat(worker_id, kinds)
+    beat = threading.Thread(target=_heartbeat_loop, args=(q, worker_id, kinds, current, stop, max(q.lease / 4, 1)),
+                            daemon=True)
+    beat.start()
+    print(f" worker {worker_id} 已启动: {', '.join(kinds)}")
+
+    done = 0
+    try:
+        while True:
+            job = q.claim(worker_id, kinds)
+            if job is None:
+                if once:
+                    break
+                time.sleep(poll)
+                continue
+
+            current["job"] = job["id"]
+            t0 = time.perf_counter()
+            print(f" 任务 {job['id']} ({job['kind']}) 开始，第 {job['attempts']} 次")
+            try:
+                result = run_job(job["kind"], cfg, job["payload"], lambda data, jid=job["id"]: q.emit(jid, data))
+            except Exception as e:
+                traceback.print_exc()
+                q.fail(job["id"], worker_id, f"{type(e).__name__}: {e}")
+            else:
+                q.complete(job["id"], worker_id, result)
+                print(f" 任务 {job['id']} 完成，用时 {time.perf_counter() - t0:.1f}s")
+            finally:
+                current.pop("job", None)
+            done += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+    return done
+
+
+def _worker_main(cfg, kinds, once):
+    run_worker(cfg, kinds=kinds, once=once)
+
+
+def run_workers(cfg, processes=1, kinds=None, once=False):
+    """启动多个 worker 进程；processes 为 1 时在当前进程运行"""
+    if processes <= 1:
+        return run_worker(cfg, kinds=kinds, once=once)
+    procs = [multiprocessing.Process(target=_worker_main, args=(cfg, kinds, once)) for _ in range(processes)]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.join()
+    return 0